@@ -0,0 +1,264 @@
+"""Local stub of the ListenFirst API for benchmarking.
+
+The server emulates the token endpoint, paginated /analytics/fetch, the fetch
+job lifecycle with downloadable page URLs and the list endpoints, serving
+synthetic payloads of configurable size after a configurable latency,
+optionally compressed with gzip.
+"""
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+API_PREFIX = '/v20200626/'
+
+BRAND_NAMES = [f'Brand {i}' for i in range(500)]
+
+
+def analytic_columns(num_metrics):
+  columns = [
+    {"id": 'lfm.fact.date_str', "name": 'Date', "class": 'DIMENSION',
+     "data_type": 'DATE'},
+    {"id": 'lfm.brand_view.id', "name": 'Brand View ID', "class": 'DIMENSION',
+     "data_type": 'INTEGER'},
+    {"id": 'lfm.brand.name', "name": 'Brand Name', "class": 'DIMENSION',
+     "data_type": 'STRING'}
+  ]
+  columns += [{"id": f'lfm.metric.m{i}', "name": f'Metric {i}',
+               "class": 'METRIC', "data_type": 'INTEGER'}
+              for i in range(num_metrics)]
+  return columns
+
+def analytic_records(num_rows, num_metrics, seed=0):
+  rng = random.Random(seed)
+  start = date(2022, 1, 1)
+  records = []
+  for i in range(num_rows):
+    brand = rng.randrange(len(BRAND_NAMES))
+    row = [(start + timedelta(days=i % 365)).isoformat(), brand,
+           BRAND_NAMES[brand]]
+    row += [rng.randrange(10000) if rng.random() > 0.05 else None
+            for _ in range(num_metrics)]
+    records.append(row)
+  return records
+
+def fetch_job_record(job_id, state='completed', page_urls=None):
+  record = {
+    "id": job_id,
+    "state": state,
+    "created_at": '2022-08-10T00:00:00Z',
+    "updated_at": '2022-08-10T00:05:00Z',
+    "client_context": f'benchmark {job_id}',
+    "schedule_config_id": None,
+    "query_cost": 1,
+    "max_rows": None,
+    "fetch_params": {"dataset_id": 'dataset_brand_listenfirst'}
+  }
+  if page_urls is not None:
+    record["page_urls"] = page_urls
+  return record
+
+
+class MockApiServer:
+  """Threaded stub API server.
+
+  Parameters:
+  rows_per_page
+    the number of rows in each analytic page
+  pages
+    the number of pages in each analytic query and fetch job
+  num_metrics
+    the number of metric columns in analytic pages
+  list_size
+    the number of records returned by list endpoints
+  latency
+    seconds to sleep before answering each request
+  polls_until_complete
+    the number of fetch job views before a job reports 'completed'
+  compress
+    if True, responses are compressed with gzip for clients accepting it
+  """
+
+  def __init__(self, rows_per_page=1000, pages=10, num_metrics=5,
+               list_size=1000, latency=0.0, polls_until_complete=1,
+               compress=False):
+    self.rows_per_page = rows_per_page
+    self.pages = pages
+    self.num_metrics = num_metrics
+    self.list_size = list_size
+    self.latency = latency
+    self.polls_until_complete = polls_until_complete
+    self.compress = compress
+    self.request_count = 0
+    self._jobs = {}
+    self._lock = threading.Lock()
+    self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+    self._server.daemon_threads = True
+    self._thread = None
+
+    # Encode payloads once so that the server does not dominate measurements
+    columns = analytic_columns(num_metrics)
+    self._page_bodies = [
+      json.dumps({
+        "columns": columns,
+        "records": analytic_records(rows_per_page, num_metrics, seed=page),
+        "page": page,
+        "is_last_page": page == pages,
+        "total_records": rows_per_page * pages
+      }).encode() for page in range(1, pages + 1)
+    ]
+    self._list_bodies = {}
+    self._gzipped = {}
+
+  @property
+  def url(self):
+    host, port = self._server.server_address
+    return f'http://{host}:{port}'
+
+  def start(self):
+    self._thread = threading.Thread(target=self._server.serve_forever,
+                                    daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc_info):
+    self.stop()
+
+  def profile(self):
+    """Return a lfapi.Client profile pointing at the server."""
+    return {
+      "api_key": 'benchmark-key',
+      "client_id": 'benchmark-id',
+      "client_secret": 'benchmark-secret',
+      "api_host": self.url,
+      "auth_host": self.url
+    }
+
+  def _list_body(self, kind):
+    # Build list endpoint payloads lazily and cache them
+    if kind not in self._list_bodies:
+      if kind == 'fetch_job':
+        records = [fetch_job_record(i) for i in range(1, self.list_size + 1)]
+      elif kind == 'brand_views':
+        records = [{"id": i, "name": BRAND_NAMES[i % len(BRAND_NAMES)],
+                    "type": 'OWNED', "dimensions": {"lfm.brand.genres": []}}
+                   for i in range(1, self.list_size + 1)]
+      elif kind == 'brand_view_sets':
+        records = [{"id": i, "name": f'Set {i}'}
+                   for i in range(1, self.list_size + 1)]
+      else:
+        records = [{"id": f'dataset_{i}', "name": f'Dataset {i}',
+                    "description": '', "analysis_type": 'BRAND',
+                    "dataset_type": 'ANALYTIC'}
+                   for i in range(1, self.list_size + 1)]
+      self._list_bodies[kind] = json.dumps({
+        "records": records,
+        "has_more_pages": False
+      }).encode()
+    return self._list_bodies[kind]
+
+  def _route(self, method, path, body):
+    # Return (status, payload bytes) for a request
+    if path == '/oauth2/token':
+      return 200, json.dumps({"access_token": 'benchmark-token',
+                              "expires_in": 3600}).encode()
+
+    match = re.fullmatch(r'/pages/(\d+)/(\d+)', path)
+    if match:
+      return 200, self._page_bodies[int(match[2]) - 1]
+
+    if not path.startswith(API_PREFIX):
+      return 404, b'{"error": "not found"}'
+    endpoint = path[len(API_PREFIX):]
+
+    if method == 'POST' and endpoint == 'analytics/fetch':
+      page = min(max(json.loads(body).get("page", 1), 1), self.pages)
+      return 200, self._page_bodies[page - 1]
+
+    if method == 'POST' and endpoint == 'analytics/fetch_job':
+      with self._lock:
+        job_id = len(self._jobs) + 1
+        self._jobs[job_id] = 0
+      record = fetch_job_record(job_id, state='pending')
+      return 200, json.dumps({"record": record}).encode()
+
+    match = re.fullmatch(r'analytics/fetch_job/(\d+)', endpoint)
+    if match:
+      job_id = int(match[1])
+      with self._lock:
+        if job_id not in self._jobs:
+          return 404, b'{"error": "not found"}'
+        self._jobs[job_id] += 1
+        completed = self._jobs[job_id] >= self.polls_until_complete
+      if not completed:
+        record = fetch_job_record(job_id, state='running')
+      else:
+        urls = [f'{self.url}/pages/{job_id}/{page}'
+                for page in range(1, self.pages + 1)]
+        record = fetch_job_record(job_id, page_urls=urls)
+      return 200, json.dumps({"record": record}).encode()
+
+    for kind in ['analytics/fetch_job', 'brand_views', 'brand_view_sets',
+                 'dictionary/datasets']:
+      if method == 'GET' and endpoint == kind:
+        return 200, self._list_body(kind.split('/')[-1])
+
+    return 404, b'{"error": "not found"}'
+
+  def _gzip(self, payload):
+    # Compress payloads once, keyed on their identity, as they are prebuilt
+    key = id(payload)
+    if key not in self._gzipped or self._gzipped[key][0] is not payload:
+      self._gzipped[key] = (payload, gzip.compress(payload))
+    return self._gzipped[key][1]
+
+  def _handler(self):
+    server = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+
+      def _respond(self, method):
+        length = int(self.headers.get('content-length') or 0)
+        body = self.rfile.read(length) if length else b''
+        with server._lock:
+          server.request_count += 1
+        if server.latency:
+          time.sleep(server.latency)
+
+        if self.headers.get('content-encoding') == 'gzip':
+          body = gzip.decompress(body)
+        status, payload = server._route(method, urlparse(self.path).path,
+                                        body)
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        if server.compress and 'gzip' in self.headers.get('accept-encoding',
+                                                          ''):
+          payload = server._gzip(payload)
+          self.send_header('content-encoding', 'gzip')
+        self.send_header('content-length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def do_GET(self):
+        self._respond('GET')
+
+      def do_POST(self):
+        self._respond('POST')
+
+      def log_message(self, *args):
+        pass
+
+    return Handler
@@ -0,0 +1,289 @@
+"""Benchmark the SDK against a local mock ListenFirst API.
+
+Each scenario runs in a fresh process so that peak RSS is measured per
+scenario. Results are written as JSON for comparison across releases:
+
+    python -m benchmarks.run --rows-per-page 5000 --pages 20 -o bench.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import lfapi
+from benchmarks.mock_server import (MockApiServer, analytic_columns,
+                                    analytic_records, fetch_job_record)
+from lfapi.cache import ResultCache
+from lfapi.client import Client
+from lfapi.models import AnalyticResponse, FetchJob, ListModel
+
+SCENARIOS = {}
+
+def scenario(name):
+  def scenario_decorator(func):
+    SCENARIOS[name] = func
+    return func
+
+  return scenario_decorator
+
+
+# Scenarios run their untimed setup, then return an iterator yielding one
+# (rows, bytes) pair per timed operation
+@scenario('sync_analytic_query')
+def bench_sync_query(client, options):
+  pages = client.sync_analytic_query({"dataset_id": 'bench'})
+  return ((len(page), None) for page in pages)
+
+@scenario('async_analytic_query')
+def bench_async_query(client, options):
+  pages = client.async_analytic_query({"dataset_id": 'bench'})
+  return ((len(page), None) for page in pages)
+
+@scenario('download_pages')
+def bench_download_pages(client, options):
+  job = client.poll_fetch_job(client.create_fetch_job({}).id)
+  return ((len(page), None) for page in job.download_pages())
+
+@scenario('download_pages_wire_bytes')
+def bench_download_pages_wire_bytes(client, options):
+  # Report the bytes received on the wire, which differ with --compress
+  metrics = client.enable_metrics()
+  job = client.poll_fetch_job(client.create_fetch_job({}).id)
+
+  def wire_bytes(pages):
+    received = 0
+    for page in pages:
+      total = metrics.wire_bytes_in['page_url']
+      yield len(page), total - received
+      received = total
+
+  return wire_bytes(job.download_pages())
+
+@scenario('download_pages_processes')
+def bench_download_pages_processes(client, options):
+  job = client.poll_fetch_job(client.create_fetch_job({}).id)
+  pages = job.download_pages(processes=os.cpu_count())
+  return ((len(page), None) for page in pages)
+
+@scenario('download_pages_threads')
+def bench_download_pages_threads(client, options):
+  # Download ahead in threads; compare with download_pages under --latency
+  job = client.poll_fetch_job(client.create_fetch_job({}).id)
+  return ((len(page), None) for page in job.download_pages(threads=8))
+
+@scenario('download_pages_cached')
+def bench_download_pages_cached(client, options):
+  job = client.poll_fetch_job(client.create_fetch_job({}).id)
+  cache_dir = tempfile.TemporaryDirectory()
+  cache = ResultCache(cache_dir.name)
+  for _ in job.download_pages(cache=cache):  # fill the cache
+    pass
+
+  def cached_pages():
+    with cache_dir:  # removed once the pages are read
+      for page in job.download_pages(cache=cache):
+        yield len(page), None
+  return cached_pages()
+
+@scenario('construct_analytic_response')
+def bench_construct_analytic_response(client, options):
+  body = json.dumps({
+    "columns": analytic_columns(options.num_metrics),
+    "records": analytic_records(options.rows_per_page, options.num_metrics)
+  })
+  return ((len(AnalyticResponse(json.loads(body))), len(body))
+          for _ in range(options.pages))
+
+@scenario('construct_list_model')
+def bench_construct_list_model(client, options):
+  body = json.dumps({
+    "records": [fetch_job_record(i) for i in range(options.list_size)]
+  })
+  return ((len(ListModel(json.loads(body), FetchJob)), len(body))
+          for _ in range(options.pages))
+
+def _list_model_memory_scenario(compact):
+  # Report the bytes retained by a decoded listing, including its body
+  def bench_list_model_memory(client, options):
+    body = json.dumps({
+      "records": [fetch_job_record(i) for i in range(options.list_size)]
+    })
+
+    def retained():
+      tracemalloc.start()
+      lm = ListModel(json.loads(body), FetchJob, compact=compact)
+      num_bytes = tracemalloc.get_traced_memory()[0]
+      tracemalloc.stop()
+      return len(lm), num_bytes
+
+    return (retained() for _ in range(options.pages))
+
+  return bench_list_model_memory
+
+
+SCENARIOS['list_model_memory'] = _list_model_memory_scenario(False)
+SCENARIOS['list_model_memory_compact'] = _list_model_memory_scenario(True)
+
+def _export_scenario(export):
+  def bench_export(client, options):
+    columns = analytic_columns(options.num_metrics)
+    records = analytic_records(options.rows_per_page, options.num_metrics)
+
+    def fresh():
+      # A new response over a new list of the same rows, so that arrays cached
+      # by an earlier export are not reused
+      return AnalyticResponse({"columns": columns, "records": list(records)})
+
+    export(fresh())  # warm up, importing any optional dependency
+    return ((len(records), export(fresh())) for _ in range(options.pages))
+
+  return bench_export
+
+def _size(path):
+  size = os.path.getsize(path)
+  os.remove(path)
+  return size
+
+def _write_parquet(ar):
+  with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as f:
+    ar.write_parquet(f.name)
+  return _size(f.name)
+
+
+EXPORTS = {
+  "as_list": lambda ar: len(ar.as_list()) and None,
+  "to_csv": lambda ar: len(ar.to_csv(io.StringIO()) or ''),
+  "to_json": lambda ar: len(ar.to_json()),
+  "to_numpy": lambda ar: sum(arr.nbytes for arr in ar.to_numpy().values()),
+  "to_pandas": lambda ar: int(ar.to_pandas().memory_usage(deep=True).sum()),
+  "to_pyarrow": lambda ar: ar.to_pyarrow().nbytes,
+  "to_polars": lambda ar: int(ar.to_polars().estimated_size()),
+  "write_parquet": _write_parquet
+}
+for export_name, export in EXPORTS.items():
+  SCENARIOS[f'export_{export_name}'] = _export_scenario(export)
+
+
+def percentile(values, pct):
+  if len(values) == 1:
+    return values[0]
+  return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+def measure(name, profile, options):
+  """Run one scenario and return its measurements."""
+  client = Client.from_dict(profile)
+  latencies = []
+  rows = 0
+  num_bytes = 0
+
+  try:
+    operations = SCENARIOS[name](client, options)
+  except NotImplementedError as err:  # optional dependency not installed
+    return {"skipped": str(err)}
+
+  cpu_start = time.process_time()
+  wall_start = time.perf_counter()
+  op_start = wall_start
+  for op_rows, op_bytes in operations:
+    now = time.perf_counter()
+    latencies.append(now - op_start)
+    rows += op_rows
+    num_bytes += op_bytes or 0
+    op_start = now
+  wall = time.perf_counter() - wall_start
+  cpu = time.process_time() - cpu_start
+
+  # ru_maxrss is in kilobytes on Linux and bytes on macOS
+  maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform != 'darwin':
+    maxrss *= 1024
+
+  return {
+    "operations": len(latencies),
+    "rows": rows,
+    "bytes": num_bytes,
+    "wall_seconds": wall,
+    "cpu_seconds": cpu,
+    "rows_per_second": rows / wall if wall else None,
+    "bytes_per_row": num_bytes / rows if rows else None,
+    "latency_seconds": {
+      "p50": percentile(latencies, 50),
+      "p90": percentile(latencies, 90),
+      "p99": percentile(latencies, 99),
+      "max": max(latencies)
+    } if latencies else None,
+    "peak_rss_bytes": maxrss
+  }
+
+def run(options):
+  server_kwargs = {
+    "rows_per_page": options.rows_per_page,
+    "pages": options.pages,
+    "num_metrics": options.num_metrics,
+    "list_size": options.list_size,
+    "latency": options.latency,
+    "compress": options.compress
+  }
+  names = options.scenarios or list(SCENARIOS)
+  results = {}
+
+  # A fresh worker process per scenario keeps peak RSS figures separate
+  ctx = multiprocessing.get_context('spawn')
+  with MockApiServer(**server_kwargs) as server:
+    for name in names:
+      with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+        results[name] = pool.submit(measure, name, server.profile(),
+                                    options).result()
+      print(f'{name}: {json.dumps(results[name])}', file=sys.stderr)
+
+  return {
+    "lfapi_version": lfapi.__version__,
+    "python_version": platform.python_version(),
+    "platform": platform.platform(),
+    "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    "parameters": server_kwargs,
+    "results": results
+  }
+
+def parse_args(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                      help=f'scenarios to run; defaults to all of: '
+                           f'{", ".join(SCENARIOS)}')
+  parser.add_argument('--rows-per-page', type=int, default=1000)
+  parser.add_argument('--pages', type=int, default=10)
+  parser.add_argument('--num-metrics', type=int, default=5)
+  parser.add_argument('--list-size', type=int, default=1000)
+  parser.add_argument('--latency', type=float, default=0.0,
+                      help='server latency per request in seconds')
+  parser.add_argument('--compress', action='store_true',
+                      help='compress responses with gzip')
+  parser.add_argument('-o', '--output', help='file to write JSON results to')
+  options = parser.parse_args(argv)
+
+  unknown = set(options.scenarios) - SCENARIOS.keys()
+  if unknown:
+    parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+  return options
+
+def main(argv=None):
+  options = parse_args(argv)
+  report = run(options)
+  if options.output is None:
+    json.dump(report, sys.stdout, indent=2)
+  else:
+    with open(options.output, 'w') as f:
+      json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -1,8 +1,63 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from urllib.parse import urljoin
 
+import lfapi.fork_utils as fork_utils
 import lfapi.http_utils as http
+from lfapi.checkpoint import dump_atomic
+from lfapi.dep_utils import safe_import
 from lfapi.errors import AuthError, HttpError
+from lfapi.instrumentation import Hooks
+
+fcntl = safe_import('fcntl')
+
+
+class FileTokenStore:
+  """Access token shared between processes through a JSON file.
+
+  Auth objects given the same store read a token another process fetched
+  instead of fetching their own, and hold an exclusive lock on a companion
+  .lock file while refreshing, so a pool of worker processes fetches one token
+  between them. The lock is advisory and only taken where fcntl is available.
+
+  Parameters:
+  path
+    the filename of the JSON file holding the token, which is written readable
+    by its owner only
+  """
+
+  def __init__(self, path):
+    self.path = path
+
+  def load(self):
+    """Return the stored (access_token, expires_at), or None."""
+    try:
+      with open(self.path) as f:
+        state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return None
+    return (state["access_token"],
+            datetime.fromisoformat(state["expires_at"]))
+
+  def save(self, access_token, expires_at):
+    """Store a token and its expiry."""
+    dump_atomic({"access_token": access_token,
+                 "expires_at": expires_at.isoformat()}, self.path, mode=0o600)
+
+  @contextmanager
+  def lock(self):
+    """Hold the store's lock, across processes where fcntl is available."""
+    with open(f'{self.path}.lock', 'a') as f:
+      if fcntl:
+        fcntl.flock(f, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        if fcntl:
+          fcntl.flock(f, fcntl.LOCK_UN)
 
 
 class Auth:
@@ -15,21 +70,48 @@ class Auth:
     the client secret for the app client
   api_host
     the host to send requests to; defaults to DEFAULT_AUTH_HOST
+  token_store
+    a FileTokenStore sharing the token with other processes (optional)
+
+  Auth objects can be pickled with their current token, so processes given a
+  pickled copy use it without authenticating again until it expires.
 
   Attributes:
   access_token
     the token to use to access the API; automatically refreshed upon expiration
+  hooks
+    the instrumentation.Hooks registry receiving on_token_refresh events
   """
 
   DEFAULT_AUTH_HOST = 'https://auth.listenfirstmedia.com'
   EXP_BUFFER = timedelta(minutes=1)
 
-  def __init__(self, client_id, client_secret, auth_host=None):
+  def __init__(self, client_id, client_secret, auth_host=None,
+               token_store=None):
     self.client_id = client_id
     self.client_secret = client_secret
     self.auth_host = Auth.DEFAULT_AUTH_HOST if auth_host is None else auth_host
+    self.token_store = token_store
     self._access_token = None
     self._expires_at = None
+    self.hooks = Hooks()
+    self._lock = threading.Lock()
+    fork_utils.register(self)
+
+  def __getstate__(self):
+    # Hooks and the lock belong to the process
+    state = self.__dict__.copy()
+    del state["hooks"], state["_lock"]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.hooks = Hooks()
+    self._lock = threading.Lock()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    self._lock = threading.Lock()
 
   def _fetch_access_token(self):
     # Fetch a token from the auth host's token endpoint
@@ -57,12 +139,34 @@ class Auth:
     return resp_data
 
 
+  def _expired(self):
+    return (self._expires_at is None or
+            self._expires_at <= datetime.utcnow() + Auth.EXP_BUFFER)
+
+  def _refresh(self):
+    start = time.perf_counter()
+    token_data = self._fetch_access_token()
+    if self.hooks:
+      self.hooks.emit('on_token_refresh',
+                      seconds=time.perf_counter() - start,
+                      expires_in=token_data["expires_in"])
+    self._expires_at = (datetime.utcnow() +
+                        timedelta(seconds=token_data["expires_in"]))
+    self._access_token = token_data["access_token"]
+
   @property
   def access_token(self):
-    if (self._expires_at is None or
-        self._expires_at <= datetime.utcnow() + Auth.EXP_BUFFER):
-      token_data = self._fetch_access_token()
-      self._expires_at = (datetime.utcnow() +
-                          timedelta(seconds=token_data["expires_in"]))
-      self._access_token = token_data["access_token"]
-    return self._access_token
+    # Refresh the token once when clients sharing it find it expired together
+    with self._lock:
+      if self._expired() and self.token_store is None:
+        self._refresh()
+      elif self._expired():
+        # Take a token another process stored, or refresh and store one
+        with self.token_store.lock():
+          stored = self.token_store.load()
+          if stored is not None:
+            self._access_token, self._expires_at = stored
+          if self._expired():
+            self._refresh()
+            self.token_store.save(self._access_token, self._expires_at)
+      return self._access_token
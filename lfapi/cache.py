@@ -0,0 +1,194 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+import lfapi.models as models
+from lfapi.checkpoint import dump_atomic, fingerprint
+from lfapi.dep_utils import depends_on, lazy_import
+from lfapi.errors import LfError
+
+pa = lazy_import('pyarrow')
+ipc = lazy_import('pyarrow.ipc')
+
+MANIFEST = 'manifest.json'
+
+
+class ResultCache:
+  """Local cache of downloaded analytic results as Arrow IPC (Feather) files.
+
+  Each entry holds the pages of one query, parsed with one set of
+  AnalyticResponse arguments, under <root>/<key>/<page>.arrow. Entries are
+  reopened with memory-mapping, so cached pages load without copying or
+  decoding JSON. Once the cache exceeds max_bytes on disk, the least recently
+  used entries are evicted, and entries older than max_age are dropped when
+  next looked up. Not implemented if PyArrow is not installed.
+
+  Parameters:
+  root
+    the directory of the cache
+  max_bytes
+    the maximum total size of the cached files; defaults to 1 GiB
+  max_age
+    the seconds an entry is served for after it was stored; defaults to no
+    limit
+  """
+
+  def __init__(self, root, max_bytes=2**30, max_age=None):
+    self.root = root
+    self.max_bytes = max_bytes
+    self.max_age = max_age
+
+  @staticmethod
+  def key(query, **model_kwargs):
+    """Return the cache key of a query and its AnalyticResponse arguments.
+
+    Arguments:
+    query
+      a JSON-serializable description of the query, such as its fetch_params
+    **model_kwargs
+      the label_mode, columns and where arguments the pages are parsed with;
+      where functions cannot be cached
+    """
+    where = model_kwargs.get("where") or {}
+    if any(callable(test) for test in where.values()):
+      raise LfError('Pages filtered with functions cannot be cached.')
+    # Prefix keys with the query's fingerprint so invalidate() can find them
+    return f'{fingerprint(query)[:32]}-{fingerprint(model_kwargs)[:32]}'
+
+  def invalidate(self, query):
+    """Remove the entries of a query, whatever arguments its pages were
+    parsed with, e.g. once new data has landed.
+
+    Arguments:
+    query
+      the query as passed to key(); async_analytic_query() and
+      FetchJob.download_pages() use {"fetch_params": ..., "max_rows": ...}
+    """
+    prefix = f'{fingerprint(query)[:32]}-'
+    for key, _, _ in self.entries():
+      if key.startswith(prefix):
+        self.evict(key)
+
+  def _entry_dir(self, key):
+    return os.path.join(self.root, key)
+
+  def _manifest(self, key):
+    # Return the manifest of a complete entry, or None, evicting the entry if
+    # it has expired
+    try:
+      with open(os.path.join(self._entry_dir(key), MANIFEST)) as f:
+        manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return None
+    if (self.max_age is not None and
+        time.time() - manifest.get("created", 0) > self.max_age):
+      self.evict(key)
+      return None
+    return manifest
+
+  def __contains__(self, key):
+    return self._manifest(key) is not None
+
+  @depends_on('pyarrow')
+  def load(self, key, client=None):
+    """Return a generator of the cached pages of an entry as
+    models.AnalyticResponse objects, backed by memory-mapped Arrow tables.
+    """
+    manifest = self._manifest(key)
+    if manifest is None:
+      raise LfError(f'No cached result for key {key}')
+
+    entry_dir = self._entry_dir(key)
+    os.utime(entry_dir)  # mark as recently used
+    paths = [os.path.join(entry_dir, f'{page}.arrow')
+             for page in range(manifest["pages"])]
+    return self._read_pages(paths, client)
+
+  def _read_pages(self, paths, client):
+    # The tables' buffers keep the mapped files open
+    for path in paths:
+      table = ipc.open_file(pa.memory_map(path)).read_all()
+      yield models.AnalyticResponse.from_pyarrow(table, client=client)
+
+  @depends_on('pyarrow')
+  def store(self, key, pages):
+    """Return a generator yielding pages while writing them to an entry.
+
+    The entry is only added once every page has been written, replacing any
+    previous entry with the same key; least recently used entries are then
+    evicted to keep the cache under max_bytes.
+
+    Arguments:
+    key
+      the cache key; see key()
+    pages
+      an iterable of models.AnalyticResponse objects
+    """
+    os.makedirs(self.root, exist_ok=True)
+    return self._write_pages(key, pages)
+
+  def _write_pages(self, key, pages):
+    # Write to a temporary directory, then move it into place
+    tmp_dir = os.path.join(self.root, f'.{key}.{uuid.uuid4().hex}.tmp')
+    os.makedirs(tmp_dir)
+    try:
+      num_bytes = 0
+      count = 0
+      for count, page in enumerate(pages, start=1):
+        path = os.path.join(tmp_dir, f'{count - 1}.arrow')
+        table = page.to_pyarrow(keep_metadata=True)
+        with ipc.new_file(path, table.schema) as writer:
+          writer.write_table(table)
+        num_bytes += os.path.getsize(path)
+        yield page
+
+      dump_atomic({"pages": count, "bytes": num_bytes, "created": time.time()},
+                  os.path.join(tmp_dir, MANIFEST))
+      self.evict(key)
+      os.replace(tmp_dir, self._entry_dir(key))
+    finally:
+      shutil.rmtree(tmp_dir, ignore_errors=True)
+    self.prune(keep=key)
+
+  def evict(self, key):
+    """Remove an entry from the cache."""
+    shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+  def entries(self):
+    """Return (key, bytes, last used time) tuples for the complete entries,
+    least recently used first.
+    """
+    if not os.path.isdir(self.root):
+      return []
+
+    entries = []
+    for key in os.listdir(self.root):
+      manifest = self._manifest(key)
+      if manifest is not None:
+        last_used = os.path.getmtime(self._entry_dir(key))
+        entries.append((key, manifest["bytes"], last_used))
+    return sorted(entries, key=lambda entry: entry[2])
+
+  def size(self):
+    """Return the total size of the cached files in bytes."""
+    return sum(num_bytes for _, num_bytes, _ in self.entries())
+
+  def prune(self, keep=None):
+    """Evict least recently used entries until the cache fits in max_bytes,
+    never evicting the entry with key keep.
+    """
+    entries = self.entries()
+    total = sum(num_bytes for _, num_bytes, _ in entries)
+    for key, num_bytes, _ in entries:
+      if total <= self.max_bytes:
+        break
+      if key != keep:
+        self.evict(key)
+        total -= num_bytes
+
+  def clear(self):
+    """Remove every entry from the cache."""
+    for key, _, _ in self.entries():
+      self.evict(key)
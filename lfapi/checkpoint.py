@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import uuid
+
+
+def _code_key(code):
+  # Describe compiled code without the addresses in the repr of nested code
+  consts = [_code_key(const) if isinstance(const, type(code)) else repr(const)
+            for const in code.co_consts]
+  return [code.co_code.hex(), consts, list(code.co_names)]
+
+def _cell_value(obj, cell):
+  # Refer to the function itself by name so recursive closures terminate
+  try:
+    value = cell.cell_contents
+  except ValueError:  # an empty cell
+    return None
+  return value.__qualname__ if value is obj else value
+
+def _stable(obj):
+  # Represent functions, e.g. row filters, by their code, defaults and
+  # captured values, since their str() changes between runs
+  code = getattr(obj, "__code__", None)
+  if code is not None:
+    closure = [_cell_value(obj, cell) for cell in obj.__closure__ or ()]
+    return [getattr(obj, "__qualname__", None), _code_key(code),
+            obj.__defaults__, obj.__kwdefaults__, closure]
+  return str(obj)
+
+def fingerprint(obj):
+  """Return a stable hash of a JSON-serializable object, such as a query.
+  Functions are hashed by their name, code, defaults and the values their
+  closures capture.
+  """
+  dump = json.dumps(obj, sort_keys=True, separators=(',', ':'),
+                    default=_stable)
+  return hashlib.sha256(dump.encode()).hexdigest()
+
+
+def dump_atomic(obj, path, mode=0o666):
+  """Write an object to a JSON file without ever leaving a partial file.
+
+  Each write goes through its own temporary file, so processes writing the
+  same file concurrently each replace it whole; the last write wins. The file
+  is created with the permissions in mode, less the umask.
+  """
+  tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+  try:
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    with open(fd, 'w') as f:
+      json.dump(obj, f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+  except BaseException:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+    raise
+
+
+class Checkpoint:
+  """Progress record for resumable paginated pulls.
+
+  The checkpoint file holds the fingerprint of the query being pulled, the
+  number of the last completed page and the offset of the output sink at the
+  time that page was completed. Re-running the same query against the same
+  checkpoint continues from the next page; running a different query starts
+  over.
+
+  Parameters:
+  path
+    the filename of the checkpoint file
+  sink
+    a seekable file object receiving the output; optional. When given, it is
+    truncated to the recorded offset on resume so that output written after
+    the last completed page is discarded, and to 0 when starting over.
+
+  Attributes:
+  page
+    the number of the last completed page; 0 if nothing has completed
+  offset
+    the sink offset recorded with the last completed page
+  """
+
+  def __init__(self, path, sink=None):
+    self.path = path
+    self.sink = sink
+    self.fingerprint = None
+    self.page = 0
+    self.offset = 0
+
+  def _read(self):
+    # Read the checkpoint file, treating a missing or corrupt file as empty
+    try:
+      with open(self.path) as f:
+        return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return {}
+
+  def _write(self):
+    state = {
+      "fingerprint": self.fingerprint,
+      "page": self.page,
+      "offset": self.offset
+    }
+    dump_atomic(state, self.path)
+
+  def start(self, key):
+    """Bind the checkpoint to a query and return the last completed page.
+
+    Arguments:
+    key
+      the fingerprint of the query being pulled
+    """
+    state = self._read()
+    self.fingerprint = key
+    if state.get("fingerprint") == key:
+      self.page = state.get("page", 0)
+      self.offset = state.get("offset", 0)
+    else:
+      self.page = 0
+      self.offset = 0
+
+    if self.sink is not None:
+      self.sink.seek(self.offset)
+      self.sink.truncate()
+
+    return self.page
+
+  def commit(self, page):
+    """Record a page as completed, along with the current sink offset."""
+    if self.sink is not None:
+      self.sink.flush()
+      self.offset = self.sink.tell()
+    self.page = page
+    self._write()
+
+  def clear(self):
+    """Remove the checkpoint file once a pull has finished."""
+    self.page = 0
+    self.offset = 0
+    try:
+      os.remove(self.path)
+    except FileNotFoundError:
+      pass
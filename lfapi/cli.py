@@ -0,0 +1,268 @@
+"""Export analytic queries to files.
+
+Each query file holds the fetch_params of a query, or an object with a
+fetch_params entry and optional client_context and max_rows entries. Queries
+run concurrently through one client with an adaptive concurrency limit, and
+each is streamed to <output-dir>/<query file name>.<format>:
+
+    lfapi --profile profile.json --format parquet -o exports queries/*.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from lfapi.checkpoint import Checkpoint
+from lfapi.client import Client
+from lfapi.concurrency import AdaptiveLimiter
+from lfapi.dep_utils import lazy_import
+from lfapi.errors import LfError
+
+pq = lazy_import('pyarrow.parquet')
+
+MODES = ['auto', 'sync', 'async']
+
+
+class Writer:
+  """Writes pages to an open file.
+
+  Parameters:
+  fp
+    the file object to write to
+  """
+
+  def __init__(self, fp):
+    self.fp = fp
+
+  def write(self, page):
+    raise NotImplementedError
+
+  def close(self):
+    pass
+
+class CsvWriter(Writer):
+  """Writes pages as CSV rows, with a header row at the start of the file."""
+
+  def __init__(self, fp):
+    super().__init__(fp)
+    self._writer = csv.writer(fp)
+
+  def write(self, page):
+    if self.fp.tell() == 0:
+      self._writer.writerow(page._labels)
+    self._writer.writerows(page.records)
+
+class JsonlWriter(Writer):
+  """Writes pages as one JSON object per row."""
+
+  def write(self, page):
+    self.fp.writelines(json.dumps(row) + '\n' for row in page.as_list())
+
+class ParquetWriter(Writer):
+  """Writes pages as row groups of a Parquet file, cast to the schema of the
+  first page.
+  """
+
+  def __init__(self, fp):
+    super().__init__(fp)
+    self._writer = None
+
+  def write(self, page):
+    table = page.to_pyarrow()
+    if self._writer is None:
+      self._writer = pq.ParquetWriter(self.fp, table.schema)
+    else:
+      table = table.cast(self._writer.schema)
+    self._writer.write_table(table)
+
+  def close(self):
+    if self._writer is not None:
+      self._writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+class Progress:
+  """Running totals of an export, drawn on one line of a stream.
+
+  Parameters:
+  pending
+    the number of queries to run
+  stream
+    the stream to draw on, or None to draw nothing
+  interval
+    the least seconds between redraws
+  """
+
+  def __init__(self, pending, stream=None, interval=0.5):
+    self.pending = pending
+    self.stream = stream
+    self.interval = interval
+    self.rows = 0
+    self.bytes = 0
+    self.start = time.perf_counter()
+    self._drawn = 0
+    self._lock = threading.Lock()
+
+  def update(self, rows=0, num_bytes=0, done=False):
+    with self._lock:
+      self.rows += rows
+      self.bytes += num_bytes
+      self.pending -= done
+      now = time.perf_counter()
+      if self.stream is not None and (done or
+                                      now - self._drawn >= self.interval):
+        self._drawn = now
+        self._draw(now - self.start)
+
+  def _draw(self, seconds):
+    seconds = max(seconds, 1e-9)
+    self.stream.write(f'\r{self.rows} rows, {self.rows / seconds:.0f} rows/s, '
+                      f'{self.bytes / seconds / 2**20:.2f} MB/s, '
+                      f'{self.pending} queries pending')
+    self.stream.flush()
+
+  def finish(self):
+    if self.stream is not None:
+      self.stream.write('\n')
+
+
+def read_query(path):
+  """Return the fetch_params and async options of a query file."""
+  with open(path) as f:
+    query = json.load(f)
+  if not isinstance(query, dict):
+    raise LfError(f'{path} does not hold a JSON object')
+  if "fetch_params" not in query:
+    return query, {}
+  options = {key: query[key] for key in ("client_context", "max_rows")
+             if key in query}
+  return query["fetch_params"], options
+
+def output_path(query_path, options):
+  name = os.path.splitext(os.path.basename(query_path))[0]
+  return os.path.join(options.output_dir, f'{name}.{options.format}')
+
+def query_pages(client, fetch_params, query_options, options, checkpoint):
+  # Return the page generator of a query in the chosen mode; queries with
+  # fetch job options run as fetch jobs in auto mode and fail in sync mode
+  if options.mode == 'sync' and query_options:
+    raise LfError(f'{", ".join(query_options)} cannot be used with '
+                  '--mode sync')
+  if options.mode == 'sync':
+    return client.sync_analytic_query(fetch_params, checkpoint=checkpoint)
+  if options.mode == 'async' or query_options:
+    return client.async_analytic_query(fetch_params, checkpoint=checkpoint,
+                                       **query_options)
+  return client.query(fetch_params)
+
+def export(client, query_path, options, progress):
+  """Run one query file and write its pages, returning a summary dict."""
+  path = output_path(query_path, options)
+  summary = {"query": query_path, "output": path, "rows": 0, "bytes": 0,
+             "error": None}
+  start = time.perf_counter()
+
+  try:
+    fetch_params, query_options = read_query(query_path)
+    if options.format == 'parquet':
+      fp = open(path, 'wb')
+    else:
+      fp = open(path, 'a' if options.checkpoint_dir else 'w', newline='')
+    writer = WRITERS[options.format](fp)
+
+    checkpoint = None
+    if options.checkpoint_dir:
+      ckpt_path = os.path.join(options.checkpoint_dir,
+                               os.path.basename(path) + '.ckpt')
+      checkpoint = Checkpoint(ckpt_path, sink=fp)
+
+    try:
+      for page in query_pages(client, fetch_params, query_options, options,
+                              checkpoint):
+        before = fp.tell()
+        writer.write(page)
+        written = fp.tell() - before
+        summary["rows"] += len(page)
+        summary["bytes"] += written
+        progress.update(rows=len(page), num_bytes=written)
+    finally:
+      writer.close()
+      fp.close()
+  except (LfError, OSError, ValueError, KeyError) as err:
+    summary["error"] = str(err) or type(err).__name__
+
+  summary["seconds"] = time.perf_counter() - start
+  progress.update(done=True)
+  return summary
+
+def format_summary(summary):
+  seconds = max(summary["seconds"], 1e-9)
+  line = (f'{summary["query"]}: {summary["rows"]} rows, '
+          f'{summary["bytes"] / 2**20:.2f} MB in {summary["seconds"]:.1f}s '
+          f'({summary["rows"] / seconds:.0f} rows/s, '
+          f'{summary["bytes"] / seconds / 2**20:.2f} MB/s)')
+  if summary["error"] is not None:
+    line += f' FAILED: {summary["error"]}'
+  return line
+
+def parse_args(argv=None):
+  parser = argparse.ArgumentParser(prog='lfapi',
+                                   description=__doc__.splitlines()[0])
+  parser.add_argument('queries', nargs='+', metavar='QUERY',
+                      help='JSON query files')
+  parser.add_argument('-p', '--profile', required=True,
+                      help='client profile JSON file; see Client.load()')
+  parser.add_argument('-f', '--format', choices=list(WRITERS), default='csv')
+  parser.add_argument('-o', '--output-dir', default='.')
+  parser.add_argument('-m', '--mode', choices=MODES, default='auto',
+                      help='run queries as sync pages, fetch jobs, or '
+                           'whichever is expected to be faster')
+  parser.add_argument('-j', '--concurrency', type=int, default=4,
+                      help='queries run at once')
+  parser.add_argument('--max-in-flight', type=int, default=16,
+                      help='upper bound of the adaptive request limit')
+  parser.add_argument('--checkpoint-dir',
+                      help='resume interrupted queries from checkpoints')
+  parser.add_argument('-q', '--quiet', action='store_true',
+                      help='do not draw progress')
+  options = parser.parse_args(argv)
+
+  if options.checkpoint_dir and options.mode == 'auto':
+    parser.error('--checkpoint-dir requires --mode sync or async')
+  if options.format == 'parquet':
+    if options.checkpoint_dir:
+      parser.error('--checkpoint-dir cannot resume parquet output')
+    if not pq:
+      parser.error('parquet output requires pyarrow')
+  return options
+
+def main(argv=None):
+  options = parse_args(argv)
+  os.makedirs(options.output_dir, exist_ok=True)
+  if options.checkpoint_dir:
+    os.makedirs(options.checkpoint_dir, exist_ok=True)
+
+  limiter = AdaptiveLimiter(max_limit=options.max_in_flight)
+  client = Client.load(options.profile, limiter=limiter)
+  progress = Progress(len(options.queries),
+                      stream=None if options.quiet else sys.stderr)
+
+  with ThreadPoolExecutor(options.concurrency) as pool:
+    run = partial(export, client, options=options, progress=progress)
+    summaries = list(pool.map(run, options.queries))
+  progress.finish()
+
+  for summary in summaries:
+    print(format_summary(summary))
+  return 1 if any(summary["error"] for summary in summaries) else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
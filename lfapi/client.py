@@ -1,12 +1,20 @@
+import copy
 import json
-from functools import wraps
+import time
+from functools import partial, wraps
 from math import inf
 from urllib.parse import urljoin
 
+import lfapi.fork_utils as fork_utils
 import lfapi.http_utils as http
 import lfapi.models as models
-from lfapi.auth import Auth
-from lfapi.errors import LfError
+from lfapi.auth import Auth, FileTokenStore
+from lfapi.checkpoint import fingerprint
+from lfapi.errors import HttpError, LfError
+from lfapi.instrumentation import Hooks, MetricsCollector, endpoint_label
+from lfapi.planner import QueryPlanner
+from lfapi.profiling import Profiler, phase
+from lfapi.tracing import span
 
 
 def as_model(model, listed=False):
@@ -18,10 +26,7 @@ def as_model(model, listed=False):
     @wraps(mth)
     def _mth(self, *args, **kwargs):
       res = mth(self, *args, **kwargs)
-      body = res.json()
-      if listed:
-        return models.ListModel(body, model, client=self)
-      return model(body, client=self)
+      return self._to_model(res, model, listed=listed)
 
     return _mth
 
@@ -39,27 +44,163 @@ class Client:
     the acting account for requests; can be set to None for primary account use
   api_host
     the host to send requests to; defaults to DEFAULT_API_HOST
+  profile
+    if True, record time spent in the SDK's phases on a profiling.Profiler
+    available as the profiler attribute
+  compact_records
+    if True, listings such as list_fetch_jobs() keep their entries as
+    slot-based models.CompactRecord objects; see models.ListModel
+  gzip_min_bytes
+    if specified, POST bodies of at least this many bytes are sent compressed
+    with gzip
+  hedge_policy
+    a hedging.HedgePolicy; if specified, slow GET requests, including page
+    downloads, are sent again and the first response is used
+  limiter
+    a concurrency.AdaptiveLimiter; if specified, every request waits for a
+    slot under its limit, which adapts to latency and 429/5xx responses
+  session
+    a requests.Session sending the client's requests, so that clients sharing
+    it share its connection pool; defaults to a new connection per request
+  planner
+    the planner.QueryPlanner choosing how query() runs queries; defaults to
+    a planner keeping its history in memory
+  schemas
+    a schema.SchemaRegistry; if specified, the fields named by queries are
+    checked against their dataset before the queries are sent
+
+  Clients can be pickled, e.g. to send them to multiprocessing workers: the
+  copy keeps its configuration, access token, limiter state, planner and
+  schemas, and starts with its own hooks, metrics, profiler and connection
+  pool. In a child created by os.fork(), the session is replaced with a copy
+  holding new connections, shared by the clients that shared it, and locks
+  and threads are recreated.
+
+  Attributes:
+  hooks
+    the instrumentation.Hooks registry for request, retry, token refresh and
+    fetch job events
+  metrics
+    the instrumentation.MetricsCollector, once enabled by enable_metrics()
+  profiler
+    the profiling.Profiler when profile is True, otherwise None
   """
 
   DEFAULT_API_HOST = 'https://listenfirst.io'
   API_VERSION = 'v20200626/'
 
-  def __init__(self, api_key, auth, account_id=None, api_host=None):
+  def __init__(self, api_key, auth, account_id=None, api_host=None,
+               profile=False, compact_records=False, gzip_min_bytes=None,
+               hedge_policy=None, limiter=None, session=None,
+               planner=None, schemas=None):
     self.api_key = api_key
     self.auth = auth
     self.account_id = account_id
     self.api_host = Client.DEFAULT_API_HOST if api_host is None else api_host
+    self.hooks = Hooks()
+    self.metrics = None
+    self.profiler = Profiler() if profile else None
+    self.compact_records = compact_records
+    self.gzip_min_bytes = gzip_min_bytes
+    self.hedge_policy = hedge_policy
+    self.limiter = limiter
+    self.session = session
+    self.planner = QueryPlanner() if planner is None else planner
+    self.schemas = schemas
+    self.auth.hooks.forward('on_token_refresh', self.hooks)
+    if limiter is not None:
+      limiter.hooks.forward('on_limit_change', self.hooks)
+    fork_utils.register(self)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    """Stop the threads of the client's hedge policy, if any; see
+    hedging.HedgePolicy.close().
+    """
+    if self.hedge_policy is not None:
+      self.hedge_policy.close()
+
+  def __getstate__(self):
+    # Pickle the constructor arguments; hooks and metrics stay behind
+    return {
+      "api_key": self.api_key,
+      "auth": self.auth,
+      "account_id": self.account_id,
+      "api_host": self.api_host,
+      "profile": self.profiler is not None,
+      "compact_records": self.compact_records,
+      "gzip_min_bytes": self.gzip_min_bytes,
+      "hedge_policy": self.hedge_policy,
+      "limiter": self.limiter,
+      "session": self.session,
+      "planner": self.planner,
+      "schemas": self.schemas
+    }
+
+  def __setstate__(self, state):
+    self.__init__(**state)
 
+  def _after_fork(self):
+    # Connections in the parent's pool must not be used by two processes
+    if self.session is not None:
+      self.session = fork_utils.renew(self.session,
+                                      partial(copy.deepcopy, self.session))
+
+  # instrumentation methods
+  def on(self, event, callback):
+    """Register a callback for an instrumentation event; see
+    instrumentation.Hooks for the events and their arguments.
+    """
+    self.hooks.register(event, callback)
+
+  def enable_metrics(self):
+    """Attach a built-in metrics collector and return it."""
+    if self.metrics is None:
+      self.metrics = MetricsCollector().attach(self)
+    return self.metrics
+
+
+  def _to_model(self, res, model, listed=False, **model_kwargs):
+    # Decode a response body and wrap it in a model, recording both steps
+    with phase('decode', self.profiler):
+      if self.hooks:
+        start = time.perf_counter()
+        body = res.json()
+        self.hooks.emit('after_decode', model=model.__name__,
+                        seconds=time.perf_counter() - start)
+      else:
+        body = res.json()
+
+    with phase('model', self.profiler):
+      if listed:
+        return models.ListModel(body, model, client=self,
+                                compact=self.compact_records)
+      return model(body, client=self, **model_kwargs)
 
   # analytics methods
-  @as_model(models.AnalyticResponse)
-  def fetch(self, json):
-    """POST request to /analytics/fetch to perform a synchronous query."""
-    return self.secure_post('analytics/fetch', json=json)
+  def fetch(self, json, columns=None, where=None, validate=True):
+    """POST request to /analytics/fetch to perform a synchronous query.
+
+    The columns and where arguments apply a column projection and row filter
+    as the response is parsed; see models.AnalyticResponse. If validate is
+    True, the query is checked against the client's schemas, if any.
+    """
+    if validate and self.schemas is not None:
+      self.schemas.validate(json)
+    res = self.secure_post('analytics/fetch', json=json)
+    return self._to_model(res, models.AnalyticResponse, columns=columns,
+                          where=where)
 
   @as_model(models.FetchJob)
   def create_fetch_job(self, json):
     """POST request to /analytics/fetch_job to create an asynchronous query."""
+    if self.schemas is not None:
+      self.schemas.validate(json["fetch_params"])
     return self.secure_post('analytics/fetch_job', json=json)
 
   @as_model(models.FetchJob)
@@ -109,18 +250,58 @@ class Client:
   def poll_fetch_job(self, job_id):
     """Pull fetch job summary until state is one of 'completed', 'failed'."""
 
-    return http.retry(
-      self.secure_get,
+    last_state = None
+    last_change = time.perf_counter()
+    iteration = 0
+
+    def poll_once(endpoint):
+      # Decode each poll's state once, for the span and for is_pending()
+      nonlocal iteration
+      iteration += 1
+      with span('lfapi.poll_fetch_job', job_id=job_id,
+                iteration=iteration) as current:
+        response = self.secure_get(endpoint)
+        state = response.json()["record"]["state"]
+        if current.is_recording():
+          current.set_attribute('state', state)
+        return response, state
+
+    def is_pending(result):
+      nonlocal last_state, last_change
+      state = result[1]
+      if state != last_state and self.hooks:
+        now = time.perf_counter()
+        if last_state is not None:
+          self.hooks.emit('on_job_state_change', job_id=job_id,
+                          previous_state=last_state, state=state,
+                          seconds=now - last_change)
+        last_change = now
+      last_state = state
+      return state not in ['completed', 'failed']
+
+    response, _ = http.retry(
+      poll_once,
       max_tries=inf,
       max_wait_time=60 * 90,
       delay=1,
-      retry_condition=lambda r: r.json()["record"]["state"] not in [
-        'completed',
-        'failed'
-      ]
+      retry_condition=is_pending,
+      on_retry=partial(self.hooks.emit, 'on_retry') if self.hooks else None
     )(f'analytics/fetch_job/{job_id}')
+    return response
+
+  def query(self, fetch_params, columns=None, where=None):
+    """Run an analytic query with sync_analytic_query() or
+    async_analytic_query(), whichever the client's planner expects to finish
+    first, choosing the page size and download threads as well; see
+    planner.QueryPlanner.
+
+    Returns:
+      generator of pages as models.AnalyticResponse objects
+    """
+    return self.planner.run(self, fetch_params, columns=columns, where=where)
 
-  def sync_analytic_query(self, fetch_params, per_page=None, max_pages=inf):
+  def sync_analytic_query(self, fetch_params, per_page=None, max_pages=inf,
+                          checkpoint=None, columns=None, where=None):
     """Run multiple pages of synchronous analytic queries.
 
     Arguments:
@@ -132,6 +313,14 @@ class Client:
       the number of rows to include in each page (optional)
     max_pages
       the max number of pages to synchronously fetch (optional)
+    checkpoint
+      a lfapi.checkpoint.Checkpoint; if specified, a page is recorded as
+      completed once the next page is requested, and a re-run of the same
+      query, columns and where resumes after the last completed page
+      (optional)
+    columns, where
+      the column projection and row filter applied to each page as it is
+      parsed; see models.AnalyticResponse (optional)
 
     Returns:
       generator of requested pages as models.AnalyticResponse objects
@@ -141,17 +330,33 @@ class Client:
     if per_page is not None:
       params["per_page"] = per_page
 
-    # Yield each page
+    # Check the query once rather than for every page
+    if self.schemas is not None:
+      self.schemas.validate(params)
+
+    # Resume from the checkpoint, if any
     page = 1
+    if checkpoint is not None:
+      query = {"params": params, "columns": columns, "where": where}
+      page += checkpoint.start(fingerprint(query))
+
+    # Yield each page
     while page <= max_pages:
-      ar = self.fetch({**params, "page": page})
+      ar = self.fetch({**params, "page": page}, columns=columns, where=where,
+                      validate=False)
       yield ar
+      if checkpoint is not None:
+        checkpoint.commit(page)
       if ar.is_last_page:
+        if checkpoint is not None:
+          checkpoint.clear()
         return
       page += 1
 
   def async_analytic_query(self, fetch_params, client_context=None,
-                           max_rows=None, emails=None):
+                           max_rows=None, emails=None, checkpoint=None,
+                           columns=None, where=None, processes=None,
+                           cache=None, threads=None, label_mode="id"):
     """Construct and poll an async analytic query, and download page URLs upon
     completion.
 
@@ -167,10 +372,33 @@ class Client:
     emails
       a list of emails to send the fetch job results to upon completion
       (optional)
+    checkpoint
+      a lfapi.checkpoint.Checkpoint passed through to FetchJob.download_pages()
+      (optional)
+    columns, where, processes, threads
+      the column projection, row filter, number of parsing processes and
+      number of downloading threads passed through to
+      FetchJob.download_pages() (optional)
+    cache
+      a lfapi.cache.ResultCache; if specified and the query was already
+      downloaded with the same arguments, the cached pages are returned
+      without creating a fetch job; otherwise, the downloaded pages are stored
+      in it. Cannot be combined with checkpoint (optional)
+    label_mode
+      the label mode of the pages; one of "id", "name"
 
     Returns:
       generator of downloaded pages as models.AnalyticResponse objects
     """
+    # Serve the query from the cache, if possible
+    if cache is not None:
+      if checkpoint is not None:
+        raise LfError('A checkpoint cannot be combined with a cache.')
+      key = cache.key({"fetch_params": fetch_params, "max_rows": max_rows},
+                      label_mode=label_mode, columns=columns, where=where)
+      if key in cache:
+        return cache.load(key, client=self)
+
     # Build request body
     params = {"fetch_params": {**fetch_params}}
     if client_context is not None:
@@ -181,14 +409,20 @@ class Client:
       params["email_to"] = emails
 
     # Create and poll the fetch job
-    fj = self.create_fetch_job(params)
+    with span('lfapi.create_fetch_job',
+              dataset_id=fetch_params.get("dataset_id")) as current:
+      fj = self.create_fetch_job(params)
+      current.set_attribute('job_id', fj.id)
     fj = self.poll_fetch_job(fj.id)
     if fj.state == 'failed':
       msg = f'Fetch job {fj.id} failed during execution.'
       raise LfError(msg)
 
     # Read the page urls from the response
-    return fj.download_pages()
+    pages = fj.download_pages(label_mode=label_mode, checkpoint=checkpoint,
+                              columns=columns, where=where,
+                              processes=processes, threads=threads)
+    return pages if cache is None else cache.store(key, pages)
 
 
   # brand methods
@@ -234,13 +468,19 @@ class Client:
     return self.secure_get('dictionary/datasets')
 
 
-  # field values method
+  # field values methods
   def get_field_values(self, params):
     """GET request to /dictionary/field_values to view a list of values for a
     given field.
     """
     return self.secure_get('dictionary/field_values', params=params)
 
+  @as_model(models.FieldValues)
+  def list_field_values(self, params):
+    """GET request to /dictionary/field_values to view a page of values for a
+    given field as a models.FieldValues object.
+    """
+    return self.get_field_values(params)
 
 
   # request methods
@@ -251,17 +491,21 @@ class Client:
   @property
   def headers(self):
     # Build headers object for ListenFirst API
-    headers = {
-      "content-type": 'application/json',
-      "authorization": f'Bearer {self.auth.access_token}',
-      "x-api-key": self.api_key,
-      "lf-client-library": 'Python SDK',
-      "lf-client-version": '1.0.0'
-    }
-    if self.account_id is not None:
-      headers["lfm-acting-account"] = self.account_id
-
-    return headers
+    with phase('headers', self.profiler):
+      with phase('auth', self.profiler):
+        access_token = self.auth.access_token
+
+      headers = {
+        "content-type": 'application/json',
+        "authorization": f'Bearer {access_token}',
+        "x-api-key": self.api_key,
+        "lf-client-library": 'Python SDK',
+        "lf-client-version": '1.0.0'
+      }
+      if self.account_id is not None:
+        headers["lfm-acting-account"] = self.account_id
+
+      return headers
 
   def secure_get(self, endpoint, params=None):
     """Make a secure GET request to the ListenFirst API."""
@@ -280,34 +524,94 @@ class Client:
       params=params
     )
 
+  def download_page(self, url):
+    """Make a GET request to a fetch job page URL."""
+    return self._request(http.GET, url, 'page_url')
+
   def _make_authorized_request(self, method, endpoint, **request_args):
     # Send authorized requests to the ListenFirst API
     url = self._build_url(endpoint)
     request_args["headers"] = self.headers
-    return http.make_request(method, url, **request_args)
+    body_bytes = None
+    if self.gzip_min_bytes is not None and request_args.get("json"):
+      body_bytes = http.encode_json_body(request_args, self.gzip_min_bytes)
+    return self._request(method, url, endpoint, body_bytes=body_bytes,
+                         **request_args)
+
+  def _request(self, method, url, endpoint, body_bytes=None, **request_args):
+    with phase('network', self.profiler):
+      if self.hedge_policy is not None and method is http.GET:
+        on_hedge = None
+        if self.hooks:
+          on_hedge = partial(self.hooks.emit, 'on_hedge', endpoint=endpoint)
+        send = partial(self._send, method, url, endpoint,
+                       body_bytes=body_bytes, **request_args)
+        return self.hedge_policy.run(send, endpoint_label(endpoint),
+                                     on_hedge=on_hedge)
+      return self._send(method, url, endpoint, body_bytes=body_bytes,
+                        **request_args)
+
+  def _send(self, method, url, endpoint, body_bytes=None, **request_args):
+    # Send requests, emitting instrumentation events if any are registered
+    request = method
+    if self.session is not None:
+      request = getattr(self.session, method.__name__)
+    send = partial(http.make_request, request, url, **request_args)
+    if self.limiter is not None:
+      send = partial(self.limiter.call, send, key=endpoint_label(endpoint))
+    if not self.hooks:
+      return send()
+
+    method_name = method.__name__.upper()
+    self.hooks.emit('before_request', method=method_name, endpoint=endpoint,
+                    url=url, request_args=request_args)
+    response = None
+    error = None
+    start = time.perf_counter()
+    try:
+      response = send()
+      return response
+    except HttpError as err:
+      response = err.response
+      error = err
+      raise
+    except Exception as err:
+      error = err
+      raise
+    finally:
+      self.hooks.emit('after_response', method=method_name, endpoint=endpoint,
+                      url=url, response=response,
+                      seconds=time.perf_counter() - start, error=error,
+                      body_bytes=body_bytes)
 
   # Initialize from config
   @classmethod
-  def from_dict(cls, profile):
-    """Load a client from a dictionary."""
+  def from_dict(cls, profile, **kwargs):
+    """Load a client from a dictionary. An optional token_store entry names
+    a FileTokenStore file sharing the access token between processes.
+    Further keyword arguments, such as limiter, are passed to the constructor.
+    """
+    token_store = profile.get("token_store")
     auth = Auth(
       profile["client_id"],
       profile["client_secret"],
-      auth_host=profile.get("auth_host")
+      auth_host=profile.get("auth_host"),
+      token_store=token_store and FileTokenStore(token_store)
     )
     return cls(
       profile["api_key"],
       auth,
       account_id=profile.get("account_id"),
-      api_host=profile.get("api_host")
+      api_host=profile.get("api_host"),
+      **kwargs
     )
 
   @classmethod
-  def load(cls, f):
-    """Load a client from a JSON file."""
+  def load(cls, f, **kwargs):
+    """Load a client from a JSON file; see from_dict()."""
     if isinstance(f, str):
       with open(f) as f:
-        return cls.load(f)
+        return cls.load(f, **kwargs)
 
     profile = json.load(f)
-    return cls.from_dict(profile)
+    return cls.from_dict(profile, **kwargs)
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import lfapi.fork_utils as fork_utils
+from lfapi.errors import QuotaSurpassed, ServerError
+from lfapi.instrumentation import Hooks
+
+
+class AdaptiveLimiter:
+  """AIMD limit on the number of requests in flight.
+
+  While requests succeed with stable latency and the limit is in use, the
+  limit grows by about one request per round of limit requests. It is cut by
+  the backoff factor on QuotaSurpassed (429) and ServerError (5xx) responses,
+  or when the short-term average latency of an endpoint exceeds tolerance
+  times its long-term average, so that moving from fast to slow endpoints is
+  not taken for overload; after a cut, further cuts wait for a round of
+  requests to complete so that one burst of errors counts once.
+
+  A client given a limiter sends every request through it, including page
+  downloads and hedged requests, so every parallel feature shares it.
+
+  Parameters:
+  initial
+    the initial limit
+  min_limit, max_limit
+    the bounds of the limit
+  backoff
+    the factor the limit is multiplied by on overload
+  tolerance
+    the ratio of short-term to long-term average latency treated as overload
+
+  Attributes:
+  limit
+    the current limit, as a float
+  in_flight
+    the number of requests in flight
+  hooks
+    an instrumentation.Hooks registry emitting on_limit_change events
+  """
+
+  def __init__(self, initial=4, min_limit=1, max_limit=64, backoff=0.5,
+               tolerance=2.0):
+    self.limit = float(initial)
+    self.min_limit = min_limit
+    self.max_limit = max_limit
+    self.backoff = backoff
+    self.tolerance = tolerance
+    self.in_flight = 0
+    self.hooks = Hooks()
+    self._latencies = {}
+    self._since_decrease = initial
+    self._cond = threading.Condition()
+    fork_utils.register(self)
+
+  def __getstate__(self):
+    # Keep the learned limit; requests in flight and hooks stay behind
+    state = self.__dict__.copy()
+    del state["hooks"], state["_cond"]
+    state["in_flight"] = 0
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.hooks = Hooks()
+    self._cond = threading.Condition()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    # Threads holding slots in the parent do not exist in the child
+    self.in_flight = 0
+    self._cond = threading.Condition()
+
+  def acquire(self):
+    """Wait for a slot under the limit."""
+    with self._cond:
+      while self.in_flight >= max(int(self.limit), 1):
+        self._cond.wait()
+      self.in_flight += 1
+
+  def release(self, seconds, overloaded=False, key=None):
+    """Free a slot, adjusting the limit by the request's outcome.
+
+    Arguments:
+    seconds
+      the latency of the request
+    overloaded
+      whether the request failed with a 429 or 5xx response
+    key
+      the endpoint label whose average latencies the request is compared with
+    """
+    with self._cond:
+      saturated = self.in_flight >= int(self.limit)
+      self.in_flight -= 1
+      self._since_decrease += 1
+
+      # Track short- and long-term average latencies per endpoint
+      averages = self._latencies.get(key)
+      if averages is None:
+        averages = self._latencies[key] = [seconds, seconds]
+      else:
+        averages[0] += 0.3 * (seconds - averages[0])
+        averages[1] += 0.02 * (seconds - averages[1])
+      spike = averages[0] > self.tolerance * averages[1]
+
+      previous = self.limit
+      reason = 'overload' if overloaded else 'latency' if spike else None
+      if reason is not None:
+        if self._since_decrease >= self.limit:
+          self.limit = max(self.limit * self.backoff, self.min_limit)
+          self._since_decrease = 0
+          averages[1] = max(averages)  # adapt to the new level
+      elif saturated:
+        self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+        reason = 'increase'
+      limit = self.limit
+      self._cond.notify_all()
+
+    if int(limit) != int(previous):
+      self.hooks.emit('on_limit_change', limit=int(limit),
+                      previous_limit=int(previous), reason=reason)
+
+  def call(self, func, key=None):
+    """Call func within a slot and return its result; key is the endpoint
+    label passed to release().
+    """
+    self.acquire()
+    overloaded = False
+    start = time.perf_counter()
+    try:
+      return func()
+    except (QuotaSurpassed, ServerError):
+      overloaded = True
+      raise
+    finally:
+      self.release(time.perf_counter() - start, overloaded=overloaded,
+                   key=key)
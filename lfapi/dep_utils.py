@@ -1,6 +1,5 @@
 import importlib
 import importlib.util
-import sys
 from functools import wraps
 
 
@@ -12,11 +11,51 @@ def safe_import(dep_name):
   except ModuleNotFoundError:
     return
 
+class LazyModule:
+  """Proxy for an optional dependency that is imported on first use.
+
+  Attribute access imports the module, or raises NotImplementedError if it is
+  not installed. The proxy is falsy when the module is not installed.
+
+  Parameters:
+  dep_name
+    the fully qualified name of the module
+  """
+
+  def __init__(self, dep_name):
+    self._dep_name = dep_name
+    self._module = None
+
+  def _load(self):
+    if self._module is None:
+      self._module = safe_import(self._dep_name)
+      if self._module is None:
+        raise NotImplementedError(f'{self._dep_name} is not installed')
+    return self._module
+
+  def __getattr__(self, attr):
+    return getattr(self._load(), attr)
+
+  def __bool__(self):
+    try:
+      self._load()
+    except NotImplementedError:
+      return False
+    return True
+
+  def __repr__(self):
+    state = 'loaded' if self._module is not None else 'not loaded'
+    return f'<LazyModule {self._dep_name!r} ({state})>'
+
+def lazy_import(dep_name):
+  """Return a LazyModule deferring the import of an optional dependency."""
+  return LazyModule(dep_name)
+
 def depends_on(dep_name):
   def depends_on_decorator(func):
     @wraps(func)
     def _func(*args, **kwargs):
-      if dep_name not in sys.modules:
+      if safe_import(dep_name) is None:
         raise NotImplementedError(f'{dep_name} is not installed')
 
       return func(*args, **kwargs)
@@ -19,6 +19,7 @@ class HttpError(LfError):
     json = response.json()
     msg = f'{method} request to {url} failed with {code} {reason}: {json}'
     super().__init__(msg)
+    self.response = response
 
 class BadRequest(HttpError):
   """Exception for 400 HTTP failures."""
@@ -0,0 +1,199 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from functools import partial
+from math import inf
+
+SEPARATOR = '\0'
+
+
+def _is_last(page):
+  # Whether no values follow a page of field values
+  return page.is_last_page() or not len(page)
+
+
+class FieldValueIndex:
+  """Case-insensitive prefix and substring index over a field's values.
+
+  Values are kept sorted by their case-folded form, so a prefix lookup is a
+  binary search; for substring lookups the folded values are also joined
+  into one string, which str.find() scans in C.
+
+  Parameters:
+  values
+    the field's values; non-string values are indexed by their str()
+  """
+
+  def __init__(self, values):
+    self.values = sorted(values, key=lambda value: str(value).casefold())
+    self._folded = [str(value).casefold() for value in self.values]
+    self._text = SEPARATOR.join(self._folded)
+    self._starts = []
+    offset = 0
+    for folded in self._folded:
+      self._starts.append(offset)
+      offset += len(folded) + 1
+
+  def __len__(self):
+    return len(self.values)
+
+  def prefix(self, text, limit=10):
+    """Return up to limit values starting with text, in sorted order."""
+    text = text.casefold()
+    start = bisect_left(self._folded, text)
+    end = bisect_left(self._folded, text + '\U0010ffff', lo=start)
+    return self.values[start:min(end, start + limit)]
+
+  def search(self, text, limit=10):
+    """Return up to limit values containing text, in sorted order."""
+    text = text.casefold()
+    if not text:
+      return self.values[:limit]
+
+    found = []
+    offset = self._text.find(text)
+    while offset != -1 and len(found) < limit:
+      index = bisect_right(self._starts, offset) - 1
+      found.append(self.values[index])
+      # Continue after the matched value
+      offset = self._text.find(text, self._starts[index] +
+                               len(self._folded[index]) + 1)
+    return found
+
+
+class FieldValueStore:
+  """Locally cached FieldValueIndex per (dataset, field).
+
+  A field's values are loaded once, fetching pages of
+  Client.list_field_values() in threads, and kept for ttl seconds. Lookups
+  of a stale field are answered from the cached index while it is reloaded
+  in the background.
+
+  Parameters:
+  client
+    the lfapi.Client used to list values
+  ttl
+    the seconds a field's values are kept before being refreshed
+  per_page
+    the number of values requested per page
+  threads
+    the number of pages requested at once after the first
+  """
+
+  def __init__(self, client, ttl=3600, per_page=1000, threads=4):
+    self.client = client
+    self.ttl = ttl
+    self.per_page = per_page
+    self.threads = threads
+    self._entries = {}
+    self._loading = {}
+    self._refreshing = set()
+    self._lock = threading.Lock()
+
+  def _fetch_page(self, field, dataset_id, page):
+    params = {"field": field, "page": page, "per_page": self.per_page}
+    if dataset_id is not None:
+      params["dataset_id"] = dataset_id
+    return self.client.list_field_values(params)
+
+  def load(self, field, dataset_id=None):
+    """Fetch all values of a field, and return them as a FieldValueIndex."""
+    first = self._fetch_page(field, dataset_id, 1)
+    values = list(first)
+    last_page = 1 if _is_last(first) else inf
+
+    # Keep up to threads pages in flight, reading them in order; once any
+    # page reports it is the last, no later page is requested
+    fetch = partial(self._fetch_page, field, dataset_id)
+    pending = {}
+    page = read = 2
+    with ThreadPoolExecutor(self.threads) as pool:
+      while read <= last_page:
+        while page <= last_page and len(pending) < self.threads:
+          pending[page] = pool.submit(fetch, page)
+          page += 1
+        wait([future for future in pending.values() if not future.done()],
+             return_when=FIRST_COMPLETED)
+
+        for number, future in pending.items():
+          if (future.done() and future.exception() is None and
+              _is_last(future.result())):
+            last_page = min(last_page, number)
+        for number in [number for number in pending if number > last_page]:
+          pending.pop(number).cancel()
+        while read in pending and pending[read].done():
+          values.extend(pending.pop(read).result())
+          read += 1
+
+    index = FieldValueIndex(values)
+    with self._lock:
+      self._entries[dataset_id, field] = (index, time.monotonic())
+    return index
+
+  def _refresh(self, key):
+    dataset_id, field = key
+    try:
+      self.load(field, dataset_id=dataset_id)
+    finally:
+      with self._lock:
+        self._refreshing.discard(key)
+
+  def _first_load(self, key):
+    # Load a field once for all callers waiting on its first load
+    with self._lock:
+      if key in self._entries:  # loaded since the caller looked
+        return self._entries[key][0]
+      future = self._loading.get(key)
+      owner = future is None
+      if owner:
+        future = self._loading[key] = Future()
+    if not owner:
+      return future.result()
+
+    try:
+      dataset_id, field = key
+      future.set_result(self.load(field, dataset_id=dataset_id))
+    except BaseException as err:
+      future.set_exception(err)
+    finally:
+      with self._lock:
+        del self._loading[key]
+    return future.result()
+
+  def index(self, field, dataset_id=None):
+    """Return the FieldValueIndex of a field, loading it on first use and
+    refreshing it in the background once older than ttl. Concurrent first
+    uses of a field share one load.
+    """
+    key = (dataset_id, field)
+    with self._lock:
+      entry = self._entries.get(key)
+      stale = (entry is not None and key not in self._refreshing and
+               time.monotonic() - entry[1] >= self.ttl)
+      if stale:
+        self._refreshing.add(key)
+    if entry is None:
+      return self._first_load(key)
+
+    if stale:
+      threading.Thread(target=self._refresh, args=(key,), daemon=True,
+                       name='lfapi-field-values').start()
+    return entry[0]
+
+  def prefix(self, field, text, dataset_id=None, limit=10):
+    """Return up to limit values of a field starting with text."""
+    return self.index(field, dataset_id=dataset_id).prefix(text, limit=limit)
+
+  def search(self, field, text, dataset_id=None, limit=10):
+    """Return up to limit values of a field containing text."""
+    return self.index(field, dataset_id=dataset_id).search(text, limit=limit)
+
+  def invalidate(self, field=None, dataset_id=None):
+    """Drop a field's cached values, or all cached values if field is None."""
+    with self._lock:
+      if field is None:
+        self._entries.clear()
+      else:
+        self._entries.pop((dataset_id, field), None)
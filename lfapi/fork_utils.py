@@ -0,0 +1,33 @@
+import os
+import weakref
+
+_registered = weakref.WeakSet()
+_renewed = {}
+
+
+def register(obj):
+  """Call obj._after_fork() in the child process after each os.fork(), e.g. to
+  replace locks another thread may have held, dead executors and connection
+  pools shared with the parent.
+  """
+  _registered.add(obj)
+
+def renew(old, factory):
+  """Return the replacement of a shared object in a forked child, creating it
+  with factory once, so that objects sharing it before the fork share its
+  replacement.
+  """
+  key = id(old)
+  if key not in _renewed:
+    _renewed[key] = (old, factory())
+  return _renewed[key][1]
+
+def _after_fork_in_child():
+  _renewed.clear()
+  for obj in list(_registered):
+    obj._after_fork()
+  _renewed.clear()
+
+
+if hasattr(os, "register_at_fork"):
+  os.register_at_fork(after_in_child=_after_fork_in_child)
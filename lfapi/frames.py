@@ -0,0 +1,111 @@
+from itertools import chain
+
+from lfapi.dep_utils import depends_on, lazy_import
+
+pl = lazy_import('polars')
+plugins = lazy_import('polars.io.plugins')
+
+
+class PageScan:
+  """Lazy Polars query over a stream of analytic pages.
+
+  Column projections and row filters are recorded without touching any data,
+  then applied to each page as it arrives, so pages are never held in full.
+  Only the columns needed by the projection and the filters are converted
+  from each page.
+
+  Parameters:
+  pages
+    an iterable of models.AnalyticResponse objects, e.g. the generator
+    returned by Client.sync_analytic_query() or FetchJob.download_pages()
+  """
+
+  def __init__(self, pages, columns=None, predicates=()):
+    self._pages = pages
+    self._columns = columns
+    self._predicates = tuple(predicates)
+
+  def select(self, *columns):
+    """Return a scan projecting the given column labels."""
+    return PageScan(self._pages, columns=list(columns),
+                    predicates=self._predicates)
+
+  def filter(self, *predicates):
+    """Return a scan keeping the rows matching the given Polars expressions."""
+    return PageScan(self._pages, columns=self._columns,
+                    predicates=self._predicates + predicates)
+
+  @staticmethod
+  def _frames(pages, columns=None, predicates=(), n_rows=None):
+    # Convert the columns needed by the projection and the filters from each
+    # page, yielding filtered and projected frames until n_rows are read
+    needed = None
+    if columns is not None:
+      needed = list(columns)
+      for predicate in predicates:
+        for name in predicate.meta.root_names():
+          if name not in needed:
+            needed.append(name)
+
+    for page in pages:
+      if n_rows is not None and n_rows <= 0:
+        return
+      frame = pl.from_arrow(page.to_pyarrow(columns=needed))
+      if predicates:
+        frame = frame.filter(*predicates)
+      if columns is not None:
+        frame = frame.select(columns)
+      if n_rows is not None:
+        frame = frame.head(n_rows)
+        n_rows -= frame.height
+      yield frame
+
+  @depends_on('polars')
+  def iter_frames(self):
+    """Yield one filtered and projected Polars DataFrame per page."""
+    return self._frames(self._pages, self._columns, self._predicates)
+
+  @depends_on('polars')
+  def collect(self):
+    """Consume the pages and return the result as one Polars DataFrame."""
+    frames = list(self.iter_frames())
+    if not frames:
+      return pl.DataFrame()
+    return pl.concat(frames, how='vertical_relaxed')
+
+  @depends_on('polars')
+  def lazy(self):
+    """Return the scan as a Polars LazyFrame reading the pages when collected.
+
+    The schema is taken from the columns of the first page, which is read
+    now; projections, filters and row limits of the LazyFrame are pushed down
+    to the page conversion. The pages can only be collected once.
+    """
+    pages = iter(self._pages)
+    first = next(pages, None)
+    if first is None:
+      return pl.LazyFrame()
+    pages = chain([first], pages)
+    empty = type(first)({"columns": first.columns, "records": []},
+                        label_mode=first.label_mode,
+                        dictionary_encode=first.dictionary_encode)
+    schema = pl.from_arrow(empty.to_pyarrow()).schema
+
+    def source(with_columns, predicate, n_rows, batch_size):
+      predicates = () if predicate is None else (predicate,)
+      return self._frames(pages, with_columns, predicates, n_rows)
+
+    frame = plugins.register_io_source(source, schema=schema)
+    if self._predicates:
+      frame = frame.filter(*self._predicates)
+    if self._columns is not None:
+      frame = frame.select(self._columns)
+    return frame
+
+  def __iter__(self):
+    return self.iter_frames()
+
+
+def scan(pages):
+  """Return a PageScan over an iterable of analytic pages."""
+  return PageScan(pages)
@@ -0,0 +1,129 @@
+import json
+
+import lfapi.models as models
+from lfapi.checkpoint import dump_atomic
+
+
+class Harvester:
+  """Collector of the fetch jobs that schedule configs produce.
+
+  Each harvest lists the completed fetch jobs of the given schedule configs,
+  most recently updated first, page by page, until it reaches the jobs
+  harvested before, and passes the pages of every new job to a sink, oldest
+  first, downloading them in threads ahead of the sink. Once the sink returns,
+  the job's updated_at is recorded per schedule config as a watermark in a
+  JSON state file, so that an interrupted harvest picks up the jobs it did not
+  finish; the state holds only the watermark and the IDs of the jobs updated
+  at that time.
+
+  Parameters:
+  client
+    the lfapi.Client used to list and download fetch jobs
+  state_path
+    the filename of the JSON file holding the watermarks
+  sink
+    a function called with each new models.FetchJob and a generator of its
+    pages as models.AnalyticResponse objects, e.g. to write them to a
+    lfapi.stores.SQLiteStore; it is always called from the harvesting thread
+  per_page
+    the number of fetch jobs listed per request
+  threads
+    the number of threads downloading each job's pages; see
+    models.FetchJob.download_pages()
+  """
+
+  def __init__(self, client, state_path, sink, per_page=100, threads=None):
+    self.client = client
+    self.state_path = state_path
+    self.sink = sink
+    self.per_page = per_page
+    self.threads = threads
+
+  def _read_state(self):
+    try:
+      with open(self.state_path) as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return {}
+
+  def watermark(self, schedule_config_id):
+    """Return the updated_at of the last job harvested from a schedule config,
+    or None, and the set of harvested job IDs updated at that time.
+    """
+    entry = self._read_state().get(str(schedule_config_id), {})
+    return entry.get("updated_at"), set(entry.get("job_ids", []))
+
+  def completed_jobs(self, schedule_config_id, since=None):
+    """Yield the completed fetch job summaries of a schedule config, most
+    recently updated first, listing them with server-side filters and sorting
+    one page at a time.
+
+    Arguments:
+    since
+      an updated_at timestamp; listing stops at the first job updated before
+      it (optional)
+    """
+    page = 1
+    while True:
+      params = {"schedule_config_id": schedule_config_id,
+                "state": 'completed', "sort": '-updated_at', "page": page,
+                "per_page": self.per_page}
+      jobs = self.client.list_fetch_jobs(params=params)
+      for job in jobs:
+        if since is not None and job.updated_at < since:
+          return
+        if (job.schedule_config_id == schedule_config_id and
+            job.state == 'completed'):
+          yield job
+      if not jobs.records or jobs.is_last_page():
+        return
+      page += 1
+
+  def new_jobs(self, schedule_config_id):
+    """Return the completed fetch job summaries of a schedule config updated
+    since its watermark and not harvested, oldest first.
+    """
+    since, harvested = self.watermark(schedule_config_id)
+    jobs = [job for job in self.completed_jobs(schedule_config_id, since)
+            if job.updated_at != since or job.id not in harvested]
+    return sorted(jobs, key=lambda job: (job.updated_at, job.id))
+
+  def _record(self, schedule_config_id, job):
+    # Advance the watermark once a job's pages are in the sink
+    state = self._read_state()
+    key = str(schedule_config_id)
+    entry = state.get(key, {})
+    if entry.get("updated_at") == job.updated_at:
+      entry["job_ids"].append(job.id)
+    else:
+      entry = {"updated_at": job.updated_at, "job_ids": [job.id]}
+    state[key] = entry
+    dump_atomic(state, self.state_path)
+
+  def run(self, schedule_configs, **download_kwargs):
+    """Harvest the new fetch jobs of schedule configs.
+
+    Arguments:
+    schedule_configs
+      a list of schedule config IDs or models.ScheduleConfig objects
+    **download_kwargs
+      accepts any keyword arguments supported by
+      models.FetchJob.download_pages(), such as columns and where
+
+    Returns:
+      a dict mapping each schedule config ID to the list of job IDs harvested
+    """
+    download_kwargs.setdefault("threads", self.threads)
+    harvested = {}
+    for config in schedule_configs:
+      config_id = config
+      if isinstance(config, models.ScheduleConfig):
+        config_id = config.id
+
+      harvested[config_id] = []
+      for summary in self.new_jobs(config_id):
+        job = self.client.show_fetch_job(summary.id)
+        self.sink(job, job.download_pages(**download_kwargs))
+        self._record(config_id, summary)
+        harvested[config_id].append(job.id)
+    return harvested
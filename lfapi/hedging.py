@@ -0,0 +1,178 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import lfapi.fork_utils as fork_utils
+
+_NOT_SENT = object()
+
+def _discard(future):
+  # Release the connection of a losing hedge once it completes
+  if not future.cancelled() and future.exception() is None:
+    close = getattr(future.result(), "close", None)
+    if close is not None:
+      close()
+
+
+class HedgePolicy:
+  """Hedging policy for idempotent GET requests.
+
+  Requests are sent from the calling thread. Once an endpoint has answered
+  min_samples requests, a request that has not answered within the given
+  percentile of that endpoint's recent latencies is sent again from one of
+  the policy's threads. The first attempt's response is used if it succeeds,
+  and the hedge's otherwise, so a slow attempt that ends in an error, such as
+  a timeout, is answered by the hedge already in flight. A hedge that has
+  started is not cancelled: the losing attempt runs to completion and its
+  response is discarded. Hedges are capped at a fraction of all requests. The
+  threads sending hedges are started on first use and stopped by close().
+
+  Parameters:
+  percentile
+    the latency percentile after which a request is hedged; defaults to 0.95
+  budget
+    the maximum ratio of hedges to requests; defaults to 0.05
+  min_delay
+    the minimum seconds to wait before hedging
+  window
+    the number of recent latencies kept per endpoint
+  min_samples
+    the number of latencies needed before an endpoint is hedged
+  max_workers
+    the number of threads waiting to send and sending hedges
+
+  Attributes:
+  requests, hedges
+    the number of requests sent through the policy and of hedges among them
+  """
+
+  def __init__(self, percentile=0.95, budget=0.05, min_delay=0.01,
+               window=200, min_samples=20, max_workers=64):
+    self.percentile = percentile
+    self.budget = budget
+    self.min_delay = min_delay
+    self.min_samples = min_samples
+    self.window = window
+    self.max_workers = max_workers
+    self.requests = 0
+    self.hedges = 0
+    self._latencies = defaultdict(self._new_window)
+    self._start()
+    fork_utils.register(self)
+
+  def _new_window(self):
+    return deque(maxlen=self.window)
+
+  def _start(self):
+    self._lock = threading.Lock()
+    self._executor = None
+
+  def __getstate__(self):
+    # Keep the observed latencies; threads belong to the process
+    state = self.__dict__.copy()
+    del state["_lock"], state["_executor"]
+    state["_latencies"] = {key: list(latencies)
+                           for key, latencies in self._latencies.items()}
+    return state
+
+  def __setstate__(self, state):
+    latencies = state.pop("_latencies")
+    self.__dict__.update(state)
+    self._latencies = defaultdict(self._new_window)
+    for key, values in latencies.items():
+      self._latencies[key].extend(values)
+    self._start()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    # The parent's threads do not exist in the child
+    self._start()
+
+  def observe(self, key, seconds):
+    """Record the latency of a successful request to an endpoint."""
+    with self._lock:
+      self._latencies[key].append(seconds)
+
+  def delay(self, key):
+    """Return the seconds after which a request to an endpoint is hedged, or
+    None if too few latencies have been recorded.
+    """
+    with self._lock:
+      latencies = sorted(self._latencies[key])
+    if len(latencies) < self.min_samples:
+      return None
+    index = round(self.percentile * (len(latencies) - 1))
+    return max(latencies[index], self.min_delay)
+
+  def _acquire_hedge(self):
+    # Take a hedge from the budget, if any is left
+    with self._lock:
+      if self.hedges + 1 > self.budget * self.requests:
+        return False
+      self.hedges += 1
+      return True
+
+  def _submit(self, func, *args):
+    with self._lock:
+      if self._executor is None:
+        self._executor = ThreadPoolExecutor(self.max_workers,
+                                            thread_name_prefix='lfapi-hedge')
+      executor = self._executor
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+  def _send(self, send, key):
+    start = time.perf_counter()
+    result = send()
+    self.observe(key, time.perf_counter() - start)
+    return result
+
+  def _hedge(self, send, key, delay, answered, on_hedge):
+    # Send a hedge unless the first attempt answers within the delay
+    if answered.wait(delay) or not self._acquire_hedge():
+      return _NOT_SENT
+    if on_hedge is not None:
+      on_hedge(delay=delay)
+    return self._send(send, key)
+
+  def run(self, send, key, on_hedge=None):
+    """Call send from the calling thread, hedging it from another thread if
+    it is slow, and return its result; if it fails, the hedge's result is
+    returned instead. If every attempt fails, the first error is raised.
+
+    Arguments:
+    send
+      a function of no arguments sending the request
+    key
+      the endpoint label whose latencies set the hedging delay
+    on_hedge
+      if specified, called with the delay when the request is hedged
+    """
+    delay = self.delay(key)
+    with self._lock:
+      self.requests += 1
+    if delay is None:
+      return self._send(send, key)
+
+    answered = threading.Event()
+    hedge = self._submit(self._hedge, send, key, delay, answered, on_hedge)
+    try:
+      result = self._send(send, key)
+    except Exception as error:
+      answered.set()
+      if hedge.exception() is not None or hedge.result() is _NOT_SENT:
+        raise error
+      return hedge.result()
+    answered.set()
+    hedge.add_done_callback(_discard)
+    return result
+
+  def close(self):
+    """Stop the policy's threads once pending requests complete. The policy
+    can still be used, and starts new threads when a request is hedged.
+    """
+    with self._lock:
+      executor, self._executor = self._executor, None
+    if executor is not None:
+      executor.shutdown()
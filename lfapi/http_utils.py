@@ -1,7 +1,10 @@
+import gzip
+import json
 import time
 from math import log10
 
 import requests
+
 from lfapi.errors import (BadRequest, HttpError, LfError, QuotaSurpassed,
                           RecordNotFound, RequestInvalid, ServerError,
                           Unauthorized)
@@ -9,6 +12,37 @@ from lfapi.errors import (BadRequest, HttpError, LfError, QuotaSurpassed,
 POST = requests.post
 GET = requests.get
 
+def encode_json_body(request_args, gzip_min_bytes=None):
+  """Serialize the json request argument to the data argument, compressing it
+  with gzip when it is at least gzip_min_bytes long. Returns the length of the
+  uncompressed body.
+  """
+  body = json.dumps(request_args.pop("json")).encode()
+  size = len(body)
+  if gzip_min_bytes is not None and size >= gzip_min_bytes:
+    body = gzip.compress(body)
+    request_args["headers"] = {**request_args.get("headers", {}),
+                               "content-encoding": 'gzip'}
+  request_args["data"] = body
+  return size
+
+def request_sizes(request, body_bytes=None):
+  """Return the (wire, decoded) sizes of a prepared request's body, given the
+  uncompressed length returned by encode_json_body() if it encoded the body.
+  """
+  body = request.body or b''
+  wire = len(body.encode() if isinstance(body, str) else body)
+  return wire, wire if body_bytes is None else body_bytes
+
+def response_sizes(response):
+  """Return the (wire, decoded) sizes of a response's body."""
+  decoded = len(response.content)
+  if hasattr(response.raw, "tell"):  # bytes read from the connection
+    return response.raw.tell(), decoded
+  if "content-length" in response.headers:
+    return int(response.headers["content-length"]), decoded
+  return decoded, decoded
+
 def make_request(method, url, **request_args):
   """Make HTTP requests."""
   response = method(url, **request_args)
@@ -31,7 +65,8 @@ def make_request(method, url, **request_args):
 
   return response
 
-def retry(f, max_tries=3, max_wait_time=7200, delay=1, retry_condition=None):
+def retry(f, max_tries=3, max_wait_time=7200, delay=1, retry_condition=None,
+          on_retry=None):
   """Retry function execution.
 
   Arguments:
@@ -46,6 +81,10 @@ def retry(f, max_tries=3, max_wait_time=7200, delay=1, retry_condition=None):
   retry_condition
     if specified, determines whether the result from f is sufficient to cease
     execution attempts
+  on_retry
+    if specified, called with the number of tries so far, the upcoming delay
+    and the HttpError that failed the last attempt (None if the attempt was
+    rejected by retry_condition) before each retry
   """
   assert max_tries >= 1
   assert max_wait_time > 0
@@ -55,15 +94,19 @@ def retry(f, max_tries=3, max_wait_time=7200, delay=1, retry_condition=None):
     nonlocal max_tries, max_wait_time, delay, retry_condition
 
     tries = 0
+    error = None
     start_time = time.time()
     while time.time() - start_time < max_wait_time and tries < max_tries:
       if tries > 0:
         # Apply logarithmic backoff and sleep between iterations
         delay += log10(tries)
+        if on_retry is not None:
+          on_retry(tries=tries, delay=delay, error=error)
         time.sleep(delay)
 
       try:
         # Attempt execution and check result against retry_condition
+        error = None
         result = f(*args, **kwargs)
         if retry_condition is None or not retry_condition(result):
           return result
@@ -71,6 +114,7 @@ def retry(f, max_tries=3, max_wait_time=7200, delay=1, retry_condition=None):
         # Allow max_tries HttpErrors
         if tries >= max_tries - 1:
           raise err
+        error = err
 
       # Iterate
       tries += 1
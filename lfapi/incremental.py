@@ -0,0 +1,133 @@
+import json
+from datetime import date, timedelta
+
+import lfapi.models as models
+from lfapi.checkpoint import dump_atomic, fingerprint
+from lfapi.errors import LfError
+
+DEFAULT_DATE_FIELD = 'lfm.fact.date_str'
+
+
+def query_key(fetch_params):
+  """Return the fingerprint of a query, ignoring its date range."""
+  params = {key: value for key, value in fetch_params.items()
+            if key not in ("start_date", "end_date")}
+  return fingerprint(params)
+
+
+class IncrementalSync:
+  """Delta sync for recurring analytic queries.
+
+  Keeps a high-water mark (the last synced end date) per query, keyed on the
+  query without its dates. Each run fetches only the dates after the mark,
+  plus a look-back window for late-arriving data, and replaces those dates in
+  the store.
+
+  Parameters:
+  client
+    the lfapi.Client used to run queries
+  store
+    a lfapi.stores.SQLiteStore or lfapi.stores.ParquetStore
+  state_path
+    the filename of the JSON file holding the high-water marks
+  date_field
+    the id of the date dimension; must be in the query's group_by
+  lookback
+    the number of days to re-fetch on each run, counting back from the
+    high-water mark itself: 2 re-fetches the mark and the day before it, 0
+    fetches only the dates after the mark
+  mode
+    'sync' to run queries with Client.sync_analytic_query(), 'async' to run
+    them with Client.async_analytic_query()
+  """
+
+  def __init__(self, client, store, state_path,
+               date_field=DEFAULT_DATE_FIELD, lookback=2, mode='sync'):
+    if mode not in ['sync', 'async']:
+      raise LfError(f'Unexpected mode: "{mode}"')
+
+    self.client = client
+    self.store = store
+    self.state_path = state_path
+    self.date_field = date_field
+    self.lookback = timedelta(days=lookback)
+    self.mode = mode
+
+  def _read_state(self):
+    try:
+      with open(self.state_path) as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return {}
+
+  def high_water_mark(self, fetch_params):
+    """Return the last synced end date of a query, or None."""
+    entry = self._read_state().get(query_key(fetch_params))
+    return None if entry is None else entry["high_water_mark"]
+
+  def plan(self, fetch_params, end_date=None):
+    """Return the (start_date, end_date) range the next run would fetch, or
+    None if the query is up to date.
+    """
+    start = date.fromisoformat(fetch_params["start_date"])
+    end = date.fromisoformat(end_date or fetch_params["end_date"])
+
+    hwm = self.high_water_mark(fetch_params)
+    if hwm is not None:
+      resume = date.fromisoformat(hwm) + timedelta(days=1) - self.lookback
+      start = max(start, resume)
+
+    if start > end:
+      return None
+    return start.isoformat(), end.isoformat()
+
+  def run(self, query, end_date=None, table=None, **query_kwargs):
+    """Fetch the new date range of a query and upsert it into the store.
+
+    Arguments:
+    query
+      the query parameters, or a models.ScheduleConfig whose fetch_params are
+      used
+    end_date
+      the end of the range to sync; defaults to the query's end_date
+    table
+      the store table to write to; defaults to one derived from the query
+    **query_kwargs
+      accepts any keyword arguments supported by the query method
+
+    Returns:
+      the (start_date, end_date) range synced, or None if already up to date
+    """
+    fetch_params = query
+    if isinstance(query, models.ScheduleConfig):
+      fetch_params = query.fetch_params
+    if self.date_field not in fetch_params.get("group_by", []):
+      raise LfError(f'Incremental sync requires {self.date_field} in group_by')
+
+    key = query_key(fetch_params)
+    if table is None:
+      table = f'{fetch_params["dataset_id"]}_{key[:12]}'
+
+    date_range = self.plan(fetch_params, end_date=end_date)
+    if date_range is None:
+      return None
+
+    # Fetch the range and replace its dates in the store
+    start, end = date_range
+    params = {**fetch_params, "start_date": start, "end_date": end}
+    if self.mode == 'sync':
+      pages = self.client.sync_analytic_query(params, **query_kwargs)
+    else:
+      pages = self.client.async_analytic_query(params, **query_kwargs)
+    self.store.replace_range(table, pages, self.date_field, start, end)
+
+    # Advance the high-water mark only once the store is updated
+    state = self._read_state()
+    hwm = state.get(key, {}).get("high_water_mark")
+    state[key] = {
+      "high_water_mark": end if hwm is None else max(hwm, end),
+      "table": table
+    }
+    dump_atomic(state, self.state_path)
+
+    return date_range
@@ -0,0 +1,320 @@
+import re
+import threading
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+
+import lfapi.fork_utils as fork_utils
+import lfapi.http_utils as http
+from lfapi.errors import LfError
+
+EVENTS = (
+  'before_request',
+  'after_response',
+  'after_decode',
+  'on_retry',
+  'on_token_refresh',
+  'on_job_state_change',
+  'on_hedge',
+  'on_limit_change'
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+
+def endpoint_label(endpoint):
+  """Return a low-cardinality label for an endpoint, replacing IDs."""
+  return re.sub(r'/\d+(?=/|$)', '/{id}', endpoint)
+
+
+class Hooks:
+  """Registry of event callbacks.
+
+  Callbacks are invoked with keyword arguments describing the event. Emitting
+  an event with no registered callbacks is a no-op, and a registry with no
+  callbacks at all is falsy so that callers can skip building event details.
+
+  Events:
+  before_request
+    method, endpoint, url and request_args of an outgoing request
+  after_response
+    method, endpoint, url, response (None on connection errors), seconds,
+    error (None on success) and body_bytes (the uncompressed length of a
+    request body the client serialized, or None) of a completed request
+  after_decode
+    model (the model class name) and seconds spent decoding the JSON body
+  on_retry
+    tries, delay and error (None when retrying on the result) of a retry
+  on_token_refresh
+    seconds spent fetching the new access token and its expires_in
+  on_job_state_change
+    job_id, previous_state, state and seconds spent in the previous state
+  on_hedge
+    endpoint and delay (in seconds) of a GET request sent again by a
+    hedging.HedgePolicy
+  on_limit_change
+    limit, previous_limit and reason ('increase', 'overload' or 'latency') of
+    a change to a concurrency.AdaptiveLimiter's limit
+  """
+
+  def __init__(self):
+    self._callbacks = {}
+
+  def register(self, event, callback):
+    """Register a callback for an event."""
+    if event not in EVENTS:
+      raise LfError(f'Unknown event: "{event}"')
+    self._callbacks.setdefault(event, []).append(callback)
+
+  def unregister(self, event, callback):
+    """Remove a previously registered callback."""
+    callbacks = self._callbacks.get(event, [])
+    if callback in callbacks:
+      callbacks.remove(callback)
+    if not callbacks:
+      self._callbacks.pop(event, None)
+
+  def forward(self, event, target):
+    """Emit an event on another registry as well, for as long as that registry
+    exists, e.g. from an Auth shared by several clients to each client.
+    """
+    def forward(**info):
+      hooks = ref()
+      if hooks is not None:
+        hooks.emit(event, **info)
+
+    ref = weakref.ref(target, lambda _: self.unregister(event, forward))
+    self.register(event, forward)
+
+  def emit(self, event, **info):
+    """Invoke the callbacks registered for an event."""
+    for callback in tuple(self._callbacks.get(event, ())):
+      callback(**info)
+
+  def __bool__(self):
+    return bool(self._callbacks)
+
+
+class Histogram:
+  """Cumulative histogram in the style of a Prometheus histogram."""
+
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, value):
+    self.counts[bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+  def cumulative(self):
+    """Return (upper bound, cumulative count) pairs, ending with +Inf."""
+    total = 0
+    pairs = []
+    for bound, count in zip([*self.buckets, float('inf')], self.counts):
+      total += count
+      pairs.append((bound, total))
+    return pairs
+
+  def as_dict(self):
+    return {
+      "buckets": {str(bound): count for bound, count in self.cumulative()},
+      "sum": self.sum,
+      "count": self.count
+    }
+
+
+class MetricsCollector:
+  """Built-in metrics collector for lfapi.Client event hooks.
+
+  Tracks per-endpoint request counts by status, latency histograms, bytes sent
+  and received (both decoded and as compressed on the wire), JSON decode time,
+  retry counts, token refreshes, hedged requests, the current concurrency
+  limit and time spent by fetch jobs in each state.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.reset()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    self._lock = threading.Lock()
+
+  def reset(self):
+    """Clear every recorded metric."""
+    with self._lock:
+      self.requests = defaultdict(int)
+      self.latency = defaultdict(Histogram)
+      self.bytes_out = defaultdict(int)
+      self.bytes_in = defaultdict(int)
+      self.wire_bytes_out = defaultdict(int)
+      self.wire_bytes_in = defaultdict(int)
+      self.decode_seconds = defaultdict(float)
+      self.retries = 0
+      self.token_refreshes = 0
+      self.hedges = defaultdict(int)
+      self.concurrency_limit = None
+      self.limit_decreases = 0
+      self.job_state_seconds = defaultdict(float)
+
+  def attach(self, client):
+    """Register the collector's callbacks on a client."""
+    for event in EVENTS[1:]:
+      client.hooks.register(event, getattr(self, f'_{event}'))
+    if getattr(client, "limiter", None) is not None:
+      with self._lock:
+        self.concurrency_limit = int(client.limiter.limit)
+    return self
+
+  def detach(self, client):
+    """Remove the collector's callbacks from a client."""
+    for event in EVENTS[1:]:
+      client.hooks.unregister(event, getattr(self, f'_{event}'))
+
+  # Event callbacks
+  def _after_response(self, method, endpoint, url, response, seconds, error,
+                      body_bytes=None, **info):
+    label = endpoint_label(endpoint)
+    status = 'error' if response is None else str(response.status_code)
+    with self._lock:
+      self.requests[label, method, status] += 1
+      self.latency[label].observe(seconds)
+      if response is not None:
+        if response.request is not None:
+          wire, decoded = http.request_sizes(response.request, body_bytes)
+          self.wire_bytes_out[label] += wire
+          self.bytes_out[label] += decoded
+        wire, decoded = http.response_sizes(response)
+        self.wire_bytes_in[label] += wire
+        self.bytes_in[label] += decoded
+
+  def _after_decode(self, model, seconds, **info):
+    with self._lock:
+      self.decode_seconds[model] += seconds
+
+  def _on_retry(self, **info):
+    with self._lock:
+      self.retries += 1
+
+  def _on_token_refresh(self, **info):
+    with self._lock:
+      self.token_refreshes += 1
+
+  def _on_job_state_change(self, previous_state, seconds, **info):
+    with self._lock:
+      self.job_state_seconds[previous_state] += seconds
+
+  def _on_hedge(self, endpoint, **info):
+    with self._lock:
+      self.hedges[endpoint_label(endpoint)] += 1
+
+  def _on_limit_change(self, limit, previous_limit, **info):
+    with self._lock:
+      self.concurrency_limit = limit
+      if limit < previous_limit:
+        self.limit_decreases += 1
+
+  # Exports
+  def as_dict(self):
+    """Return the collected metrics as a dictionary."""
+    with self._lock:
+      endpoints = {}
+      for (label, method, status), count in self.requests.items():
+        entry = endpoints.setdefault(label, {"requests": {}})
+        entry["requests"][f'{method} {status}'] = count
+      for label, entry in endpoints.items():
+        entry["latency_seconds"] = self.latency[label].as_dict()
+        entry["bytes_out"] = self.bytes_out[label]
+        entry["bytes_in"] = self.bytes_in[label]
+        entry["wire_bytes_out"] = self.wire_bytes_out[label]
+        entry["wire_bytes_in"] = self.wire_bytes_in[label]
+
+      return {
+        "endpoints": endpoints,
+        "decode_seconds": dict(self.decode_seconds),
+        "retries": self.retries,
+        "token_refreshes": self.token_refreshes,
+        "hedges": dict(self.hedges),
+        "concurrency_limit": self.concurrency_limit,
+        "limit_decreases": self.limit_decreases,
+        "job_state_seconds": dict(self.job_state_seconds)
+      }
+
+  def to_prometheus(self, prefix='lfapi'):
+    """Return the collected metrics in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+      lines.append(f'# HELP {prefix}_{name} {help_text}')
+      lines.append(f'# TYPE {prefix}_{name} {kind}')
+      for suffix, labels, value in samples:
+        label_str = ','.join(f'{key}="{val}"' for key, val in labels.items())
+        label_str = f'{{{label_str}}}' if label_str else ''
+        lines.append(f'{prefix}_{name}{suffix}{label_str} {value}')
+
+    with self._lock:
+      metric('requests_total', 'counter', 'Requests sent by endpoint.', [
+        ('', {"endpoint": label, "method": method, "status": status}, count)
+        for (label, method, status), count in sorted(self.requests.items())
+      ])
+
+      samples = []
+      for label, hist in sorted(self.latency.items()):
+        for bound, count in hist.cumulative():
+          le = '+Inf' if bound == float('inf') else str(bound)
+          samples.append(('_bucket', {"endpoint": label, "le": le}, count))
+        samples.append(('_sum', {"endpoint": label}, hist.sum))
+        samples.append(('_count', {"endpoint": label}, hist.count))
+      metric('request_duration_seconds', 'histogram',
+             'Request latency by endpoint.', samples)
+
+      metric('request_bytes_total', 'counter', 'Request body bytes sent.', [
+        ('', {"endpoint": label}, count)
+        for label, count in sorted(self.bytes_out.items())
+      ])
+      metric('response_bytes_total', 'counter', 'Response bytes received.', [
+        ('', {"endpoint": label}, count)
+        for label, count in sorted(self.bytes_in.items())
+      ])
+      metric('request_wire_bytes_total', 'counter',
+             'Request body bytes sent on the wire, after compression.', [
+               ('', {"endpoint": label}, count)
+               for label, count in sorted(self.wire_bytes_out.items())
+             ])
+      metric('response_wire_bytes_total', 'counter',
+             'Response bytes received on the wire, before decompression.', [
+               ('', {"endpoint": label}, count)
+               for label, count in sorted(self.wire_bytes_in.items())
+             ])
+      metric('decode_seconds_total', 'counter', 'Time spent decoding JSON.', [
+        ('', {"model": model}, seconds)
+        for model, seconds in sorted(self.decode_seconds.items())
+      ])
+      metric('retries_total', 'counter', 'Request retries.',
+             [('', {}, self.retries)])
+      metric('token_refreshes_total', 'counter', 'Access token refreshes.',
+             [('', {}, self.token_refreshes)])
+      metric('hedged_requests_total', 'counter',
+             'GET requests sent again after a hedging delay.', [
+               ('', {"endpoint": label}, count)
+               for label, count in sorted(self.hedges.items())
+             ])
+      if self.concurrency_limit is not None:
+        metric('concurrency_limit', 'gauge',
+               'Current limit on requests in flight.',
+               [('', {}, self.concurrency_limit)])
+        metric('concurrency_limit_decreases_total', 'counter',
+               'Cuts of the concurrency limit on overload.',
+               [('', {}, self.limit_decreases)])
+      metric('job_state_seconds_total', 'counter',
+             'Time fetch jobs spent in each state while polled.', [
+               ('', {"state": state}, seconds)
+               for state, seconds in sorted(self.job_state_seconds.items())
+             ])
+
+    return '\n'.join(lines) + '\n'
@@ -1,19 +1,91 @@
+import contextvars
 import csv
 import io
 import json
-from functools import wraps
+import multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial, wraps
+from operator import eq
 
 import lfapi.http_utils as http
-from lfapi.dep_utils import depends_on, safe_import
+from lfapi.checkpoint import fingerprint
+from lfapi.dep_utils import depends_on, lazy_import
 from lfapi.errors import LfError
+from lfapi.profiling import phase
+from lfapi.schema import FLOAT_TYPES, Schema
+from lfapi.tracing import span
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+pl = lazy_import('polars')
+pa = lazy_import('pyarrow')
+pc = lazy_import('pyarrow.compute')
+pq = lazy_import('pyarrow.parquet')
+ipc = lazy_import('pyarrow.ipc')
+
+# Arrow types of the column types of schema.column_type()
+ARROW_TYPES = {"float": 'float64', "int": 'int64', "bool": 'bool_',
+               "string": 'string'}
+
+def coerce_column(values, column):
+  """Convert a column of raw JSON scalars to a NumPy array.
+
+  Dates become datetime64[D] (NaT for nulls), metrics and floating point
+  columns become float64 (NaN for nulls), integer dimensions such as IDs become
+  int64 (float64 if nulls are present), booleans become bool (object if nulls
+  are present), and anything else is kept as an object array.
+
+  Arguments:
+  values
+    a sequence of the column's values
+  column
+    the column's metadata from an AnalyticResponse's columns
+  """
+  data_type = column.get("data_type")
+  if data_type == 'DATE':
+    return np.array(values, dtype='datetime64[D]')
+  if column.get("class") == 'METRIC' or data_type in FLOAT_TYPES:
+    return np.array(values, dtype=np.float64)
+  if data_type == 'INTEGER':
+    try:
+      return np.array(values, dtype=np.int64)
+    except TypeError:  # nulls present
+      return np.array(values, dtype=np.float64)
+  if data_type == 'BOOLEAN' and None not in values:
+    return np.array(values, dtype=np.bool_)
+
+  arr = np.empty(len(values), dtype=object)
+  arr[:] = values
+  return arr
+
+
+def encode_page(content, model_kwargs):
+  """Parse a raw analytic page and return it as Arrow IPC stream bytes.
+
+  Run in worker processes by FetchJob.download_pages(processes=...), so that
+  only compact columnar buffers are sent back to the parent; see
+  AnalyticResponse.from_ipc().
+  """
+  return AnalyticResponse(json.loads(content), **model_kwargs).to_ipc()
 
-pd = safe_import('pandas')
-pa = safe_import('pyarrow')
-pq = safe_import('pyarrow.parquet')
 
 class NoClientError(LfError):
   pass
 
+def profiled(phase_name):
+  # Record a method under a phase of the client's or the active profiler
+  def profiled_decorator(mth):
+    @wraps(mth)
+    def _mth(self, *args, **kwargs):
+      with phase(phase_name, getattr(self.client, "profiler", None)):
+        return mth(self, *args, **kwargs)
+
+    return _mth
+
+  return profiled_decorator
+
 def requires_client(mth):
   @wraps(mth)
   def _mth(self, *args, **kwargs):
@@ -59,6 +131,7 @@ class Model:
     """Return the model as a dictionary."""
     return self.record if self.record is not None else self.body
 
+  @profiled('export')
   def to_json(self, fp=None, **json_kwargs):
     """Send the model to a JSON file or string object.
 
@@ -112,13 +185,174 @@ class FetchJob(Model):
     """Update fetch job until state is one of 'completed', 'failed'."""
     self.merge(self.client.poll_fetch_job(self.id))
 
-  def download_pages(self, label_mode="id"):
-    """Return generator of fetch job's pages as AnalyticResponse objects."""
+  def download_pages(self, label_mode="id", checkpoint=None, columns=None,
+                     where=None, processes=None, cache=None, threads=None,
+                     readahead=None, dictionary_encode=False):
+    """Return generator of fetch job's pages as AnalyticResponse objects.
+
+    Arguments:
+    label_mode
+      the label mode of the downloaded pages; one of "id", "name"
+    checkpoint
+      a lfapi.checkpoint.Checkpoint; if specified, pages are recorded as
+      completed by page URL index, and a re-run for the same query, columns
+      and where resumes after the last completed page (optional)
+    columns, where
+      the column projection and row filter applied to each page as it is
+      parsed; see AnalyticResponse (optional)
+    processes
+      the number of worker processes to parse pages in while the next pages
+      download; pages are sent back as Arrow buffers, so PyArrow is required,
+      and where functions must be picklable (optional)
+    cache
+      a lfapi.cache.ResultCache; if specified, pages are read from the cache
+      when this job's query was already downloaded with the same arguments,
+      and stored in it otherwise. Cannot be combined with checkpoint
+      (optional)
+    threads
+      the number of threads downloading pages ahead of the one being parsed;
+      a client's concurrency.AdaptiveLimiter still sets how many requests
+      are in flight. Defaults to downloading one page at a time (optional)
+    readahead
+      the most pages downloaded or downloading ahead of the one being parsed,
+      bounding the page bodies held in memory; defaults to threads (optional)
+    dictionary_encode
+      whether to dictionary encode string dimensions of each page; see
+      AnalyticResponse (optional)
+    """
     if self.state != 'completed' or not hasattr(self, "page_urls"):
       raise LfError('Attempted to download pages from uncompleted fetch job.')
 
-    return (AnalyticResponse(http.make_request(http.GET, url).json(),
-                             label_mode=label_mode) for url in self.page_urls)
+    model_kwargs = {"label_mode": label_mode, "columns": columns,
+                    "where": where}
+    if dictionary_encode:
+      model_kwargs["dictionary_encode"] = True
+    if cache is not None:
+      if checkpoint is not None:
+        raise LfError('A checkpoint cannot be combined with a cache.')
+      key = cache.key(self._query_key(), **model_kwargs)
+      if key in cache:
+        return cache.load(key, client=self.client)
+
+    if processes is not None and not pa:
+      raise NotImplementedError('pyarrow is not installed')
+    options = {"processes": processes, "threads": threads,
+               "readahead": readahead}
+
+    if checkpoint is not None:
+      return self._download_pages_resumable(model_kwargs, checkpoint, options)
+    if cache is not None:
+      return cache.store(key, self._iter_pages(model_kwargs, **options))
+    return self._iter_pages(model_kwargs, **options)
+
+  def _iter_pages(self, model_kwargs, start=0, processes=None, threads=None,
+                  readahead=None):
+    responses = self._responses(start, threads, readahead)
+    if processes is not None:
+      return self._parse_in_processes(responses, model_kwargs, processes)
+    return self._parse(responses, model_kwargs)
+
+  def _download(self, index):
+    with span('lfapi.download_page', job_id=self.id,
+              page_index=index) as current:
+      res = self._get_page(self.page_urls[index])
+      current.set_attribute('bytes', len(res.content))
+    return res
+
+  def _responses(self, start, threads, readahead=None):
+    # Yield (index, response) pairs in page order, with up to readahead pages
+    # downloading or downloaded ahead, in the caller's context so that its
+    # profiler and trace apply
+    indices = range(start, len(self.page_urls))
+    if threads is None:
+      for index in indices:
+        yield index, self._download(index)
+      return
+
+    readahead = threads if readahead is None else max(readahead, 1)
+    pool = ThreadPoolExecutor(threads)
+    pending = deque()
+    try:
+      for index in indices:
+        pending.append((index, pool.submit(contextvars.copy_context().run,
+                                           self._download, index)))
+        if len(pending) > readahead:
+          index, future = pending.popleft()
+          yield index, future.result()
+
+      while pending:
+        index, future = pending.popleft()
+        yield index, future.result()
+    finally:
+      pool.shutdown(wait=False, cancel_futures=True)
+
+  def _parse(self, responses, model_kwargs):
+    # Parse pages as they are downloaded, tracing each step
+    for index, res in responses:
+      with span('lfapi.parse_page', job_id=self.id,
+                page_index=index) as current:
+        profiler = getattr(self.client, "profiler", None)
+        with phase('decode', profiler):
+          body = res.json()
+        with phase('model', profiler):
+          ar = AnalyticResponse(body, client=self.client, **model_kwargs)
+        current.set_attribute('rows', len(ar))
+      yield ar
+
+  def _parse_in_processes(self, responses, model_kwargs, processes):
+    # Parse up to twice as many pages as there are workers in the pool as
+    # they are downloaded, then rebuild them from Arrow buffers. Workers are
+    # not forked, since the SDK's threads may hold locks at the time
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+      'forkserver' if 'forkserver' in methods else 'spawn'
+    )
+    pool = ProcessPoolExecutor(processes, mp_context=context)
+    pending = deque()
+
+    def collect():
+      index, future = pending.popleft()
+      with span('lfapi.parse_page', job_id=self.id,
+                page_index=index) as current:
+        with phase('model', getattr(self.client, "profiler", None)):
+          ar = AnalyticResponse.from_ipc(future.result(), client=self.client)
+        current.set_attribute('rows', len(ar))
+      return ar
+
+    try:
+      for index, res in responses:
+        pending.append((index, pool.submit(encode_page, res.content,
+                                           model_kwargs)))
+        if len(pending) > 2 * processes:
+          yield collect()
+
+      while pending:
+        yield collect()
+    finally:
+      pool.shutdown(wait=False, cancel_futures=True)
+
+  def _get_page(self, url):
+    # Download through the client when available so that its hooks apply
+    if self.client is not None:
+      return self.client.download_page(url)
+    return http.make_request(http.GET, url)
+
+  def _query_key(self):
+    # Page URLs are signed per job, so key on the query when it is available
+    if hasattr(self, "fetch_params"):
+      return {"fetch_params": self.fetch_params,
+              "max_rows": getattr(self, "max_rows", None)}
+    return {"fetch_job_id": self.id}
+
+  def _download_pages_resumable(self, model_kwargs, checkpoint, options):
+    query = {**self._query_key(), "columns": model_kwargs["columns"],
+             "where": model_kwargs["where"]}
+    start = checkpoint.start(fingerprint(query))
+    pages = self._iter_pages(model_kwargs, start=start, **options)
+    for index, ar in enumerate(pages, start=start):
+      yield ar
+      checkpoint.commit(index + 1)
+    checkpoint.clear()
 
 
 class ScheduleConfig(Model):
@@ -137,6 +371,104 @@ class Dataset(Model):
   """Wrapper for ListenFirst API Datasets."""
   _required = ["id", "name", "description", "analysis_type", "dataset_type"]
 
+class FieldValues(Model):
+  """Wrapper for ListenFirst API field value listings; iterates over the
+  listed values.
+  """
+  _required = ["records"]
+
+  def is_last_page(self):
+    """Determine whether there are any remaining pages."""
+    return not self.body.get("has_more_pages", False)
+
+  def __len__(self):
+    return len(self.records)
+
+  def __iter__(self):
+    return iter(self.records)
+
+
+class CompactRecord:
+  """Superclass for slot-based records of a list model.
+
+  Subclasses are generated per model class by compact_class(), with one slot
+  per required attribute. Any other attributes are kept as a tuple of values
+  under a tuple of keys shared by records with the same keys, equal strings
+  are shared across the records of a listing, and records do not keep a
+  reference to the response body. Records offer attribute access, as_dict()
+  and attrs like models, and to_model() returns the full model.
+
+  Parameters:
+  record
+    the record's dictionary
+  shared
+    a dict of the strings and key tuples to share, used across one listing
+  """
+
+  __slots__ = ("_extra_keys", "_extra_values")
+  _model = Model
+  _fields = ()
+
+  def __init__(self, record, shared=None):
+    missing = set(self._fields) - record.keys()
+    name = self._model.__name__
+    assert not missing, f'Missing attributes for {name}: {", ".join(missing)}'
+
+    if shared is None:
+      shared = {}
+    keys = []
+    values = []
+    for key, value in record.items():
+      if isinstance(value, str):
+        value = shared.setdefault(value, value)
+      if key in self._fields:
+        setattr(self, key, value)
+      else:
+        keys.append(key)
+        values.append(value)
+
+    keys = tuple(keys)
+    self._extra_keys = shared.setdefault(keys, keys)
+    self._extra_values = tuple(values)
+
+  def __getattr__(self, name):
+    # Only called for attributes missing from the slots
+    if not name.startswith('_extra'):
+      try:
+        return self._extra_values[self._extra_keys.index(name)]
+      except ValueError:
+        pass
+    raise AttributeError(
+      f"'{type(self).__name__}' object has no attribute '{name}'"
+    )
+
+  def as_dict(self):
+    """Return the record as a dictionary."""
+    record = {field: getattr(self, field) for field in self._fields}
+    record.update(zip(self._extra_keys, self._extra_values))
+    return record
+
+  @property
+  def attrs(self):
+    return sorted(self.as_dict().keys())
+
+  def to_model(self, client=None):
+    """Return the record as an instance of its model class."""
+    return self._model(self.as_dict(), client=client)
+
+
+_compact_classes = {}
+
+def compact_class(model):
+  """Return the CompactRecord subclass for a model class."""
+  if model not in _compact_classes:
+    fields = tuple(model._required)
+    _compact_classes[model] = type(f'Compact{model.__name__}',
+                                   (CompactRecord,),
+                                   {"__slots__": fields, "_model": model,
+                                    "_fields": fields})
+  return _compact_classes[model]
+
 
 class ListModel(Model):
   """Superclass for list-like ListenFirst API response wrappers.
@@ -144,17 +476,36 @@ class ListModel(Model):
   Parameters:
   item_class
     the class of list entries
+  compact
+    if True, entries are kept as slot-based CompactRecord objects rather than
+    models, and the records are dropped from the response body, which cuts
+    memory use for long listings
   """
 
   _required = ["records"]
+  compact = False
 
-  def __init__(self, body, item_class, client=None):
+  def __init__(self, body, item_class, client=None, compact=False):
     if not issubclass(item_class, Model):
       raise LfError(f'Expected Model class, got {item_class.__name__}')
 
     super().__init__(body, client=client)
     self._item_class = item_class
-    self.records = [self._item_class(rec) for rec in self.records]
+    if compact:
+      self.compact = True
+      record_class = compact_class(item_class)
+      shared = {}
+      self.records = [record_class(rec, shared) for rec in self.records]
+      self.body = {key: value for key, value in self.body.items()
+                   if key != "records"}
+    else:
+      self.records = [self._item_class(rec) for rec in self.records]
+
+  def as_dict(self):
+    """Return the model as a dictionary."""
+    if self.compact:
+      return {**self.body, "records": self.as_dict_list()}
+    return super().as_dict()
 
   def is_last_page(self):
     """Determine whether there are any remaining pages."""
@@ -164,6 +515,7 @@ class ListModel(Model):
     """Return the model as a list of models."""
     return self.records
 
+  @profiled('as_list')
   def as_dict_list(self):
     """Return the model as a list of dictionaries."""
     return [rec.as_dict() for rec in self.records]
@@ -173,6 +525,7 @@ class ListModel(Model):
     base_labels = set(self._item_class._required)
     return sorted(base_labels.union(*[rec.attrs for rec in self.records]))
 
+  @profiled('export')
   def to_csv(self, fp=None, delimiter=','):
     """Send the model to a CSV file or string object.
 
@@ -198,6 +551,7 @@ class ListModel(Model):
 
     return fp.getvalue() if isinstance(fp, io.StringIO) else None
 
+  @profiled('export')
   @depends_on('pandas')
   def to_pandas(self):
     """Convert the model to a Pandas DataFrame. Not implemented if Pandas is
@@ -209,6 +563,7 @@ class ListModel(Model):
       data=rows
     )
 
+  @profiled('export')
   @depends_on('pyarrow')
   def to_pyarrow(self):
     """Convert the model to a PyArrow Table. Not implemented if PyArrow is not
@@ -217,6 +572,16 @@ class ListModel(Model):
     rows = self.as_dict_list()
     return pa.Table.from_pylist(rows)
 
+  @profiled('export')
+  @depends_on('polars')
+  def to_polars(self):
+    """Convert the model to a Polars DataFrame, built from the buffers of
+    to_pyarrow() without copying. Not implemented if Polars or PyArrow is not
+    installed.
+    """
+    return pl.from_arrow(self.to_pyarrow())
+
+  @profiled('export')
   @depends_on('pyarrow.parquet')
   def write_parquet(self, where, **pq_kwargs):
     """Send the model to a Parquet file.
@@ -252,28 +617,344 @@ class ListModel(Model):
     body = {
       "records": [record.as_dict() for record in all_records]
     }
-    return ListModel(body, self._item_class)
+    return ListModel(body, self._item_class, compact=self.compact)
 
 
 class AnalyticResponse(ListModel):
-  """Wrapper for ListenFirst API Analytic Data."""
+  """Wrapper for ListenFirst API Analytic Data.
+
+  Parameters:
+  label_mode
+    the column attribute used as label; one of "id", "name"
+  dictionary_encode
+    if True, string dimension columns are dictionary encoded at parse time:
+    the body's rows are copied with repeated string dimension and date values
+    sharing one string object, and to_pandas() and to_pyarrow() turn string
+    dimension columns into Categorical and DictionaryArray columns. The codes
+    are recomputed if records is replaced or resized, but not after edits to
+    the rows in place. Off by default, since encoding costs a pass over the
+    rows
+  columns
+    a list of column IDs or labels to keep, in order; other columns are
+    dropped at parse time (optional)
+  where
+    a dict mapping column IDs or labels to a value or a function of one value;
+    only rows whose values equal, or pass, every entry are kept. Filtered
+    columns need not be kept by columns (optional)
+  """
 
   _required = ["columns", "records"]
+  _records = None
+  _table = None
+  _dictionaries = None
 
-  def __init__(self, body, client=None, label_mode="id"):
+  def __init__(self, body, client=None, label_mode="id",
+               dictionary_encode=False, columns=None, where=None):
     super(ListModel, self).__init__(body, client=client)
     if label_mode not in ["id", "name"]:
       raise LfError('Unexpected label_mode: "{label_mode}"')
     self.label_mode = label_mode
+    copied = False
+    if columns is not None or where:
+      copied = self._select(columns, where)
+    self.dictionary_encode = dictionary_encode
+    if dictionary_encode:
+      self._encode_strings(copy=not copied)
+
+  @classmethod
+  @depends_on('pyarrow')
+  def from_pyarrow(cls, table, client=None):
+    """Rebuild a model from a PyArrow Table written by
+    to_pyarrow(keep_metadata=True).
+
+    The rows are kept as the Arrow table, and only converted to Python
+    records on first access; to_pyarrow(), to_polars() and to_pandas() use
+    the table directly. Not implemented if PyArrow is not installed.
+    """
+    meta = json.loads(table.schema.metadata[b"lfapi"])
+    ar = cls.__new__(cls)
+    ar.body = meta["body"]
+    ar.client = client
+    for key, value in ar.body.items():
+      setattr(ar, key, value)
+    ar.label_mode = meta["label_mode"]
+    ar.dictionary_encode = meta["dictionary_encode"]
+    ar._table = table.replace_schema_metadata()
+    return ar
+
+  @classmethod
+  @depends_on('pyarrow')
+  def from_ipc(cls, buf, client=None):
+    """Rebuild a model from the Arrow IPC stream written by to_ipc(); see
+    from_pyarrow(). Not implemented if PyArrow is not installed.
+    """
+    return cls.from_pyarrow(ipc.open_stream(buf).read_all(), client=client)
 
+  @depends_on('pyarrow')
+  def to_ipc(self):
+    """Return the model as Arrow IPC stream bytes, keeping the response
+    metadata; see from_ipc(). Not implemented if PyArrow is not installed.
+    """
+    table = self.to_pyarrow(keep_metadata=True)
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+      writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+  @property
+  def records(self):
+    """The rows of the response as lists of values. The rows of a model
+    rebuilt by from_pyarrow() are converted from its table on first access.
+    """
+    if self._records is None and self._table is not None:
+      columns = [col.to_pylist() for col in self._table.columns]
+      self._records = [list(row) for row in zip(*columns)]
+      self.body["records"] = self._records
+      self._table_key = (id(self._records), len(self._records))
+    return self._records
+
+  @records.setter
+  def records(self, records):
+    self._records = records
+    self._dictionaries = None
+
+  def _arrow_table(self):
+    # Return the table of a model rebuilt by from_pyarrow(), unless its records
+    # have since been converted and replaced or resized
+    if self._table is None or self._records is None:
+      return self._table
+    if self._table_key == (id(self._records), len(self._records)):
+      return self._table
+    return None
+
+  def as_dict(self):
+    if self._table is not None:
+      self.records  # convert the rows of a model rebuilt by from_pyarrow()
+    return super().as_dict()
+
+  @property
+  def schema(self):
+    """The interned schema.Schema of the columns, shared by pages with the same
+    columns; computed once per columns list.
+    """
+    if self.__dict__.get("_schema_columns") is not self.columns:
+      self._schema = Schema.of(self.columns)
+      self._schema_columns = self.columns
+    return self._schema
+
+  def _column_index(self, name):
+    # Return the index of a column given its ID or label
+    return self.schema.position(name, self.label_mode)
+
+  def _select(self, columns, where):
+    # Filter and project the rows in a single pass, replacing the body so that
+    # the dropped values can be freed; returns whether the rows were copied
+    tests = []
+    for name, test in (where or {}).items():
+      if not callable(test):
+        test = partial(eq, test)
+      tests.append((self._column_index(name), test))
+
+    records = self.records
+    if tests:
+      records = (row for row in records
+                 if all(test(row[index]) for index, test in tests))
+    if columns is None:
+      records = list(records)
+    else:
+      indices = [self._column_index(name) for name in columns]
+      self.columns = [self.columns[index] for index in indices]
+      records = [[row[index] for index in indices] for row in records]
+
+    self.records = records
+    self.body = {**self.body, "columns": self.columns, "records": records}
+    return columns is not None
+
+  def _encode_strings(self, copy=True):
+    # Dictionary encode string dimensions in one pass over the rows, replacing
+    # repeated string dimension and date values with their first occurrence so
+    # that duplicates can be freed
+    strings = self.schema.string_columns
+    dates = self.schema.date_columns
+    if not strings and not dates:
+      return
+    lookups = [{} for _ in strings]
+    dictionaries = [([], array('i')) for _ in strings]
+    interned = [{} for _ in dates]
+    records = []
+    for row in self.records:
+      if copy:
+        row = list(row)
+      for index, lookup, (uniques, codes) in zip(strings, lookups,
+                                                 dictionaries):
+        value = row[index]
+        if value is None:
+          codes.append(-1)
+          continue
+        code = lookup.get(value)
+        if code is None:
+          code = lookup[value] = len(uniques)
+          uniques.append(value)
+        else:
+          row[index] = uniques[code]
+        codes.append(code)
+      for index, values in zip(dates, interned):
+        value = row[index]
+        row[index] = values.setdefault(value, value)
+      records.append(row)
+
+    self.records = records
+    self.body = {**self.body, "records": records}
+    self._dictionaries = dict(zip(strings, dictionaries))
+
+  def _encoded(self, indices=None):
+    # Return (unique values, codes) of each string dimension column, or of
+    # those among indices, with code -1 for nulls; codes are computed at parse
+    # time, and again only if the records were replaced or resized
+    if not self.dictionary_encode:
+      return {}
+    dictionaries = self._dictionaries
+    if dictionaries is None or any(len(codes) != len(self.records)
+                                   for _, codes in dictionaries.values()):
+      self._encode_strings()
+      dictionaries = self._dictionaries or {}
+    if indices is None:
+      return dictionaries
+    return {index: dictionary for index, dictionary in dictionaries.items()
+            if index in indices}
+
+  def _column_values(self):
+    # Transpose the rows into one tuple of values per column
+    return list(zip(*self.records)) or [()] * len(self.columns)
+
+  @profiled('as_list')
   def as_list(self):
     """Return the model as a list. Items are dictionaries instead of models."""
     return [dict(zip(self._labels, row)) for row in self.records]
 
+  def _columnar(self):
+    # Coerce each column once, caching the arrays until records are replaced
+    # or resized
+    cache_key = (id(self.records), len(self.records))
+    if getattr(self, "_arrays_key", None) != cache_key:
+      self._arrays = [coerce_column(col_values, col) for col_values, col
+                      in zip(self._column_values(), self.columns)]
+      self._arrays_key = cache_key
+    return self._arrays
+
+  @profiled('export')
+  @depends_on('pandas')
+  def to_pandas(self):
+    """Convert the model to a Pandas DataFrame, with dictionary encoded
+    columns as Categoricals and floating point columns as float64, whatever
+    the values of the page. Not implemented if Pandas is not installed.
+    """
+    table = self._arrow_table()
+    if table is not None:
+      return table.to_pandas()
+
+    encoded = self._encoded()
+    types = self.schema.types
+    data = {}
+    for index, values in enumerate(self._column_values()):
+      if index in encoded:
+        uniques, codes = encoded[index]
+        values = pd.Categorical.from_codes(np.frombuffer(codes, dtype='i4'),
+                                           categories=uniques)
+      elif types[index] == 'float':
+        values = np.array(values, dtype=np.float64)
+      data[index] = values
+
+    df = pd.DataFrame(data, columns=range(len(self.columns)))
+    df.columns = self._labels
+    return df
+
+  @profiled('export')
+  @depends_on('pyarrow')
+  def to_pyarrow(self, keep_metadata=False, columns=None):
+    """Convert the model to a PyArrow Table, with dictionary encoded columns
+    as DictionaryArrays. Columns of known type get the Arrow type of their
+    metadata instead of one inferred from the values, so pages of a query
+    convert to the same Arrow schema. Not implemented if PyArrow is not
+    installed.
+
+    Arguments:
+    keep_metadata
+      if True, the columns and other response attributes are stored in the
+      schema metadata, so that from_pyarrow() can rebuild the model
+    columns
+      the IDs or labels of the columns to convert, in order; other columns
+      are skipped. Defaults to all columns
+    """
+    if keep_metadata and columns is not None:
+      raise LfError('Columns cannot be selected with keep_metadata.')
+    if keep_metadata:
+      body = {key: value for key, value in self.body.items()
+              if key != "records"}
+      meta = {"body": body, "label_mode": self.label_mode,
+              "dictionary_encode": self.dictionary_encode}
+      table = self.to_pyarrow()
+      return table.replace_schema_metadata({"lfapi": json.dumps(meta)})
+
+    labels = self._labels
+    if columns is None:
+      indices = range(len(self.columns))
+    else:
+      indices = [self._column_index(name) for name in columns]
+      labels = [labels[index] for index in indices]
+
+    table = self._arrow_table()
+    if table is not None:
+      return table if columns is None else table.select(labels)
+
+    if columns is None:
+      column_values = self._column_values()
+    else:
+      column_values = [[row[index] for row in self.records]
+                       for index in indices]
+    encoded = self._encoded(indices)
+    types = [ARROW_TYPES.get(col_type) for col_type in self.schema.types]
+    arrays = []
+    for index, values in zip(indices, column_values):
+      if index in encoded:
+        uniques, codes = encoded[index]
+        codes_array = pa.array(codes, type=pa.int32())
+        if -1 in codes:
+          codes_array = pc.if_else(pc.less(codes_array, 0),
+                                   pa.scalar(None, type=pa.int32()),
+                                   codes_array)
+        arrays.append(pa.DictionaryArray.from_arrays(
+          codes_array, pa.array(uniques, type=pa.string())
+        ))
+      elif types[index] == 'int64':
+        # pa.array() truncates floats to the requested type, so infer the
+        # type and cast, which raises on fractional values instead
+        array = pa.array(values)
+        if array.type != pa.int64():
+          array = array.cast(pa.int64())
+        arrays.append(array)
+      else:
+        arrow_type = types[index] and getattr(pa, types[index])()
+        arrays.append(pa.array(values, type=arrow_type))
+    return pa.Table.from_arrays(arrays, names=labels)
+
+  @profiled('export')
+  @depends_on('numpy')
+  def to_numpy(self):
+    """Convert the model to a dict of NumPy arrays keyed by column label, with
+    types coerced from the column metadata; see coerce_column(). Not
+    implemented if NumPy is not installed.
+    """
+    return dict(zip(self._labels, self._columnar()))
+
   def as_dict_list(self):
     """Alias of as_list()."""
     return self.as_list()
 
+  def __len__(self):
+    table = self._arrow_table()
+    return len(self.records) if table is None else table.num_rows
+
   def __add__(self, other):
     if not isinstance(other, AnalyticResponse):
       class_name = type(other).__name__
@@ -292,4 +973,4 @@ class AnalyticResponse(ListModel):
   @property
   def _labels(self):
     # Return the list of column labels, using either "id" or "name"
-    return [col[self.label_mode] for col in self.columns]
+    return list(self.schema.labels[self.label_mode])
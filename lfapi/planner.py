@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+from datetime import date
+from math import ceil
+
+import lfapi.fork_utils as fork_utils
+from lfapi.checkpoint import dump_atomic
+from lfapi.incremental import query_key
+
+
+def query_days(fetch_params):
+  """Return the number of days in a query's date range, or None."""
+  try:
+    start = date.fromisoformat(fetch_params["start_date"])
+    end = date.fromisoformat(fetch_params["end_date"])
+  except (KeyError, TypeError, ValueError):
+    return None
+  return max((end - start).days + 1, 1)
+
+
+class QueryPlan:
+  """Execution plan for an analytic query.
+
+  Attributes:
+  strategy
+    'sync' to fetch pages with Client.sync_analytic_query(), 'async' to run a
+    fetch job with Client.async_analytic_query()
+  total_records
+    the estimated number of rows
+  per_page
+    the rows per page of a sync query
+  pages
+    the estimated number of pages
+  threads
+    the number of threads downloading fetch job pages, or None to download
+    one page at a time
+  source
+    'history' if the estimate came from past queries, 'probe' if it came
+    from a one-row fetch
+  """
+
+  def __init__(self, strategy, total_records, per_page, pages, threads=None,
+               source='probe'):
+    self.strategy = strategy
+    self.total_records = total_records
+    self.per_page = per_page
+    self.pages = pages
+    self.threads = threads
+    self.source = source
+
+  def __repr__(self):
+    return (f'QueryPlan(strategy={self.strategy!r}, '
+            f'total_records={self.total_records}, pages={self.pages})')
+
+
+class QueryPlanner:
+  """Cost model choosing between sync pages and fetch jobs for a query.
+
+  A query's size is estimated from the rows per day seen in past runs of the
+  same query, keyed on the query without its dates, or else from the
+  total_records of a one-row fetch. A sync query is expected to take
+  sync_page_seconds per page and a fetch job job_seconds before its pages
+  are ready; the cheaper strategy is chosen, and both costs are updated with
+  the times observed as queries run.
+
+  Parameters:
+  path
+    the filename of a JSON file the history and costs are kept in (optional)
+  max_per_page
+    the largest page size requested from /analytics/fetch
+  sync_page_seconds
+    the initial estimate of seconds per sync page
+  job_seconds
+    the initial estimate of seconds to create and complete a fetch job
+  max_threads
+    the most threads downloading fetch job pages; a client's limiter still
+    sets how many requests are in flight
+  """
+
+  def __init__(self, path=None, max_per_page=1000, sync_page_seconds=1.0,
+               job_seconds=30.0, max_threads=8):
+    self.path = path
+    self.max_per_page = max_per_page
+    self.max_threads = max_threads
+    self.history = {}
+    self.costs = {"sync_page_seconds": sync_page_seconds,
+                  "job_seconds": job_seconds}
+    self._lock = threading.Lock()
+    if path is not None:
+      self._load()
+    fork_utils.register(self)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state["_lock"]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._after_fork()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    self._lock = threading.Lock()
+
+  def _load(self):
+    try:
+      with open(self.path) as f:
+        state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return
+    self.history.update(state.get("history", {}))
+    self.costs.update(state.get("costs", {}))
+
+  def _save(self):
+    if self.path is not None:
+      dump_atomic({"history": self.history, "costs": self.costs}, self.path)
+
+  def estimate(self, fetch_params):
+    """Return the estimated number of rows of a query from past runs, or
+    None.
+    """
+    days = query_days(fetch_params)
+    rows_per_day = self.history.get(query_key(fetch_params))
+    if days is None or rows_per_day is None:
+      return None
+    return ceil(rows_per_day * days)
+
+  def plan(self, client, fetch_params):
+    """Return the QueryPlan of a query, probing its size with a one-row fetch
+    if there is no history of it.
+    """
+    total = self.estimate(fetch_params)
+    source = 'history'
+    if total is None:
+      probe = client.fetch({**fetch_params, "page": 1, "per_page": 1})
+      total = probe.body.get("total_records", len(probe))
+      source = 'probe'
+
+    per_page = min(max(total, 1), self.max_per_page)
+    pages = max(ceil(total / per_page), 1)
+    sync_cost = pages * self.costs["sync_page_seconds"]
+    if sync_cost <= self.costs["job_seconds"]:
+      return QueryPlan('sync', total, per_page, pages, source=source)
+
+    threads = min(pages, self.max_threads)
+    return QueryPlan('async', total, per_page, pages, threads=threads,
+                     source=source)
+
+  def observe(self, fetch_params, plan, seconds, total_records=None,
+              first_page_seconds=None):
+    """Update the history and costs with a completed query.
+
+    Arguments:
+    fetch_params
+      the query parameters
+    plan
+      the QueryPlan the query ran with
+    seconds
+      the seconds spent fetching the query's pages, not counting the time the
+      caller spends between pages
+    total_records
+      the number of rows of the query, if known
+    first_page_seconds
+      the seconds spent fetching until the first page of a fetch job was
+      ready
+    """
+    with self._lock:
+      days = query_days(fetch_params)
+      if days is not None and total_records is not None:
+        self.history[query_key(fetch_params)] = total_records / days
+
+      # Blend observed costs into the estimates
+      if plan.strategy == 'sync':
+        key, observed = "sync_page_seconds", seconds / max(plan.pages, 1)
+      else:
+        key, observed = "job_seconds", first_page_seconds
+      if observed is not None:
+        self.costs[key] += 0.3 * (observed - self.costs[key])
+      self._save()
+
+  def run(self, client, fetch_params, columns=None, where=None):
+    """Run a query with the strategy of its plan, yielding its pages as
+    models.AnalyticResponse objects. Only the time spent fetching pages is
+    observed, not the time the caller spends between pages.
+    """
+    plan = self.plan(client, fetch_params)
+    if plan.strategy == 'sync':
+      pages = client.sync_analytic_query(fetch_params, per_page=plan.per_page,
+                                         columns=columns, where=where)
+    else:
+      pages = client.async_analytic_query(fetch_params, columns=columns,
+                                          where=where, threads=plan.threads)
+
+    seconds = 0.0
+    first_page_seconds = None
+    total_records = None
+    while True:
+      start = time.perf_counter()
+      page = next(pages, None)
+      seconds += time.perf_counter() - start
+      if page is None:
+        break
+      if first_page_seconds is None:
+        first_page_seconds = seconds
+        total_records = page.body.get("total_records")
+      yield page
+
+    # Fetch job pages have no total_records, so keep the plan's estimate
+    if total_records is None:
+      total_records = plan.total_records
+    self.observe(fetch_params, plan, seconds, total_records=total_records,
+                 first_page_seconds=first_page_seconds)
@@ -0,0 +1,203 @@
+import copy
+import threading
+from collections import deque
+from concurrent.futures import Future, as_completed
+from functools import partial
+
+import requests
+
+import lfapi.fork_utils as fork_utils
+from lfapi.client import Client
+from lfapi.errors import LfError
+
+
+class ClientPool:
+  """Per-account clients sharing one connection pool and access token.
+
+  Each account gets its own Client, sending that account's
+  lfm-acting-account header, so accounts can be used concurrently without
+  switching Client.account_id. Work submitted for accounts runs on a shared
+  set of threads, which take tasks from each account in turn, with at most
+  max_per_account tasks of an account running at once. The threads are daemon
+  threads, so they do not keep the interpreter alive: call close(), or use
+  the pool as a context manager, to wait for queued tasks, which are dropped
+  at exit otherwise.
+
+  Parameters:
+  api_key
+    the API key to be used
+  auth
+    the authentication object shared by the clients
+  account_ids
+    the acting accounts to create clients for; None stands for the primary
+    account
+  api_host
+    the host to send requests to; defaults to Client.DEFAULT_API_HOST
+  max_workers
+    the number of threads running tasks
+  max_per_account
+    the number of tasks of one account that may run at once
+  session
+    the requests.Session shared by the clients; defaults to a new session
+    with a connection pool sized for max_workers, closed with the pool
+  client_kwargs
+    further keyword arguments passed to every Client, e.g. a shared
+    concurrency.AdaptiveLimiter as limiter
+
+  Attributes:
+  clients
+    a dict mapping account IDs to their Client
+  """
+
+  def __init__(self, api_key, auth, account_ids, api_host=None,
+               max_workers=8, max_per_account=2, session=None,
+               **client_kwargs):
+    self._owns_session = session is None
+    if session is None:
+      session = requests.Session()
+      adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+      session.mount('https://', adapter)
+      session.mount('http://', adapter)
+    self.session = session
+    self.max_workers = max_workers
+    self.max_per_account = max_per_account
+    self.clients = {
+      account_id: Client(api_key, auth, account_id=account_id,
+                         api_host=api_host, session=session, **client_kwargs)
+      for account_id in account_ids
+    }
+    self._queues = {account_id: deque() for account_id in self.clients}
+    self._running = dict.fromkeys(self.clients, 0)
+    self._turns = deque(self.clients)
+    self._threads = []
+    self._closed = False
+    self._cond = threading.Condition()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    # The parent's threads and queued tasks stay in the parent
+    self.session = fork_utils.renew(self.session,
+                                    partial(copy.deepcopy, self.session))
+    for queue in self._queues.values():
+      queue.clear()
+    self._running = dict.fromkeys(self.clients, 0)
+    self._threads = []
+    self._cond = threading.Condition()
+
+  @classmethod
+  def from_client(cls, client, account_ids, **kwargs):
+    """Create a pool with the API key, auth and host of a client."""
+    return cls(client.api_key, client.auth, account_ids,
+               api_host=client.api_host, **kwargs)
+
+  def __getitem__(self, account_id):
+    return self.clients[account_id]
+
+  def __iter__(self):
+    return iter(self.clients)
+
+  def __len__(self):
+    return len(self.clients)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def submit(self, account_id, func, *args, **kwargs):
+    """Schedule func(client, *args, **kwargs) with an account's client and
+    return a concurrent.futures.Future of its result.
+    """
+    if account_id not in self.clients:
+      raise LfError(f'Unknown account: {account_id}')
+
+    future = Future()
+    with self._cond:
+      if self._closed:
+        raise LfError('Attempted to submit work to a closed client pool.')
+      self._queues[account_id].append((future, func, args, kwargs))
+      if len(self._threads) < self.max_workers:
+        thread = threading.Thread(target=self._work, daemon=True,
+                                  name='lfapi-pool')
+        thread.start()
+        self._threads.append(thread)
+      self._cond.notify()
+    return future
+
+  def fan_out(self, func, *args, account_ids=None, **kwargs):
+    """Schedule func(client, *args, **kwargs) for every account, or for the
+    given account_ids, and return a dict mapping account IDs to futures.
+    """
+    account_ids = self.clients if account_ids is None else account_ids
+    return {account_id: self.submit(account_id, func, *args, **kwargs)
+            for account_id in account_ids}
+
+  def map(self, func, *args, account_ids=None, **kwargs):
+    """Run func(client, *args, **kwargs) for every account, or for the given
+    account_ids, and yield (account_id, result) pairs as they complete.
+
+    The first error raised by func is raised once its account comes up; use
+    fan_out() to handle errors per account.
+    """
+    futures = self.fan_out(func, *args, account_ids=account_ids, **kwargs)
+    accounts = {future: account_id for account_id, future in futures.items()}
+    for future in as_completed(accounts):
+      yield accounts[future], future.result()
+
+  def analytic_query(self, fetch_params, account_ids=None, **kwargs):
+    """Run an async analytic query for every account, or for the given
+    account_ids, and yield (account_id, pages) pairs as they complete, where
+    pages is a list of models.AnalyticResponse objects. Further keyword
+    arguments are passed to Client.async_analytic_query().
+    """
+    def query(client):
+      return list(client.async_analytic_query(fetch_params, **kwargs))
+
+    return self.map(query, account_ids=account_ids)
+
+  def close(self):
+    """Wait for queued tasks to complete, stop the pool's threads, close the
+    clients, and close the session if the pool created it.
+    """
+    with self._cond:
+      self._closed = True
+      self._cond.notify_all()
+    for thread in self._threads:
+      thread.join()
+    for client in self.clients.values():
+      client.close()
+    if self._owns_session:
+      self.session.close()
+
+  def _next_task(self):
+    # Take a task from the next account in turn that is under its limit
+    for _ in range(len(self._turns)):
+      account_id = self._turns[0]
+      self._turns.rotate(-1)
+      if (self._queues[account_id] and
+          self._running[account_id] < self.max_per_account):
+        self._running[account_id] += 1
+        return account_id, self._queues[account_id].popleft()
+    return None
+
+  def _work(self):
+    while True:
+      with self._cond:
+        task = self._next_task()
+        while task is None:
+          if self._closed and not any(self._queues.values()):
+            return
+          self._cond.wait()
+          task = self._next_task()
+
+      account_id, (future, func, args, kwargs) = task
+      if future.set_running_or_notify_cancel():
+        try:
+          future.set_result(func(self.clients[account_id], *args, **kwargs))
+        except BaseException as err:
+          future.set_exception(err)
+
+      with self._cond:
+        self._running[account_id] -= 1
+        self._cond.notify_all()
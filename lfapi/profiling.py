@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+import lfapi.fork_utils as fork_utils
+
+PHASES = ['auth', 'headers', 'network', 'decode', 'model', 'as_list',
+          'export']
+
+_active = ContextVar('lfapi_profiler', default=None)
+_NULL_PHASE = nullcontext()
+
+
+class Profiler:
+  """Recorder of wall and CPU time spent in the SDK's phases.
+
+  Phases nest, and each phase is credited only with its own time: time spent
+  in a nested phase is not counted again in the enclosing one. Profilers are
+  activated by Client(profile=True), which records the client's requests and
+  the models it creates, or by using the profiler as a context manager, which
+  records every SDK call made in the block.
+
+  Attributes:
+  wall, cpu
+    dicts mapping phase names to cumulative seconds
+  calls
+    dict mapping phase names to the number of times each was entered
+  """
+
+  def __init__(self):
+    self._local = threading.local()
+    self._lock = threading.Lock()
+    self._tokens = []
+    self.reset()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    self._lock = threading.Lock()
+
+  def reset(self):
+    """Clear every recorded phase."""
+    with self._lock:
+      self.wall = defaultdict(float)
+      self.cpu = defaultdict(float)
+      self.calls = defaultdict(int)
+
+  def _stack(self):
+    if not hasattr(self._local, "stack"):
+      self._local.stack = []
+    return self._local.stack
+
+  def _credit(self, frame, wall, cpu):
+    # Credit a frame's phase with the time since it last started or resumed
+    with self._lock:
+      self.wall[frame[0]] += wall - frame[1]
+      self.cpu[frame[0]] += cpu - frame[2]
+
+  @contextmanager
+  def phase(self, name):
+    """Record the time spent in the block under a phase name."""
+    stack = self._stack()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    if stack:
+      self._credit(stack[-1], wall, cpu)
+    stack.append([name, wall, cpu])
+    with self._lock:
+      self.calls[name] += 1
+
+    try:
+      yield
+    finally:
+      wall, cpu = time.perf_counter(), time.thread_time()
+      self._credit(stack.pop(), wall, cpu)
+      if stack:  # resume the enclosing phase
+        stack[-1][1:] = [wall, cpu]
+
+  def report(self):
+    """Return a list of per-phase dictionaries, known phases first."""
+    with self._lock:
+      names = [name for name in PHASES if name in self.calls]
+      names += sorted(self.calls.keys() - set(PHASES))
+      total = sum(self.wall.values())
+      return [{
+        "phase": name,
+        "calls": self.calls[name],
+        "wall_seconds": self.wall[name],
+        "cpu_seconds": self.cpu[name],
+        "wall_share": self.wall[name] / total if total else 0.0
+      } for name in names]
+
+  def table(self):
+    """Return the report as a formatted table."""
+    rows = self.report()
+    lines = [f'{"phase":<20}{"calls":>8}{"wall s":>12}{"cpu s":>12}'
+             f'{"wall %":>9}']
+    for row in rows:
+      lines.append(f'{row["phase"]:<20}{row["calls"]:>8}'
+                   f'{row["wall_seconds"]:>12.4f}{row["cpu_seconds"]:>12.4f}'
+                   f'{row["wall_share"]:>9.1%}')
+
+    wall = sum(row["wall_seconds"] for row in rows)
+    cpu = sum(row["cpu_seconds"] for row in rows)
+    lines.append(f'{"total":<20}{"":>8}{wall:>12.4f}{cpu:>12.4f}')
+    return '\n'.join(lines)
+
+  def print_report(self, file=None):
+    """Print the report table."""
+    print(self.table(), file=file)
+
+  # Context manager protocol
+  def __enter__(self):
+    self._tokens.append(_active.set(self))
+    return self
+
+  def __exit__(self, *exc_info):
+    _active.reset(self._tokens.pop())
+
+
+def phase(name, profiler=None):
+  """Return a context manager recording a phase on the given profiler, or on
+  the active one; a no-op if neither exists.
+  """
+  if profiler is None:
+    profiler = _active.get()
+    if profiler is None:
+      return _NULL_PHASE
+  return profiler.phase(name)
+
+def profile():
+  """Return a Profiler that records every SDK call made in a with block."""
+  return Profiler()
@@ -0,0 +1,226 @@
+import json
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
+import lfapi.fork_utils as fork_utils
+from lfapi.checkpoint import dump_atomic
+from lfapi.errors import LfError
+
+# fetch_params entries naming dataset fields
+FIELD_LISTS = ["metrics", "group_by", "meta_dimensions"]
+FLOAT_TYPES = {"FLOAT", "DOUBLE", "DECIMAL", "NUMERIC"}
+
+
+def column_type(column):
+  """Return the type of a column's values given its metadata: one of "float",
+  "int", "bool" and "string", or None if the type is unknown. Metrics are
+  floats whatever their data type, as in models.coerce_column(), since
+  aggregated values may be fractional.
+  """
+  data_type = column.get("data_type")
+  if column.get("class") == 'METRIC' or data_type in FLOAT_TYPES:
+    return 'float'
+  if data_type == 'INTEGER':
+    return 'int'
+  if data_type == 'BOOLEAN':
+    return 'bool'
+  if data_type in ('STRING', 'DATE'):
+    return 'string'
+  return None
+
+@lru_cache(maxsize=1024)
+def _intern(keys):
+  return Schema([dict(key) if isinstance(key, tuple) else json.loads(key)
+                 for key in keys])
+
+
+class Schema:
+  """Column metadata of analytic results, with labels and lookups computed
+  once.
+
+  Schemas are interned with Schema.of(), so pages of the same query share one
+  schema object. Schemas keep a read-only copy of the columns, so changes to
+  the columns of one response do not reach other responses.
+
+  Parameters:
+  columns
+    a list of column dicts, as in an AnalyticResponse's columns
+
+  Attributes:
+  columns
+    a tuple of read-only column mappings
+  labels
+    a dict mapping each label mode, "id" and "name", to the tuple of labels
+  types
+    the tuple of column value types; see column_type()
+  string_columns, date_columns
+    the positions of string dimension and date columns
+  """
+
+  def __init__(self, columns):
+    self.columns = tuple(MappingProxyType(dict(col)) for col in columns)
+    columns = self.columns
+    self.labels = {
+      "id": tuple(col["id"] for col in columns),
+      "name": tuple(col.get("name") for col in columns)
+    }
+    self.types = tuple(column_type(col) for col in columns)
+    self._positions = {}
+    for mode, labels in self.labels.items():
+      positions = self._positions[mode] = {}
+      for index, label in enumerate(labels):
+        positions.setdefault(label, index)
+    self.string_columns = [
+      index for index, col in enumerate(columns)
+      if col.get("data_type") == 'STRING' and col.get("class") != 'METRIC'
+    ]
+    self.date_columns = [index for index, col in enumerate(columns)
+                         if col.get("data_type") == 'DATE']
+
+  @classmethod
+  def of(cls, columns):
+    """Return the interned schema of a list of column dicts."""
+    try:
+      return _intern(tuple(tuple(col.items()) for col in columns))
+    except TypeError:  # unhashable metadata values
+      return _intern(tuple(json.dumps(col, sort_keys=True) for col in columns))
+
+  def __reduce__(self):
+    return Schema.of, ([dict(col) for col in self.columns],)
+
+  def position(self, name, label_mode="id"):
+    """Return the position of a column given its ID or its label in
+    label_mode, raising LfError for unknown columns.
+    """
+    for mode in ("id", label_mode):
+      if name in self._positions[mode]:
+        return self._positions[mode][name]
+    raise LfError(f'Unknown column: "{name}"')
+
+  def __len__(self):
+    return len(self.columns)
+
+
+class SchemaRegistry:
+  """Cache of dataset field definitions from Client.get_dataset().
+
+  Parameters:
+  client
+    the lfapi.Client used to look up datasets
+  path
+    the filename of a JSON file the definitions are kept in, so that other
+    processes and later runs skip the lookups; the file is read again before
+    each lookup, so processes sharing it look each dataset up about once
+    (optional)
+  missing_ttl
+    the seconds for which a dataset listed without fields is not looked up
+    again; such datasets are only remembered in memory. Defaults to 5 minutes
+  """
+
+  def __init__(self, client, path=None, missing_ttl=300):
+    self.client = client
+    self.path = path
+    self.missing_ttl = missing_ttl
+    self._fields = {}
+    self._missing = {}
+    self._lock = threading.Lock()
+    self._read()
+    fork_utils.register(self)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state["_lock"]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._after_fork()
+    fork_utils.register(self)
+
+  def _after_fork(self):
+    self._lock = threading.Lock()
+
+  def _read(self):
+    # Merge definitions other processes saved
+    if self.path is None:
+      return
+    try:
+      with open(self.path) as f:
+        fields = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return
+    with self._lock:
+      for dataset_id, dataset_fields in fields.items():
+        self._fields.setdefault(dataset_id, dataset_fields)
+
+  def fields(self, dataset_id):
+    """Return a dict mapping the field IDs of a dataset to their definitions
+    (id, name, class, data_type, ...), looking the dataset up on first use.
+    Datasets listed without fields give an empty dict, which is cached for
+    missing_ttl seconds.
+    """
+    with self._lock:
+      fields = self._fields.get(dataset_id)
+    if fields is None:
+      self._read()
+      with self._lock:
+        fields = self._fields.get(dataset_id)
+    if fields is not None:
+      return fields
+    with self._lock:
+      checked = self._missing.get(dataset_id)
+    if checked is not None and time.monotonic() - checked < self.missing_ttl:
+      return {}
+
+    dataset = self.client.get_dataset(dataset_id)
+    fields = {field["id"]: field
+              for field in getattr(dataset, "fields", None) or []}
+    if not fields:
+      with self._lock:
+        self._missing[dataset_id] = time.monotonic()
+      return fields
+    self._read()
+    with self._lock:
+      self._fields[dataset_id] = fields
+      if self.path is not None:
+        dump_atomic(self._fields, self.path)
+    return fields
+
+  def load(self, dataset_ids=None):
+    """Look up the fields of datasets, defaulting to every dataset listed by
+    Client.list_datasets().
+    """
+    if dataset_ids is None:
+      dataset_ids = [dataset.id for dataset in self.client.list_datasets()]
+    for dataset_id in dataset_ids:
+      self.fields(dataset_id)
+
+  def schema(self, dataset_id, field_ids):
+    """Return the interned Schema of query columns given their field IDs."""
+    fields = self.fields(dataset_id)
+    missing = [field_id for field_id in field_ids if field_id not in fields]
+    if missing:
+      raise LfError(f'Unknown fields for {dataset_id}: {", ".join(missing)}')
+    return Schema.of([fields[field_id] for field_id in field_ids])
+
+  def validate(self, fetch_params):
+    """Check that the fields a query names exist in its dataset, raising
+    LfError otherwise. Queries of datasets whose fields are unknown are not
+    checked.
+    """
+    if "dataset_id" not in fetch_params:
+      raise LfError('fetch_params must include a dataset_id')
+    fields = self.fields(fetch_params["dataset_id"])
+    if not fields:
+      return
+
+    names = [name for key in FIELD_LISTS for name in fetch_params.get(key, [])]
+    names += [flt["field"] for flt in fetch_params.get("filters", [])]
+    names += [sort["field"] for sort in fetch_params.get("sort", [])
+              if isinstance(sort, dict) and "field" in sort]
+    unknown = sorted(set(names) - fields.keys())
+    if unknown:
+      msg = f'Unknown fields for {fetch_params["dataset_id"]}: '
+      raise LfError(msg + ', '.join(unknown))
@@ -0,0 +1,419 @@
+import json
+import os
+import shutil
+import sqlite3
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+import lfapi.models as models
+from lfapi.checkpoint import fingerprint
+from lfapi.dep_utils import depends_on, lazy_import
+from lfapi.errors import LfError
+from lfapi.incremental import DEFAULT_DATE_FIELD
+
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+
+SQLITE_TYPES = {
+  "INTEGER": 'INTEGER',
+  "FLOAT": 'REAL',
+  "DOUBLE": 'REAL',
+  "DECIMAL": 'REAL',
+  "BOOLEAN": 'INTEGER'
+}
+
+SQL_OPERATORS = {
+  "=": '=',
+  "!=": '!=',
+  "<": '<',
+  "<=": '<=',
+  ">": '>',
+  ">=": '>='
+}
+
+
+def _quote(name):
+  # Quote an identifier for use in SQL statements
+  return '"' + name.replace('"', '""') + '"'
+
+def _values(flt):
+  # Return the value list of a filter
+  values = flt.get("values", flt.get("value"))
+  return values if isinstance(values, list) else [values]
+
+def _filter_sql(filters):
+  # Translate fetch_params filters into a SQL condition
+  clauses = []
+  args = []
+  for flt in filters:
+    field = _quote(flt["field"])
+    operator = flt["operator"].upper()
+    values = _values(flt)
+    if operator in ("IN", "NOT IN"):
+      marks = ', '.join('?' * len(values))
+      clauses.append(f'{field} {operator} ({marks})')
+      args += values
+    elif operator in SQL_OPERATORS:
+      clauses.append(f'{field} {SQL_OPERATORS[operator]} ?')
+      args.append(values[0])
+    else:
+      raise LfError(f'Filter operator {operator} cannot be applied locally')
+
+  return ' AND '.join(clauses), args
+
+def _range_sql(date_field, start_date, end_date, filters=None):
+  # Build the SQL condition selecting a date range of filtered rows
+  where = f'{_quote(date_field)} BETWEEN ? AND ?'
+  args = [start_date, end_date]
+  if filters:
+    filter_where, filter_args = _filter_sql(filters)
+    where += f' AND {filter_where}'
+    args += filter_args
+  return where, args
+
+def _split_filters(fetch_params):
+  # Split filters into those that can be applied to stored columns and the rest
+  fields = (set(fetch_params.get("group_by", [])) |
+            set(fetch_params.get("meta_dimensions", [])))
+  local = []
+  keyed = []
+  for flt in fetch_params.get("filters", []):
+    operator = flt["operator"].upper()
+    if (flt["field"] in fields and
+        (operator in ("IN", "NOT IN") or operator in SQL_OPERATORS)):
+      local.append(flt)
+    else:
+      keyed.append(flt)
+  return local, keyed
+
+def _filters_cover(stored, requested):
+  # Whether rows loaded for the stored filters include every row matching the
+  # requested ones: each stored filter must be implied by a requested filter
+  for s_flt in stored:
+    for r_flt in requested:
+      if s_flt == r_flt:
+        break
+      if (s_flt["field"] == r_flt["field"] and
+          s_flt["operator"].upper() in ("IN", "=") and
+          r_flt["operator"].upper() in ("IN", "=") and
+          set(_values(r_flt)) <= set(_values(s_flt))):
+        break
+    else:
+      return False
+  return True
+
+def _date_range(start_date, end_date):
+  # Yield the ISO-formatted dates of an inclusive range
+  day = date.fromisoformat(start_date)
+  end = date.fromisoformat(end_date)
+  while day <= end:
+    yield day.isoformat()
+    day += timedelta(days=1)
+
+def _previous_day(day):
+  return (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+
+def _column_index(columns, field):
+  # Find the position of a field in an AnalyticResponse's columns
+  for index, col in enumerate(columns):
+    if col["id"] == field:
+      return index
+  raise LfError(f'Column {field} is not present in the response')
+
+
+class SQLiteStore:
+  """Local SQLite store for analytic query results.
+
+  Each table holds the rows of one query shape; its schema is created from the
+  columns of the first page written to it, using column ids as column names,
+  and its dimension columns are indexed. The store also records which dates
+  and filters each table covers, so that query() can answer requests locally
+  and only go to the API for the gaps.
+
+  Parameters:
+  path
+    the filename of the SQLite database; ':memory:' for an in-memory store
+  batch_size
+    the number of rows inserted per executemany() call
+  """
+
+  def __init__(self, path, batch_size=10000):
+    self.path = path
+    self.batch_size = batch_size
+    self.conn = sqlite3.connect(path)
+    with self.conn:
+      self.conn.execute('CREATE TABLE IF NOT EXISTS _lfapi_tables '
+                        '(name TEXT PRIMARY KEY, columns TEXT)')
+      self.conn.execute('CREATE TABLE IF NOT EXISTS _lfapi_coverage '
+                        '(name TEXT, filters TEXT, start_date TEXT, '
+                        'end_date TEXT)')
+
+  def _create_table(self, table, columns, index=None):
+    # Create the table from AnalyticResponse column metadata
+    col_defs = ', '.join(
+      f'{_quote(col["id"])} {SQLITE_TYPES.get(col.get("data_type"), "TEXT")}'
+      for col in columns
+    )
+    self.conn.execute(f'CREATE TABLE IF NOT EXISTS {_quote(table)} '
+                      f'({col_defs})')
+    self.conn.execute('INSERT OR IGNORE INTO _lfapi_tables VALUES (?, ?)',
+                      (table, json.dumps(columns)))
+
+    # Index the dimensions, defaulting to every DIMENSION column
+    if index is None:
+      index = [col["id"] for col in columns if col.get("class") == 'DIMENSION']
+    for pos, field in enumerate(index):
+      self.conn.execute(f'CREATE INDEX IF NOT EXISTS '
+                        f'{_quote(f"{table}_idx{pos}")} '
+                        f'ON {_quote(table)} ({_quote(field)})')
+
+  def _insert(self, table, pages, index=None):
+    # Bulk insert pages in batches; must run inside a transaction
+    sql = None
+    batch = []
+    for page in pages:
+      if sql is None:
+        self._create_table(table, page.columns, index=index)
+        names = ', '.join(_quote(col["id"]) for col in page.columns)
+        marks = ', '.join('?' * len(page.columns))
+        sql = f'INSERT INTO {_quote(table)} ({names}) VALUES ({marks})'
+
+      batch.extend(page.records)
+      if len(batch) >= self.batch_size:
+        self.conn.executemany(sql, batch)
+        batch = []
+
+    if batch:
+      self.conn.executemany(sql, batch)
+
+  def _exists(self, table):
+    return self.conn.execute(
+      "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+      (table,)
+    ).fetchone() is not None
+
+  def write(self, table, pages, index=None):
+    """Append pages of an analytic query to a table in one transaction.
+
+    Arguments:
+    table
+      the name of the table to write to
+    pages
+      an iterable of models.AnalyticResponse objects
+    index
+      the column ids to index; defaults to the DIMENSION columns
+    """
+    with self.conn:
+      self._insert(table, pages, index=index)
+
+  def replace_range(self, table, pages, date_field, start_date, end_date,
+                    filters=None, index=None):
+    """Replace the rows of a date range with pages of an analytic query.
+
+    Arguments:
+    table
+      the name of the table to write to
+    pages
+      an iterable of models.AnalyticResponse objects
+    date_field
+      the id of the date column
+    start_date, end_date
+      the ISO-formatted bounds of the replaced range, inclusive
+    filters
+      fetch_params-style filters limiting the replaced rows (optional)
+    index
+      the column ids to index; defaults to the DIMENSION columns
+    """
+    where, args = _range_sql(date_field, start_date, end_date, filters)
+    with self.conn:
+      if self._exists(table):
+        self.conn.execute(f'DELETE FROM {_quote(table)} WHERE {where}', args)
+      self._insert(table, pages, index=index)
+
+  def _covered_dates(self, table, filters):
+    # Collect the dates for which the table holds every row matching filters
+    dates = set()
+    for cov_filters, start, end in self.conn.execute(
+      'SELECT filters, start_date, end_date FROM _lfapi_coverage '
+      'WHERE name = ?', (table,)
+    ):
+      if _filters_cover(json.loads(cov_filters), filters):
+        dates.update(_date_range(start, end))
+    return dates
+
+  def gaps(self, fetch_params, date_field=DEFAULT_DATE_FIELD):
+    """Return the (start_date, end_date) ranges of a query not held locally."""
+    table = self._table_for(fetch_params, date_field)
+    covered = set()
+    if self._exists(table):
+      covered = self._covered_dates(table, _split_filters(fetch_params)[0])
+
+    gaps = []
+    for day in _date_range(fetch_params["start_date"],
+                           fetch_params["end_date"]):
+      if day in covered:
+        continue
+      if gaps and gaps[-1][1] == _previous_day(day):
+        gaps[-1][1] = day
+      else:
+        gaps.append([day, day])
+    return [tuple(gap) for gap in gaps]
+
+  def _table_for(self, fetch_params, date_field):
+    # Tables are keyed on the query shape plus any filters that cannot be
+    # applied locally; the remaining filters are applied with SQL
+    if date_field not in fetch_params.get("group_by", []):
+      raise LfError(f'Local queries require {date_field} in group_by')
+
+    shape = {key: fetch_params.get(key) for key in
+             ("dataset_id", "group_by", "metrics", "meta_dimensions")}
+    shape["filters"] = _split_filters(fetch_params)[1]
+    return f'{fetch_params["dataset_id"]}_{fingerprint(shape)[:12]}'
+
+  def query(self, client, fetch_params, date_field=DEFAULT_DATE_FIELD,
+            **query_kwargs):
+    """Answer an analytic query from the store, fetching only the gaps.
+
+    Date ranges not yet covered for the query's filters are fetched with
+    Client.sync_analytic_query() and stored; the full answer is then read from
+    the store. Filters on group_by or meta_dimensions fields using the IN,
+    NOT IN, =, !=, <, <=, > or >= operators are applied locally, so rows loaded
+    for broader filters can answer narrower ones; any other filters are part of
+    the table key.
+
+    Arguments:
+    client
+      the lfapi.Client used to fetch the gaps
+    fetch_params
+      the query parameters; must group by date_field
+    date_field
+      the id of the date dimension
+    **query_kwargs
+      accepts any keyword arguments supported by Client.sync_analytic_query()
+
+    Returns:
+      models.AnalyticResponse holding every matching row
+    """
+    table = self._table_for(fetch_params, date_field)
+    filters = _split_filters(fetch_params)[0]
+    group_by = fetch_params["group_by"]
+
+    # Fetch and record each gap
+    for start, end in self.gaps(fetch_params, date_field=date_field):
+      params = {**fetch_params, "start_date": start, "end_date": end}
+      pages = client.sync_analytic_query(params, **query_kwargs)
+      self.replace_range(table, pages, date_field, start, end,
+                         filters=filters, index=group_by)
+      with self.conn:
+        self.conn.execute('INSERT INTO _lfapi_coverage VALUES (?, ?, ?, ?)',
+                          (table, json.dumps(filters), start, end))
+
+    # Read the answer with the filters applied locally
+    row = self.conn.execute('SELECT columns FROM _lfapi_tables WHERE name = ?',
+                            (table,)).fetchone()
+    if row is None:  # every gap came back empty
+      return models.AnalyticResponse({"columns": [], "records": []})
+
+    columns = json.loads(row[0])
+    where, args = _range_sql(date_field, fetch_params["start_date"],
+                             fetch_params["end_date"], filters)
+    names = ', '.join(_quote(col["id"]) for col in columns)
+    records = self.conn.execute(
+      f'SELECT {names} FROM {_quote(table)} WHERE {where}', args
+    ).fetchall()
+    return models.AnalyticResponse({
+      "columns": columns,
+      "records": [list(rec) for rec in records]
+    })
+
+  def close(self):
+    self.conn.close()
+
+
+class ParquetStore:
+  """Local date-partitioned Parquet dataset for analytic query results.
+
+  Rows are written to <root>/<table>/<date_field>=<date>/part-0.parquet. Not
+  implemented if PyArrow is not installed.
+
+  Parameters:
+  root
+    the root directory of the datasets
+  """
+
+  def __init__(self, root):
+    self.root = root
+
+  @depends_on('pyarrow.parquet')
+  def replace_range(self, table, pages, date_field, start_date, end_date):
+    """Replace the date partitions of a range with pages of an analytic query.
+    The new partitions are written first and then renamed into place, so a
+    failure leaves the old partitions of the range in place.
+
+    Arguments:
+    table
+      the name of the dataset to write to
+    pages
+      an iterable of models.AnalyticResponse objects
+    date_field
+      the id of the date column
+    start_date, end_date
+      the ISO-formatted bounds of the replaced range, inclusive
+    """
+    # Convert all rows with one schema, so partitions agree on column types
+    # even where a partition's values are all null
+    columns = None
+    records = []
+    for page in pages:
+      if columns is None:
+        columns = page.columns
+      records.extend(page.records)
+    partitions = defaultdict(list)
+    if columns is not None:
+      date_index = _column_index(columns, date_field)
+      for row_index, row in enumerate(records):
+        partitions[row[date_index]].append(row_index)
+      table_data = models.AnalyticResponse({"columns": columns,
+                                            "records": records}).to_pyarrow()
+      table_data = table_data.drop_columns([date_field])
+
+    # Write the new partitions next to the dataset, where readers skip them
+    table_dir = os.path.join(self.root, table)
+    os.makedirs(table_dir, exist_ok=True)
+    staging = os.path.join(table_dir, f'.replace-{uuid.uuid4().hex}')
+    new_dir = os.path.join(staging, 'new')
+    old_dir = os.path.join(staging, 'old')
+    prefix = f'{date_field}='
+    try:
+      os.makedirs(new_dir)
+      for partition_date, row_indices in partitions.items():
+        part_dir = os.path.join(new_dir, f'{prefix}{partition_date}')
+        os.mkdir(part_dir)
+        pq.write_table(table_data.take(row_indices),
+                       os.path.join(part_dir, 'part-0.parquet'))
+
+      # Swap the written partitions in, putting the old ones back on failure
+      os.makedirs(old_dir)
+      stale = [name for name in os.listdir(table_dir) if
+               name.startswith(prefix) and
+               start_date <= name[len(prefix):] <= end_date]
+      moved, installed = [], []
+      try:
+        for name in stale:
+          os.replace(os.path.join(table_dir, name),
+                     os.path.join(old_dir, name))
+          moved.append(name)
+        for name in os.listdir(new_dir):
+          os.replace(os.path.join(new_dir, name),
+                     os.path.join(table_dir, name))
+          installed.append(name)
+      except BaseException:
+        for name in installed:
+          shutil.rmtree(os.path.join(table_dir, name))
+        for name in moved:
+          os.replace(os.path.join(old_dir, name),
+                     os.path.join(table_dir, name))
+        raise
+    finally:
+      shutil.rmtree(staging, ignore_errors=True)
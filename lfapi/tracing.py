@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+from lfapi._version import __version__
+from lfapi.dep_utils import safe_import
+
+_tracer = None
+_resolved = False
+
+
+class NoopSpan:
+  """Stand-in for an OpenTelemetry span when tracing is unavailable."""
+
+  def is_recording(self):
+    return False
+
+  def set_attribute(self, key, value):
+    pass
+
+  def set_attributes(self, attributes):
+    pass
+
+
+_NOOP_SPAN = NoopSpan()
+
+
+def get_tracer():
+  """Return the lfapi OpenTelemetry tracer, or None if OpenTelemetry is not
+  installed. The import is deferred to the first call.
+  """
+  global _tracer, _resolved
+  if not _resolved:
+    trace = safe_import('opentelemetry.trace')
+    _tracer = None if trace is None else trace.get_tracer('lfapi', __version__)
+    _resolved = True
+  return _tracer
+
+@contextmanager
+def span(name, **attributes):
+  """Open an OpenTelemetry span as the current span; a no-op when OpenTelemetry
+  is not installed.
+
+  Arguments:
+  name
+    the span name
+  **attributes
+    initial span attributes; None values are dropped
+  """
+  tracer = get_tracer()
+  if tracer is None:
+    yield _NOOP_SPAN
+    return
+
+  attributes = {key: value for key, value in attributes.items()
+                if value is not None}
+  with tracer.start_as_current_span(name, attributes=attributes) as current:
+    yield current
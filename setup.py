@@ -16,6 +16,7 @@ setup(
     url="https://github.com/sstm2/lf-python-sdk.git",
     license="MIT",
     packages=find_packages(include=["lfapi"]),
+    entry_points={"console_scripts": ["lfapi = lfapi.cli:main"]},
     description="The Python library for the ListenFirst API",
     long_description=long_description,
     long_description_content_type="text/markdown",
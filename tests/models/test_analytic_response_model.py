@@ -96,3 +96,135 @@ class TestAnalyticResponse:
     })
     with pytest.raises(LfError):
       ar1 + ar2
+
+  def test_to_numpy(self):
+    np = pytest.importorskip('numpy')
+    ar = AnalyticResponse({
+      "columns": resp_body["columns"] + [
+        {"id": "lfm.fact.date_str", "name": "Date", "class": "DIMENSION",
+         "data_type": "DATE"}
+      ],
+      "records": [[1234, "My Brand", 1, "2022-07-10"],
+                  [1235, None, None, None]]
+    }, label_mode="name")
+    arrays = ar.to_numpy()
+
+    assert list(arrays) == ["Brand View ID", "Brand Name", "Comments", "Date"]
+    assert arrays["Brand View ID"].dtype == np.int64
+    assert arrays["Brand Name"].dtype == object
+    assert arrays["Comments"].dtype == np.float64
+    assert np.isnan(arrays["Comments"][1])
+    assert arrays["Date"].dtype == np.dtype('datetime64[D]')
+    assert arrays["Date"][0] == np.datetime64('2022-07-10')
+    assert np.isnat(arrays["Date"][1])
+
+  def test_to_numpy_handles_empty_response(self):
+    pytest.importorskip('numpy')
+    ar = AnalyticResponse({"columns": resp_body["columns"], "records": []})
+    assert all(len(arr) == 0 for arr in ar.to_numpy().values())
+
+  def test_string_dimensions_are_dictionary_encoded(self):
+    body = {
+      "columns": resp_body["columns"],
+      "records": [(1, "My" + " Brand", 1), (2, None, 2),
+                  (3, "My Brand", 3), (4, "Other", 4)]
+    }
+    ar = AnalyticResponse(body, dictionary_encode=True)
+    assert ar.records[0][1] is ar.records[2][1]
+    assert body["records"][0] == (1, "My Brand", 1)  # tuples left unchanged
+    uniques, codes = ar._encoded()[1]
+    assert uniques == ["My Brand", "Other"]
+    assert list(codes) == [0, -1, 0, 1]
+    assert ar._encoded()[1][1] is codes  # computed once at parse time
+
+    ar.records = ar.records[:2]  # replaced records are encoded again
+    uniques, codes = ar._encoded()[1]
+    assert uniques == ["My Brand"] and list(codes) == [0, -1]
+
+    ar = AnalyticResponse(body)
+    assert ar.records is body["records"] and ar._encoded() == {}
+
+  def test_to_pandas_uses_categoricals(self):
+    pytest.importorskip('pandas')
+    df = AnalyticResponse({
+      "columns": resp_body["columns"],
+      "records": [[1, "My Brand", 1], [2, None, 2], [3, "My Brand", 3]]
+    }, dictionary_encode=True).to_pandas()
+    assert list(df.columns) == [col["id"] for col in resp_body["columns"]]
+    assert str(df["lfm.brand.name"].dtype) == 'category'
+    assert df["lfm.brand.name"].isna().tolist() == [False, True, False]
+    assert df["lfm.brand_view.id"].tolist() == [1, 2, 3]
+
+  def test_to_pyarrow_uses_dictionary_arrays(self):
+    pa = pytest.importorskip('pyarrow')
+    table = AnalyticResponse({
+      "columns": resp_body["columns"],
+      "records": [[1, "My Brand", 1], [2, None, 2], [3, "My Brand", 3]]
+    }, dictionary_encode=True).to_pyarrow()
+    assert pa.types.is_dictionary(table["lfm.brand.name"].type)
+    assert table["lfm.brand.name"].to_pylist() == ["My Brand", None,
+                                                   "My Brand"]
+    assert table.num_rows == 3
+
+  def test_to_pyarrow_converts_selected_columns(self):
+    pytest.importorskip('pyarrow')
+    ar = AnalyticResponse(resp_body, label_mode="name")
+    table = ar.to_pyarrow(columns=["Comments", "lfm.brand.name"])
+    assert table.column_names == ["Comments", "Brand Name"]
+    assert table.to_pylist() == [{"Comments": 1, "Brand Name": "My Brand"}]
+    rebuilt = AnalyticResponse.from_pyarrow(ar.to_pyarrow(keep_metadata=True))
+    assert rebuilt.to_pyarrow(columns=["Comments"]).column_names == [
+      "Comments"
+    ]
+    with pytest.raises(LfError):
+      ar.to_pyarrow(keep_metadata=True, columns=["Comments"])
+
+  def test_to_polars_uses_categoricals(self):
+    pl = pytest.importorskip('polars')
+    df = AnalyticResponse({
+      "columns": resp_body["columns"],
+      "records": [[1, "My Brand", 1], [2, None, 2], [3, "My Brand", 3]]
+    }, dictionary_encode=True).to_polars()
+    assert df.schema["lfm.brand.name"] == pl.Categorical
+    assert df["lfm.brand.name"].to_list() == ["My Brand", None, "My Brand"]
+    assert df["lfm.brand_view.id"].to_list() == [1, 2, 3]
+
+  def test_create_projects_columns(self):
+    columns = ["lfm.post_engagement_score.comments_score_v5", "Brand View ID"]
+    ar = AnalyticResponse(resp_body, label_mode="name", columns=columns)
+    assert ar._labels == ["Comments", "Brand View ID"]
+    assert ar.records == [[1, 1234]]
+    assert ar.as_dict()["columns"] == ar.columns
+
+  def test_create_filters_rows(self):
+    body = {
+      "columns": resp_body["columns"],
+      "records": [[1, "My Brand", 0], [2, "Other", 3], [3, "My Brand", 5]]
+    }
+    ar = AnalyticResponse(body, columns=["lfm.brand_view.id"], where={
+      "lfm.brand.name": "My Brand",
+      "lfm.post_engagement_score.comments_score_v5": lambda value: value > 0
+    })
+    assert ar.records == [[3]]
+    assert len(body["records"]) == 3
+
+  def test_create_rejects_unknown_columns(self):
+    with pytest.raises(LfError):
+      AnalyticResponse(resp_body, columns=["lfm.unknown"])
+    with pytest.raises(LfError):
+      AnalyticResponse(resp_body, where={"lfm.unknown": 1})
+
+  def test_ipc_round_trip_keeps_rows_as_arrow(self):
+    pa = pytest.importorskip('pyarrow')
+    body = {**resp_body, "is_last_page": True}
+    ar = AnalyticResponse.from_ipc(
+      AnalyticResponse(body, dictionary_encode=True).to_ipc()
+    )
+    assert "records" not in vars(ar)
+    assert len(ar) == 1 and ar.is_last_page
+    assert pa.types.is_dictionary(ar.to_pyarrow()["lfm.brand.name"].type)
+
+    assert ar.records == resp_body["records"]
+    assert ar.as_dict() == body
+    ar.records.append([5678, "Other Brand", 2])
+    assert ar.to_pyarrow().num_rows == 2
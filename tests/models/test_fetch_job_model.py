@@ -1,11 +1,16 @@
 import pytest
 from base_suite import BaseSuite
-from utils import assert_is_model
+from utils import FakeTransport, assert_is_model
 
 from lfapi.errors import LfError
-from lfapi.models import AnalyticResponse, NoClientError
+from lfapi.models import AnalyticResponse, FetchJob, NoClientError
 
 VERBOSE_ATTRS = ["query_cost", "fetch_params", "max_rows"]
+PAGE_COLUMNS = [
+  {"id": 'brand', "name": 'Brand', "class": 'DIMENSION',
+   "data_type": 'STRING'},
+  {"id": 'score', "name": 'Score', "class": 'METRIC', "data_type": 'INTEGER'}
+]
 
 def assert_is_verbose(fetch_job):
   for attr in VERBOSE_ATTRS:
@@ -47,3 +52,27 @@ class TestFetchJobModel(BaseSuite):
     instance.poll()
     for page in instance.download_pages():
       assert_is_model(page, AnalyticResponse)
+
+  def test_download_pages_in_processes(self, monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+    page_urls = [f'https://pages.test/{i}' for i in range(5)]
+    FakeTransport({
+      f"GET /{i}": {"columns": PAGE_COLUMNS,
+                    "records": [[f'brand {i}', i], [None, 0]]}
+      for i in range(5)
+    }).install(monkeypatch)
+    job = FetchJob({"record": {"id": 1, "state": 'completed', "created_at": '',
+                               "updated_at": '', "client_context": None,
+                               "schedule_config_id": None,
+                               "page_urls": page_urls}})
+
+    pages = list(job.download_pages(processes=2, where={"score": 0}))
+    assert [len(page) for page in pages] == [2, 1, 1, 1, 1]
+    brands = pages[0].to_pyarrow().column('brand').to_pylist()
+    assert brands == ['brand 0', None]
+    assert pages[3].records == [[None, 0]]
+    assert pages[3].as_dict()["columns"] == PAGE_COLUMNS
+    assert not pa.types.is_dictionary(pages[0].to_pyarrow()['brand'].type)
+
+    pages = list(job.download_pages(processes=2, dictionary_encode=True))
+    assert pa.types.is_dictionary(pages[0].to_pyarrow()['brand'].type)
@@ -0,0 +1,17 @@
+import pytest
+
+from lfapi.models import FieldValues
+
+
+class TestFieldValues:
+  def test_values(self):
+    fv = FieldValues({"records": ['Brand A', 'Brand B'],
+                      "has_more_pages": True})
+    assert list(fv) == ['Brand A', 'Brand B']
+    assert len(fv) == 2
+    assert not fv.is_last_page()
+    assert FieldValues({"records": []}).is_last_page()
+
+  def test_records_are_required(self):
+    with pytest.raises(AssertionError):
+      FieldValues({"values": []})
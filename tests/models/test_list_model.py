@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from lfapi.models import (CompactRecord, FetchJob, ListModel, Model,
+                          compact_class)
+
+JOBS = [{"id": i, "state": 'completed', "created_at": '2021-01-01',
+         "updated_at": '2021-01-02', "client_context": None,
+         "schedule_config_id": None, "max_rows": 10 * i}
+        for i in range(3)]
+
+
+class TestListModel:
+  def test_records_are_models(self):
+    lm = ListModel({"records": JOBS}, FetchJob)
+    assert all(isinstance(rec, FetchJob) for rec in lm)
+
+  def test_compact_records_use_slots(self):
+    lm = ListModel({"records": JOBS, "has_more_pages": False}, FetchJob,
+                   compact=True)
+    rec = lm.records[1]
+    assert isinstance(rec, CompactRecord)
+    assert not hasattr(rec, "__dict__")
+    assert rec.id == 1 and rec.max_rows == 10
+    with pytest.raises(AttributeError):
+      rec.page_urls
+    assert "records" not in lm.body
+
+  def test_compact_records_keep_data(self):
+    lm = ListModel({"records": JOBS, "has_more_pages": False}, FetchJob,
+                   compact=True)
+    assert lm.as_dict_list() == JOBS
+    assert json.loads(lm.to_json()) == {"records": JOBS,
+                                        "has_more_pages": False}
+    assert lm._labels == sorted(JOBS[0].keys())
+    assert len(lm + lm) == 6
+
+    model = lm.records[0].to_model()
+    assert isinstance(model, FetchJob) and model.as_dict() == JOBS[0]
+
+  def test_compact_class_is_shared_per_model(self):
+    assert compact_class(FetchJob) is compact_class(FetchJob)
+    assert compact_class(FetchJob).__slots__ == tuple(FetchJob._required)
+    assert not issubclass(compact_class(FetchJob), Model)
+
+  def test_compact_records_require_attributes(self):
+    with pytest.raises(AssertionError):
+      ListModel({"records": [{"id": 1}]}, FetchJob, compact=True)
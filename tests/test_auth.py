@@ -1,8 +1,11 @@
 import json
 import os
+from datetime import datetime
 
 import pytest
-from lfapi.auth import Auth
+from utils import FakeTransport
+
+from lfapi.auth import Auth, FileTokenStore
 from lfapi.errors import AuthError
 
 
@@ -40,3 +43,28 @@ class TestAuth:
     ]:
       with pytest.raises(AuthError):
         auth.access_token
+
+
+class TestFileTokenStore:
+  def test_processes_share_one_token(self, monkeypatch, tmp_path):
+    transport = FakeTransport({}).install(monkeypatch)
+    path = (tmp_path / 'token.json').as_posix()
+    first = Auth('id', 'secret', token_store=FileTokenStore(path))
+    second = Auth('id', 'secret', token_store=FileTokenStore(path))
+    assert first.access_token == second.access_token == 'token'
+    assert transport.calls.count('POST /oauth2/token') == 1
+
+  def test_expired_tokens_are_refreshed(self, monkeypatch, tmp_path):
+    transport = FakeTransport({}).install(monkeypatch)
+    store = FileTokenStore((tmp_path / 'token.json').as_posix())
+    store.save('old', datetime.utcnow())
+    auth = Auth('id', 'secret', token_store=store)
+    assert auth.access_token == 'token'
+    assert store.load()[0] == 'token'
+    assert transport.calls.count('POST /oauth2/token') == 1
+
+  @pytest.mark.skipif(os.name != 'posix', reason='POSIX permissions')
+  def test_token_file_is_private(self, tmp_path):
+    store = FileTokenStore((tmp_path / 'token.json').as_posix())
+    store.save('token', datetime.utcnow())
+    assert os.stat(store.path).st_mode & 0o777 == 0o600
@@ -0,0 +1,120 @@
+import os
+import time
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.cache import ResultCache
+from lfapi.client import Client
+from lfapi.errors import LfError
+from lfapi.models import AnalyticResponse
+
+pa = pytest.importorskip('pyarrow')
+
+COLUMNS = [
+  {"id": 'brand', "name": 'Brand', "class": 'DIMENSION',
+   "data_type": 'STRING'},
+  {"id": 'score', "name": 'Score', "class": 'METRIC', "data_type": 'INTEGER'}
+]
+JOB = {"id": 7, "state": 'completed', "created_at": '', "updated_at": '',
+       "client_context": None, "schedule_config_id": None,
+       "page_urls": ['https://pages.test/1', 'https://pages.test/2']}
+
+
+def make_pages(count=2):
+  return [AnalyticResponse({"columns": COLUMNS,
+                            "records": [[f'brand {i}', i], [None, 0]]},
+                           dictionary_encode=True)
+          for i in range(count)]
+
+def set_last_used(cache, key, seconds):
+  os.utime(os.path.join(cache.root, key), (seconds, seconds))
+
+
+class TestResultCache:
+  def test_load_returns_stored_pages(self, tmp_path):
+    cache = ResultCache(tmp_path.as_posix())
+    key = cache.key({"dataset_id": 'x'}, label_mode='id')
+    assert key not in cache
+
+    pages = make_pages()
+    assert list(cache.store(key, pages)) == pages
+    assert key in cache
+
+    loaded = list(cache.load(key))
+    assert [page.records for page in loaded] == [page.records
+                                                 for page in pages]
+    assert loaded[0].columns == COLUMNS
+    assert pa.types.is_dictionary(loaded[0].to_pyarrow()["brand"].type)
+
+  def test_partial_store_is_discarded(self, tmp_path):
+    cache = ResultCache(tmp_path.as_posix())
+    stored = cache.store('abc', make_pages())
+    next(stored)
+    stored.close()
+    assert 'abc' not in cache
+    assert os.listdir(tmp_path) == []
+
+  def test_least_recently_used_entries_are_evicted(self, tmp_path):
+    cache = ResultCache(tmp_path.as_posix())
+    for key in ['a', 'b']:
+      list(cache.store(key, make_pages()))
+    set_last_used(cache, 'a', 1000)
+    set_last_used(cache, 'b', 2000)
+    list(cache.load('a'))  # 'a' is now the most recently used
+
+    cache.max_bytes = cache.size()
+    list(cache.store('c', make_pages()))
+    assert 'a' in cache and 'b' not in cache and 'c' in cache
+    assert cache.size() <= cache.max_bytes
+
+  def test_expired_entries_are_dropped(self, tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path.as_posix(), max_age=60)
+    list(cache.store('a', make_pages()))
+    assert 'a' in cache
+    now = time.time()
+    monkeypatch.setattr('time.time', lambda: now + 61)
+    assert 'a' not in cache
+    assert os.listdir(tmp_path) == []
+
+  def test_invalidate_drops_every_entry_of_a_query(self, tmp_path):
+    cache = ResultCache(tmp_path.as_posix())
+    keys = [cache.key({"dataset_id": 'x'}, label_mode=mode)
+            for mode in ['id', 'name']]
+    other = cache.key({"dataset_id": 'y'}, label_mode='id')
+    assert keys[0] != keys[1]
+    for key in [*keys, other]:
+      list(cache.store(key, make_pages()))
+
+    cache.invalidate({"dataset_id": 'x'})
+    assert [key in cache for key in [*keys, other]] == [False, False, True]
+
+  def test_key_rejects_filter_functions(self):
+    assert ResultCache.key({}, where={"score": 0})
+    with pytest.raises(LfError):
+      ResultCache.key({}, where={"score": lambda value: value > 0})
+
+  def test_async_analytic_query_reads_from_cache(self, tmp_path, monkeypatch):
+    page = {"columns": COLUMNS, "records": [['a', 1]]}
+    transport = FakeTransport({
+      "POST /analytics/fetch_job": {"record": JOB},
+      "GET /analytics/fetch_job/7": {"record": JOB},
+      "GET /1": page,
+      "GET /2": page
+    }).install(monkeypatch)
+    client = Client('key', Auth('id', 'secret'))
+    cache = ResultCache(tmp_path.as_posix())
+
+    first = list(client.async_analytic_query({"dataset_id": 'x'}, cache=cache))
+    calls = len(transport.calls)
+    second = list(client.async_analytic_query({"dataset_id": 'x'},
+                                              cache=cache))
+    assert len(transport.calls) == calls
+    assert [ar.records for ar in second] == [ar.records for ar in first]
+    assert second[0].client is client
+
+    named = list(client.async_analytic_query({"dataset_id": 'x'}, cache=cache,
+                                             label_mode='name'))
+    assert len(transport.calls) > calls
+    assert named[0].label_mode == 'name'
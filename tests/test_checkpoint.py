@@ -0,0 +1,128 @@
+import json
+import threading
+
+import pytest
+
+from lfapi.auth import Auth
+from lfapi.checkpoint import Checkpoint, dump_atomic, fingerprint
+from lfapi.client import Client
+from lfapi.models import AnalyticResponse
+
+
+def fake_page(page, last_page):
+  return AnalyticResponse({
+    "columns": [{"id": 'page', "name": 'Page'}],
+    "records": [[page]],
+    "is_last_page": page == last_page
+  })
+
+@pytest.fixture
+def offline_client(monkeypatch):
+  client = Client('key', Auth('id', 'secret'))
+  requested = []
+
+  def fetch(json, **kwargs):
+    requested.append(json["page"])
+    return fake_page(json["page"], 5)
+
+  monkeypatch.setattr(client, "fetch", fetch)
+  client.requested = requested
+  return client
+
+
+class TestCheckpoint:
+  def test_fingerprint_ignores_key_order(self):
+    params = {"a": 1, "b": [1, 2]}
+    assert fingerprint(params) == fingerprint(dict(reversed(params.items())))
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+  def test_fingerprint_hashes_functions_by_code(self):
+    def where(positive):
+      return {"page": lambda value: value > 0 if positive else value < 0}
+
+    assert fingerprint(where(True)) == fingerprint(where(True))
+    assert fingerprint({"page": lambda value: value > 0}) != fingerprint(
+      {"page": lambda value: value > 1}
+    )
+
+  def test_fingerprint_hashes_captured_values(self):
+    def above(limit):
+      return lambda value: value > limit
+
+    def at_least(limit):
+      def test(value, limit=limit):
+        return value >= limit
+      return test
+
+    assert fingerprint(above(1)) == fingerprint(above(1))
+    assert fingerprint(above(1)) != fingerprint(above(2))
+    assert fingerprint(at_least(1)) != fingerprint(at_least(2))
+
+  def test_concurrent_dumps_replace_the_whole_file(self, tmp_path):
+    path = (tmp_path / "state.json").as_posix()
+
+    def dump(n):
+      for _ in range(20):
+        dump_atomic({"writer": n, "data": [n] * 1000}, path)
+
+    threads = [threading.Thread(target=dump, args=(n,)) for n in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    with open(path) as f:
+      state = json.load(f)
+    assert state["data"] == [state["writer"]] * 1000
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
+
+  def test_start_resumes_matching_fingerprint(self, tmp_path):
+    path = (tmp_path / "ckpt.json").as_posix()
+    checkpoint = Checkpoint(path)
+    assert checkpoint.start('abc') == 0
+    checkpoint.commit(3)
+
+    assert Checkpoint(path).start('abc') == 3
+    assert Checkpoint(path).start('other') == 0
+
+  def test_sink_is_truncated_to_committed_offset(self, tmp_path):
+    path = (tmp_path / "ckpt.json").as_posix()
+    out = tmp_path / "out.txt"
+    with open(out, 'a') as f:
+      checkpoint = Checkpoint(path, sink=f)
+      checkpoint.start('abc')
+      f.write('page 1\n')
+      checkpoint.commit(1)
+      f.write('partial')
+
+    with open(out, 'a') as f:
+      Checkpoint(path, sink=f).start('abc')
+    assert out.read_text() == 'page 1\n'
+
+  def test_sync_analytic_query_resumes(self, offline_client, tmp_path):
+    path = (tmp_path / "ckpt.json").as_posix()
+    pages = offline_client.sync_analytic_query({}, checkpoint=Checkpoint(path))
+    for page in pages:
+      if page.records[0][0] == 3:
+        break  # simulate a crash while handling page 3
+
+    offline_client.requested.clear()
+    pages = offline_client.sync_analytic_query({}, checkpoint=Checkpoint(path))
+    assert [page.records[0][0] for page in pages] == [3, 4, 5]
+    assert offline_client.requested == [3, 4, 5]
+
+    # A completed pull clears the checkpoint
+    assert Checkpoint(path).start(fingerprint({})) == 0
+
+  def test_sync_analytic_query_restarts_for_other_columns(self, offline_client,
+                                                          tmp_path):
+    path = (tmp_path / "ckpt.json").as_posix()
+    pages = offline_client.sync_analytic_query({}, checkpoint=Checkpoint(path))
+    for page in pages:
+      if page.records[0][0] == 3:
+        break
+
+    offline_client.requested.clear()
+    pages = offline_client.sync_analytic_query({}, checkpoint=Checkpoint(path),
+                                               where={"page": 4})
+    assert len(list(pages)) == 5
+    assert offline_client.requested == [1, 2, 3, 4, 5]
@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+from utils import FakeTransport
+
+from lfapi import cli
+
+COLUMNS = [{"id": 'brand', "name": 'Brand'}, {"id": 'score', "name": 'Score'}]
+JOB = {"id": 7, "state": 'completed', "created_at": '', "updated_at": '',
+       "client_context": None, "schedule_config_id": None,
+       "page_urls": ['https://pages.test/1', 'https://pages.test/2']}
+
+
+def fetch(json=None, **kwargs):
+  if json["dataset_id"] == 'missing':
+    return {"error": 'no such dataset'}, 404
+  page = json["page"]
+  return {"columns": COLUMNS, "records": [[f'brand {page}', page]],
+          "total_records": 2, "page": page, "is_last_page": page == 2}
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+  FakeTransport({
+    "POST /analytics/fetch": fetch,
+    "POST /analytics/fetch_job": {"record": JOB},
+    "GET /analytics/fetch_job/7": {"record": JOB},
+    "GET /1": {"columns": COLUMNS, "records": [['a', 1]]},
+    "GET /2": {"columns": COLUMNS, "records": [['b', 2]]}
+  }).install(monkeypatch)
+  profile = {"api_key": 'key', "client_id": 'id', "client_secret": 'secret'}
+  (tmp_path / 'profile.json').write_text(json.dumps(profile))
+  for name in ['brands', 'missing']:
+    query = {"fetch_params": {"dataset_id": name}}
+    (tmp_path / f'{name}.json').write_text(json.dumps(query))
+  query = {"fetch_params": {"dataset_id": 'brands'}, "max_rows": 10}
+  (tmp_path / 'limited.json').write_text(json.dumps(query))
+  monkeypatch.chdir(tmp_path)
+  return tmp_path
+
+def run(*args):
+  return cli.main(['-q', '-p', 'profile.json', '-o', 'out', *args])
+
+
+class TestCli:
+  def test_sync_export_to_csv(self, workdir, capsys):
+    assert run('-m', 'sync', 'brands.json') == 0
+    assert (workdir / 'out/brands.csv').read_text().splitlines() == [
+      'brand,score', 'brand 1,1', 'brand 2,2'
+    ]
+    assert capsys.readouterr().out.startswith('brands.json: 2 rows')
+
+  def test_async_export_to_jsonl_with_checkpoint(self, workdir):
+    assert run('-m', 'async', '-f', 'jsonl', '--checkpoint-dir', 'ckpt',
+               'brands.json') == 0
+    lines = (workdir / 'out/brands.jsonl').read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [
+      {"brand": 'a', "score": 1}, {"brand": 'b', "score": 2}
+    ]
+    assert not (workdir / 'ckpt/brands.jsonl.ckpt').exists()
+
+  def test_export_to_parquet(self, workdir):
+    pq = pytest.importorskip('pyarrow.parquet')
+    assert run('-f', 'parquet', 'brands.json') == 0
+    table = pq.read_table(workdir / 'out/brands.parquet')
+    assert table.column('score').to_pylist() == [1, 2]
+
+  def test_failed_queries_are_summarized(self, workdir, capsys):
+    assert run('-m', 'sync', 'brands.json', 'missing.json') == 1
+    out = capsys.readouterr().out.splitlines()
+    assert 'FAILED' not in out[0]
+    assert out[1].startswith('missing.json: 0 rows') and 'FAILED' in out[1]
+
+  def test_unreadable_queries_are_summarized(self, workdir, capsys):
+    (workdir / 'truncated.json').write_text('{"fetch_params": {"data')
+    assert run('-m', 'sync', 'truncated.json', 'absent.json',
+               'brands.json') == 1
+    out = capsys.readouterr().out.splitlines()
+    assert 'FAILED' in out[0] and 'FAILED' in out[1]
+    assert out[2].startswith('brands.json: 2 rows')
+
+  def test_fetch_job_options(self, workdir, capsys):
+    assert run('limited.json') == 0
+    assert (workdir / 'out/limited.csv').read_text().splitlines() == [
+      'brand,score', 'a,1', 'b,2'
+    ]
+    assert run('-m', 'sync', 'limited.json') == 1
+    assert 'max_rows cannot be used' in capsys.readouterr().out
+
+  def test_progress_line(self):
+    stream = io.StringIO()
+    progress = cli.Progress(2, stream=stream, interval=0)
+    progress.update(rows=10, num_bytes=2**20)
+    progress.update(done=True)
+    assert '10 rows' in stream.getvalue()
+    assert stream.getvalue().endswith('1 queries pending')
+
+  def test_checkpoints_require_explicit_mode(self, workdir):
+    with pytest.raises(SystemExit):
+      run('--checkpoint-dir', 'ckpt', 'brands.json')
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+from utils import FakeTransport, make_response
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.concurrency import AdaptiveLimiter
+from lfapi.errors import QuotaSurpassed
+from lfapi.models import FetchJob
+
+PAGE_COLUMNS = [{"id": 'lfm.brand.name', "name": 'Brand'}]
+
+
+def saturate(limiter, seconds=0.01):
+  # Complete a full round of requests with every slot in use
+  slots = int(limiter.limit)
+  for _ in range(slots):
+    limiter.acquire()
+  for _ in range(slots):
+    limiter.release(seconds)
+
+
+def completed_job(num_pages, client):
+  page_urls = [f'https://pages.test/{i}' for i in range(num_pages)]
+  return FetchJob({"record": {"id": 1, "state": 'completed', "created_at": '',
+                              "updated_at": '', "client_context": None,
+                              "schedule_config_id": None,
+                              "page_urls": page_urls}}, client=client)
+
+
+class TestAdaptiveLimiter:
+  def test_limit_grows_while_saturated(self):
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    saturate(limiter)
+    assert limiter.limit == 2.5
+    for _ in range(10):
+      saturate(limiter)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+  def test_limit_holds_while_idle(self):
+    limiter = AdaptiveLimiter(initial=4)
+    for _ in range(10):
+      limiter.call(lambda: None)
+    assert limiter.limit == 4
+
+  def test_quota_errors_cut_limit_once_per_round(self):
+    limiter = AdaptiveLimiter(initial=8)
+    changes = []
+    limiter.hooks.register('on_limit_change',
+                           lambda **kwargs: changes.append(kwargs))
+
+    def send():
+      raise QuotaSurpassed(make_response('GET', 'https://api.test', {},
+                                         status=429))
+
+    for _ in range(3):
+      with pytest.raises(QuotaSurpassed):
+        limiter.call(send)
+    assert limiter.limit == 4
+    assert changes == [{"limit": 4, "previous_limit": 8,
+                        "reason": 'overload'}]
+
+  def test_latency_spike_cuts_limit(self):
+    limiter = AdaptiveLimiter(initial=8, tolerance=2.0)
+    for _ in range(20):
+      limiter.acquire()
+      limiter.release(0.01)
+    limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit == 4
+
+  def test_slow_endpoints_are_not_spikes(self):
+    limiter = AdaptiveLimiter(initial=8, tolerance=2.0)
+    for _ in range(20):
+      limiter.acquire()
+      limiter.release(0.01, key='analytics/fetch_job')
+    for _ in range(5):
+      limiter.acquire()
+      limiter.release(1.0, key='page_url')
+      limiter.acquire()
+      limiter.release(0.01, key='analytics/fetch_job')
+    assert limiter.limit == 8
+
+    limiter.acquire()
+    limiter.release(1.0, key='analytics/fetch_job')
+    assert limiter.limit == 4
+
+  def test_acquire_waits_for_a_slot(self):
+    limiter = AdaptiveLimiter(initial=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def worker():
+      limiter.acquire()
+      acquired.set()
+
+    threading.Thread(target=worker, daemon=True).start()
+    assert not acquired.wait(0.05)
+    limiter.release(0.01)
+    assert acquired.wait(1.0)
+
+  def test_client_reports_limit(self, monkeypatch):
+    FakeTransport({
+      "GET /analytics/fetch_job": ({"error": 'quota'}, 429)
+    }).install(monkeypatch)
+    client = Client('key', Auth('id', 'secret'),
+                    limiter=AdaptiveLimiter(initial=4))
+    metrics = client.enable_metrics()
+    assert metrics.as_dict()["concurrency_limit"] == 4
+
+    with pytest.raises(QuotaSurpassed):
+      client.list_fetch_jobs()
+    assert client.limiter.in_flight == 0
+    assert metrics.as_dict()["concurrency_limit"] == 2
+    assert metrics.as_dict()["limit_decreases"] == 1
+    assert 'lfapi_concurrency_limit 2' in metrics.to_prometheus()
+
+  def test_download_pages_in_threads(self, monkeypatch):
+    in_flight = []
+    lock = threading.Lock()
+
+    def page(i):
+      def route(**kwargs):
+        with lock:
+          in_flight.append(1)
+          peak = len(in_flight)
+        time.sleep(0.02 * (6 - i))  # later pages answer first
+        with lock:
+          in_flight.pop()
+        return {"columns": PAGE_COLUMNS, "records": [[f'brand {i}']],
+                "peak": peak}
+      return route
+
+    routes = {f"GET /{i}": page(i) for i in range(6)}
+    FakeTransport(routes).install(monkeypatch)
+    client = Client('key', Auth('id', 'secret'),
+                    limiter=AdaptiveLimiter(initial=2, max_limit=2))
+    job = completed_job(6, client)
+
+    pages = list(job.download_pages(threads=4))
+    assert [page.records for page in pages] == [[[f'brand {i}']]
+                                                for i in range(6)]
+    assert max(page.body["peak"] for page in pages) <= 2
+    assert client.limiter.in_flight == 0
+
+  def test_limiter_does_not_start_download_threads(self, monkeypatch):
+    FakeTransport({f"GET /{i}": {"columns": PAGE_COLUMNS, "records": []}
+                   for i in range(3)}).install(monkeypatch)
+    client = Client('key', Auth('id', 'secret'), limiter=AdaptiveLimiter())
+    before = threading.active_count()
+    pages = completed_job(3, client).download_pages()
+    next(pages)
+    assert threading.active_count() == before
+    assert len(list(pages)) == 2
+
+  def test_readahead_bounds_pages_ahead(self, monkeypatch):
+    requested = []
+
+    def page(i):
+      def route(**kwargs):
+        requested.append(i)
+        return {"columns": PAGE_COLUMNS, "records": []}
+      return route
+
+    routes = {f"GET /{i}": page(i) for i in range(8)}
+    FakeTransport(routes).install(monkeypatch)
+    job = completed_job(8, Client('key', Auth('id', 'secret')))
+    pages = job.download_pages(threads=4, readahead=2)
+    next(pages)
+    time.sleep(0.05)
+    assert len(requested) == 3  # the page being parsed and two ahead
+    assert len(list(pages)) == 7
@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from lfapi.dep_utils import depends_on, lazy_import
+
+HEAVY_DEPS = ["numpy", "pandas", "pyarrow", "polars"]
+MAX_IMPORT_SECONDS = 1.0
+
+IMPORT_SCRIPT = f'''
+import json, sys, time
+start = time.perf_counter()
+import lfapi
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+  "elapsed": elapsed,
+  "loaded": [dep for dep in {HEAVY_DEPS!r} if dep in sys.modules]
+}}))
+'''
+
+
+class TestDepUtils:
+  def test_lazy_import_defers_import(self):
+    json_mod = lazy_import('json')
+    assert json_mod._module is None
+    assert json_mod.dumps([1]) == '[1]'
+    assert json_mod._module is json
+
+  def test_lazy_import_of_missing_module(self):
+    missing = lazy_import('lfapi_missing_dependency')
+    assert not missing
+    with pytest.raises(NotImplementedError):
+      missing.anything
+
+  def test_depends_on_imports_on_call(self):
+    @depends_on('json')
+    def uses_json():
+      return 'ok'
+
+    @depends_on('lfapi_missing_dependency')
+    def uses_missing():
+      return 'ok'
+
+    assert uses_json() == 'ok'
+    with pytest.raises(NotImplementedError):
+      uses_missing()
+
+  def test_import_lfapi_is_fast(self):
+    # Run in a fresh interpreter so that no test has imported anything yet
+    out = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT],
+                         capture_output=True, check=True, text=True).stdout
+    result = json.loads(out)
+    assert result["loaded"] == []
+    assert result["elapsed"] < MAX_IMPORT_SECONDS
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.field_values import FieldValueIndex, FieldValueStore
+
+BRANDS = [f'Brand {i:03}' for i in range(25)] + ['ACME', 'acme labs',
+                                                 'Zebra Acme']
+
+
+def field_values_route(values, requests):
+  def route(params=None, **kwargs):
+    requests.append(params)
+    per_page = params["per_page"]
+    start = (params["page"] - 1) * per_page
+    return {"records": values[start:start + per_page],
+            "has_more_pages": start + per_page < len(values)}
+  return route
+
+@pytest.fixture
+def requests():
+  return []
+
+@pytest.fixture
+def store(monkeypatch, requests):
+  FakeTransport({
+    "GET /dictionary/field_values": field_values_route(BRANDS, requests)
+  }).install(monkeypatch)
+  client = Client('key', Auth('id', 'secret'))
+  return FieldValueStore(client, per_page=4, threads=3)
+
+
+class TestFieldValueIndex:
+  def test_prefix(self):
+    index = FieldValueIndex(BRANDS)
+    assert index.prefix('acme') == ['ACME', 'acme labs']
+    assert index.prefix('brand 01', limit=3) == ['Brand 010', 'Brand 011',
+                                                 'Brand 012']
+    assert index.prefix('nothing') == []
+
+  def test_search(self):
+    index = FieldValueIndex(BRANDS)
+    assert index.search('ACME') == ['ACME', 'acme labs', 'Zebra Acme']
+    assert index.search('ra') == ['Brand 000', 'Brand 001', 'Brand 002',
+                                  'Brand 003', 'Brand 004', 'Brand 005',
+                                  'Brand 006', 'Brand 007', 'Brand 008',
+                                  'Brand 009']
+    assert index.search('d 02', limit=2) == ['Brand 020', 'Brand 021']
+    assert index.search('') == index.values[:10]
+
+  def test_non_string_values(self):
+    index = FieldValueIndex([12, 3, 'x'])
+    assert index.prefix('1') == [12]
+    assert index.search('x') == ['x']
+
+
+class TestFieldValueStore:
+  def test_values_are_loaded_once(self, store, requests):
+    assert store.prefix('lfm.brand.name', 'acme') == ['ACME', 'acme labs']
+    assert len(store.index('lfm.brand.name')) == len(BRANDS)
+    assert store.search('lfm.brand.name', 'zebra') == ['Zebra Acme']
+    pages = sorted(params["page"] for params in requests)
+    assert pages[:7] == [1, 2, 3, 4, 5, 6, 7]
+    assert all(params["field"] == 'lfm.brand.name' for params in requests)
+
+  def test_no_pages_are_requested_after_the_last(self, monkeypatch,
+                                                 requests):
+    route = field_values_route(BRANDS[:9], requests)
+
+    def slow_second_page(params=None, **kwargs):
+      if params["page"] == 2:
+        time.sleep(0.2)  # pages 3 and 4 answer first
+      return route(params=params, **kwargs)
+
+    FakeTransport({
+      "GET /dictionary/field_values": slow_second_page
+    }).install(monkeypatch)
+    store = FieldValueStore(Client('key', Auth('id', 'secret')), per_page=4,
+                            threads=3)
+    assert store.index('lfm.brand.name').values == BRANDS[:9]
+    assert sorted(params["page"] for params in requests) == [1, 2, 3, 4]
+
+  def test_concurrent_first_uses_share_one_load(self, store, requests,
+                                                monkeypatch):
+    release = threading.Event()
+    fetch_page = store._fetch_page
+
+    def slow_fetch_page(*args):
+      release.wait(1.0)
+      return fetch_page(*args)
+
+    def lookup():
+      results.append(store.index('lfm.brand.name'))
+
+    monkeypatch.setattr(store, "_fetch_page", slow_fetch_page)
+    results = []
+    threads = [threading.Thread(target=lookup) for _ in range(5)]
+    for thread in threads:
+      thread.start()
+    time.sleep(0.05)  # let every lookup start before the first page returns
+    release.set()
+    for thread in threads:
+      thread.join()
+    assert len(set(map(id, results))) == 1
+    assert [params["page"] for params in requests].count(1) == 1
+
+  def test_dataset_scoped_values(self, store, requests):
+    store.index('lfm.brand.name', dataset_id='dataset_brand_listenfirst')
+    assert requests[0]["dataset_id"] == 'dataset_brand_listenfirst'
+
+  def test_stale_values_refresh_in_background(self, store, requests,
+                                              monkeypatch):
+    index = store.index('lfm.brand.name')
+    store.ttl = 0
+    loaded = threading.Event()
+    load = store.load
+
+    def tracked_load(*args, **kwargs):
+      try:
+        return load(*args, **kwargs)
+      finally:
+        loaded.set()
+
+    monkeypatch.setattr(store, "load", tracked_load)
+    assert store.index('lfm.brand.name') is index  # served while refreshing
+    assert loaded.wait(1.0)
+    store.ttl = 3600
+    assert store.index('lfm.brand.name') is not index
+
+  def test_invalidate(self, store, requests):
+    store.index('lfm.brand.name')
+    count = len(requests)
+    store.invalidate('lfm.brand.name')
+    store.index('lfm.brand.name')
+    assert len(requests) > count
@@ -0,0 +1,99 @@
+import os
+import pickle
+
+import pytest
+import requests
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.concurrency import AdaptiveLimiter
+from lfapi.hedging import HedgePolicy
+from lfapi.planner import QueryPlanner
+from lfapi.pool import ClientPool
+
+
+def in_child(func):
+  # Return func() run in a child process created by os.fork()
+  read, write = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    try:
+      os.write(write, pickle.dumps(func()))
+    finally:
+      os._exit(0)
+
+  os.close(write)
+  with os.fdopen(read, 'rb') as f:
+    result = f.read()
+  os.waitpid(pid, 0)
+  return pickle.loads(result)
+
+@pytest.fixture
+def transport(monkeypatch):
+  return FakeTransport({
+    "GET /dictionary/datasets": {"records": []}
+  }).install(monkeypatch)
+
+
+class TestPickling:
+  def test_client_round_trip(self, transport):
+    limiter = AdaptiveLimiter(initial=6)
+    client = Client('key', Auth('id', 'secret'), account_id='7',
+                    limiter=limiter, hedge_policy=HedgePolicy(),
+                    planner=QueryPlanner(), profile=True)
+    client.hedge_policy.observe('GET /brands', 0.5)
+    client.enable_metrics()
+    client.list_datasets()
+
+    copy = pickle.loads(pickle.dumps(client))
+    assert copy.account_id == '7' and copy.api_key == 'key'
+    assert copy.limiter.limit == client.limiter.limit
+    assert copy.limiter.in_flight == 0
+    assert list(copy.hedge_policy._latencies['GET /brands']) == [0.5]
+    assert copy.profiler is not None and copy.metrics is None
+
+    # The copy reuses the token and forwards limiter events to its own hooks
+    events = []
+    copy.on('on_limit_change', lambda **kwargs: events.append(kwargs))
+    copy.limiter.hooks.emit('on_limit_change', limit=1)
+    assert events == [{"limit": 1}]
+    copy.list_datasets()
+    assert transport.calls.count('POST /oauth2/token') == 1
+
+  def test_session_is_copied(self):
+    session = requests.Session()
+    session.headers["X-Test"] = 'yes'
+    copy = pickle.loads(pickle.dumps(Client('key', Auth('id', 'secret'),
+                                            session=session)))
+    assert copy.session is not session
+    assert copy.session.headers["X-Test"] == 'yes'
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason='requires os.fork')
+class TestFork:
+  def test_shared_session_is_renewed_once(self):
+    with ClientPool('key', Auth('id', 'secret'), [1, 2]) as pool:
+      session = pool.session
+      limiter = AdaptiveLimiter()
+      limiter.in_flight = 3
+
+      def child():
+        return (pool.session is not session,
+                pool[1].session is pool.session is pool[2].session,
+                limiter.in_flight)
+
+      assert in_child(child) == (True, True, 0)
+      assert pool.session is session and limiter.in_flight == 3
+
+  def test_child_uses_parent_token(self, transport):
+    client = Client('key', Auth('id', 'secret'), session=requests.Session())
+    assert client.auth.access_token == 'token'
+    session = client.session
+
+    def child():
+      return (client.auth.access_token,
+              transport.calls.count('POST /oauth2/token'),
+              client.session is not session)
+
+    assert in_child(child) == ('token', 1, True)
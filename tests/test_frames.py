@@ -0,0 +1,76 @@
+import pytest
+
+from lfapi.frames import scan
+from lfapi.models import AnalyticResponse
+
+pl = pytest.importorskip('polars')
+
+COLUMNS = [
+  {"id": 'brand', "name": 'Brand', "class": 'DIMENSION',
+   "data_type": 'STRING'},
+  {"id": 'date', "name": 'Date', "class": 'DIMENSION', "data_type": 'DATE'},
+  {"id": 'score', "name": 'Score', "class": 'METRIC', "data_type": 'INTEGER'}
+]
+
+
+class RecordingResponse(AnalyticResponse):
+  # Record the columns converted from each page
+  converted = []
+
+  def to_pyarrow(self, keep_metadata=False, columns=None):
+    self.converted.append(columns)
+    return super().to_pyarrow(keep_metadata=keep_metadata, columns=columns)
+
+
+@pytest.fixture
+def pages():
+  RecordingResponse.converted = []
+  return [
+    RecordingResponse({"columns": COLUMNS, "records": [
+      ['a', '2021-01-01', 1], ['b', '2021-01-01', 2]
+    ]}),
+    RecordingResponse({"columns": COLUMNS, "records": [
+      ['c', '2021-01-02', 3], ['a', '2021-01-02', 4]
+    ]})
+  ]
+
+
+class TestPageScan:
+  def test_collect_concatenates_pages(self, pages):
+    df = scan(pages).collect()
+    assert df.columns == ['brand', 'date', 'score']
+    assert df["brand"].to_list() == ['a', 'b', 'c', 'a']
+    assert df["score"].to_list() == [1, 2, 3, 4]
+
+  def test_select_and_filter_are_applied_per_page(self, pages):
+    query = scan(pages).select('brand').filter(pl.col('score') > 1)
+    frames = list(query)
+    assert [frame.columns for frame in frames] == [['brand'], ['brand']]
+    assert query.collect()["brand"].to_list() == ['b', 'c', 'a']
+
+  def test_only_needed_columns_are_converted(self, pages):
+    scan(pages).select('brand').filter(pl.col('score') > 1).collect()
+    assert RecordingResponse.converted == [['brand', 'score']] * 2
+
+  def test_builder_is_immutable(self, pages):
+    base = scan(pages)
+    base.select('score')
+    assert base.collect().columns == ['brand', 'date', 'score']
+
+  def test_collect_handles_no_pages(self):
+    assert scan([]).collect().is_empty()
+    assert scan([]).lazy().collect().is_empty()
+
+  def test_lazy_returns_lazy_frame(self, pages):
+    lazy = scan(pages).lazy()
+    assert isinstance(lazy, pl.LazyFrame)
+    assert lazy.select(pl.col('score').sum()).collect().item() == 10
+
+  def test_lazy_pushes_down_projections_and_limits(self, pages):
+    lazy = scan(iter(pages)).filter(pl.col('score') > 1).lazy()
+    assert lazy.select('brand').collect()["brand"].to_list() == ['b', 'c', 'a']
+    assert RecordingResponse.converted[1:] == [['brand', 'score']] * 2
+
+    RecordingResponse.converted = []
+    assert scan(iter(pages)).lazy().head(1).collect().height == 1
+    assert len(RecordingResponse.converted) == 2  # the schema and one page
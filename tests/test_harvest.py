@@ -0,0 +1,114 @@
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.harvest import Harvester
+from lfapi.models import ScheduleConfig
+
+COLUMNS = [{"id": 'brand', "name": 'Brand'}]
+
+
+def job(job_id, schedule_config_id=3, state='completed', updated_at=None):
+  updated_at = updated_at or f'2021-01-0{job_id}T00:00:00Z'
+  return {"id": job_id, "state": state, "created_at": '',
+          "updated_at": updated_at, "client_context": None,
+          "schedule_config_id": schedule_config_id}
+
+
+JOBS = [job(1), job(2, state='running'), job(3), job(4, schedule_config_id=9),
+        job(5)]
+
+
+@pytest.fixture
+def jobs():
+  return list(JOBS)
+
+@pytest.fixture
+def transport(monkeypatch, jobs):
+  def list_jobs(params=None, **kwargs):
+    assert params["sort"] == '-updated_at'
+    listed = sorted(jobs, key=lambda rec: rec["updated_at"], reverse=True)
+    start = (params["page"] - 1) * params["per_page"]
+    records = listed[start:start + params["per_page"]]
+    return {"records": records,
+            "has_more_pages": start + params["per_page"] < len(listed)}
+
+  def show_job(job_id):
+    def route(**kwargs):
+      rec = next(rec for rec in jobs if rec["id"] == job_id)
+      return {"record": {**rec, "page_urls": [f'https://pages.test/{job_id}']}}
+    return route
+
+  routes = {"GET /analytics/fetch_job": list_jobs}
+  for rec in JOBS + [job(6)]:
+    routes[f"GET /analytics/fetch_job/{rec['id']}"] = show_job(rec["id"])
+    routes[f"GET /{rec['id']}"] = {"columns": COLUMNS,
+                                   "records": [[f'brand {rec["id"]}']]}
+  return FakeTransport(routes).install(monkeypatch)
+
+@pytest.fixture
+def sunk():
+  return []
+
+@pytest.fixture
+def harvester(tmp_path, transport, sunk):
+  def sink(fetch_job, pages):
+    sunk.append((fetch_job.id, [page.records for page in pages]))
+
+  client = Client('key', Auth('id', 'secret'))
+  return Harvester(client, (tmp_path / 'harvest.json').as_posix(), sink,
+                   per_page=2)
+
+
+class TestHarvester:
+  def test_completed_jobs_are_paged_and_filtered(self, harvester, transport):
+    assert [job.id for job in harvester.completed_jobs(3)] == [5, 3, 1]
+    assert transport.calls.count('GET /analytics/fetch_job') == 3
+
+  def test_new_jobs_are_sunk_once(self, harvester, sunk):
+    assert harvester.run([3]) == {3: [1, 3, 5]}
+    assert sunk == [(1, [[['brand 1']]]), (3, [[['brand 3']]]),
+                    (5, [[['brand 5']]])]
+    assert harvester.watermark(3) == ('2021-01-05T00:00:00Z', {5})
+
+    sunk.clear()
+    assert harvester.run([3]) == {3: []}
+    assert sunk == []
+
+  def test_listing_stops_at_the_watermark(self, harvester, transport, jobs):
+    harvester.run([3])
+    jobs[1] = job(2, updated_at='2021-01-07T00:00:00Z')  # completed late
+    jobs.append(job(6))
+    transport.calls.clear()
+    assert harvester.run([3]) == {3: [6, 2]}
+    assert transport.calls.count('GET /analytics/fetch_job') == 2
+    assert harvester.watermark(3) == ('2021-01-07T00:00:00Z', {2})
+
+  def test_jobs_updated_together_are_harvested_once(self, harvester, jobs):
+    jobs[:] = [job(1), job(3, updated_at=jobs[0]["updated_at"])]
+    assert harvester.run([3]) == {3: [1, 3]}
+    assert harvester.watermark(3) == ('2021-01-01T00:00:00Z', {1, 3})
+    assert harvester.run([3]) == {3: []}
+
+  def test_failed_sink_leaves_job_unharvested(self, harvester, sunk):
+    sink = harvester.sink
+
+    def failing_sink(fetch_job, pages):
+      if fetch_job.id == 3:
+        raise OSError('disk full')
+      sink(fetch_job, pages)
+
+    harvester.sink = failing_sink
+    with pytest.raises(OSError):
+      harvester.run([3])
+    assert harvester.watermark(3) == ('2021-01-01T00:00:00Z', {1})
+
+    harvester.sink = sink
+    assert harvester.run([3]) == {3: [3, 5]}
+
+  def test_schedule_config_models(self, harvester):
+    config = ScheduleConfig({"record": {"id": 9, "state": 'active',
+                                        "created_at": '', "updated_at": '',
+                                        "client_context": None}})
+    assert harvester.run([config]) == {9: [4]}
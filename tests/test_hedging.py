@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.hedging import HedgePolicy
+
+PAGE = {"columns": [{"id": 'a', "name": 'A'}], "records": [[1]]}
+
+
+def warm_up(policy, key, seconds=0.001, count=20):
+  for _ in range(count):
+    policy.observe(key, seconds)
+
+def slow_then_fast(slow_seconds=0.3, error=None):
+  # Return a send function whose first call is slow, and fails with error
+  calls = []
+  lock = threading.Lock()
+
+  def send():
+    with lock:
+      calls.append(time.perf_counter())
+      first = len(calls) == 1
+    if first:
+      time.sleep(slow_seconds)
+      if error is not None:
+        raise error
+      return 'slow'
+    return 'fast'
+
+  return send, calls
+
+
+class TestHedgePolicy:
+  def test_delay_requires_samples(self):
+    policy = HedgePolicy(percentile=0.5, min_samples=3, min_delay=0)
+    policy.observe('a', 1.0)
+    policy.observe('a', 2.0)
+    assert policy.delay('a') is None
+    policy.observe('a', 3.0)
+    assert policy.delay('a') == 2.0
+    assert policy.delay('b') is None
+
+  def test_requests_are_sent_inline(self):
+    policy = HedgePolicy(min_samples=2, budget=1.0)
+    threads = []
+
+    def send():
+      threads.append(threading.current_thread())
+      return 'ok'
+
+    assert policy.run(send, 'a') == 'ok'
+    assert policy.run(send, 'a') == 'ok'
+    assert policy._executor is None and policy.delay('a') is not None
+
+    # Only hedges are sent from the policy's threads
+    assert policy.run(send, 'a') == 'ok'
+    assert threads == [threading.current_thread()] * 3
+    assert policy.hedges == 0
+    policy.close()
+
+  def test_close_stops_threads(self):
+    policy = HedgePolicy()
+    warm_up(policy, 'a')
+    assert policy.run(lambda: 'ok', 'a') == 'ok'
+    executor = policy._executor
+    with Client('key', Auth('id', 'secret'), hedge_policy=policy):
+      pass
+    assert executor._shutdown and policy._executor is None
+    assert policy.run(lambda: 'ok', 'a') == 'ok'
+    policy.close()
+
+  def test_slow_request_is_hedged(self):
+    policy = HedgePolicy(budget=1.0)
+    warm_up(policy, 'a')
+    send, calls = slow_then_fast()
+    hedges = []
+
+    def on_hedge(delay):
+      hedges.append(delay)
+
+    assert policy.run(send, 'a', on_hedge=on_hedge) == 'slow'
+    assert len(calls) == 2 and len(hedges) == 1
+    assert calls[1] - calls[0] < 0.5  # sent while the first attempt waited
+    assert policy.hedges == 1
+
+  def test_hedge_answers_failed_request(self):
+    policy = HedgePolicy(budget=1.0)
+    warm_up(policy, 'a')
+    send, calls = slow_then_fast(slow_seconds=0.2,
+                                 error=TimeoutError('timed out'))
+    assert policy.run(send, 'a') == 'fast'
+    assert len(calls) == 2 and policy.hedges == 1
+
+  def test_hedges_are_capped_by_budget(self):
+    policy = HedgePolicy(budget=0.5)
+    warm_up(policy, 'a')
+    send, calls = slow_then_fast(slow_seconds=0.1)
+    assert policy.run(send, 'a') == 'slow'  # 1 request: no budget yet
+    assert len(calls) == 1 and policy.hedges == 0
+
+  def test_first_error_is_raised_when_all_attempts_fail(self):
+    policy = HedgePolicy(budget=1.0)
+    warm_up(policy, 'a')
+
+    def send():
+      time.sleep(0.05)
+      raise ValueError('failed')
+
+    with pytest.raises(ValueError):
+      policy.run(send, 'a')
+    assert policy.hedges == 1
+
+  def test_client_hedges_page_downloads(self, monkeypatch):
+    calls = []
+
+    def page(**kwargs):
+      calls.append(1)
+      if len(calls) == 1:
+        time.sleep(0.2)
+      return PAGE
+
+    FakeTransport({"GET /1": page}).install(monkeypatch)
+    policy = HedgePolicy(budget=1.0)
+    warm_up(policy, 'page_url')
+    client = Client('key', Auth('id', 'secret'), hedge_policy=policy)
+    metrics = client.enable_metrics()
+
+    assert client.download_page('https://pages.test/1').json() == PAGE
+    assert len(calls) == 2
+    assert metrics.as_dict()["hedges"] == {'page_url': 1}
@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+import pytest
+
+from lfapi.errors import LfError
+from lfapi.incremental import IncrementalSync, query_key
+from lfapi.models import AnalyticResponse
+from lfapi.stores import SQLiteStore
+
+COLUMNS = [
+  {"id": 'lfm.fact.date_str', "name": 'Date', "data_type": 'DATE'},
+  {"id": 'lfm.brand_view.id', "name": 'Brand View ID', "data_type": 'INTEGER'},
+  {"id": 'metric', "name": 'Metric', "data_type": 'INTEGER'}
+]
+
+
+class FakeClient:
+  def __init__(self):
+    self.queries = []
+
+  def sync_analytic_query(self, params, **kwargs):
+    self.queries.append((params["start_date"], params["end_date"]))
+    start = date.fromisoformat(params["start_date"])
+    end = date.fromisoformat(params["end_date"])
+    records = []
+    while start <= end:
+      records.append([start.isoformat(), 1, len(self.queries)])
+      start += timedelta(days=1)
+    yield AnalyticResponse({"columns": COLUMNS, "records": records})
+
+@pytest.fixture
+def fetch_params():
+  return {
+    "dataset_id": 'dataset_brand_listenfirst',
+    "start_date": '2022-07-01',
+    "end_date": '2022-07-10',
+    "group_by": ['lfm.fact.date_str', 'lfm.brand_view.id'],
+    "metrics": ['metric'],
+    "filters": []
+  }
+
+
+class TestIncrementalSync:
+  def test_query_key_ignores_dates(self, fetch_params):
+    shifted = {**fetch_params, "start_date": '2022-08-01'}
+    assert query_key(fetch_params) == query_key(shifted)
+    assert query_key(fetch_params) != query_key({**fetch_params,
+                                                 "metrics": []})
+
+  def test_run_fetches_only_new_dates(self, fetch_params, tmp_path):
+    client = FakeClient()
+    store = SQLiteStore(':memory:')
+    sync = IncrementalSync(client, store, (tmp_path / "hwm.json").as_posix(),
+                           lookback=2)
+
+    assert sync.run(fetch_params, table='t') == ('2022-07-01', '2022-07-10')
+    assert sync.run(fetch_params, table='t') == ('2022-07-09', '2022-07-10')
+    assert sync.run(fetch_params, end_date='2022-07-12',
+                    table='t') == ('2022-07-09', '2022-07-12')
+    assert client.queries[-1] == ('2022-07-09', '2022-07-12')
+
+    # Re-fetched dates are replaced rather than duplicated
+    rows = store.conn.execute('SELECT "lfm.fact.date_str", metric FROM t '
+                              'ORDER BY 1').fetchall()
+    assert len(rows) == 12
+    assert rows[7] == ('2022-07-08', 1)
+    assert rows[8] == ('2022-07-09', 3)
+
+  def test_lookback_counts_the_high_water_mark(self, fetch_params, tmp_path):
+    for lookback, start in [(0, '2022-07-11'), (1, '2022-07-10'),
+                            (2, '2022-07-09')]:
+      path = tmp_path / f'hwm-{lookback}.json'
+      sync = IncrementalSync(FakeClient(), SQLiteStore(':memory:'),
+                             path.as_posix(), lookback=lookback)
+      sync.run(fetch_params)
+      assert sync.plan(fetch_params, end_date='2022-07-12') == (start,
+                                                                '2022-07-12')
+
+  def test_run_skips_up_to_date_query(self, fetch_params, tmp_path):
+    sync = IncrementalSync(FakeClient(), SQLiteStore(':memory:'),
+                           (tmp_path / "hwm.json").as_posix(), lookback=0)
+    sync.run(fetch_params)
+    assert sync.run(fetch_params) is None
+    assert sync.high_water_mark(fetch_params) == '2022-07-10'
+
+  def test_run_requires_date_group_by(self, fetch_params, tmp_path):
+    sync = IncrementalSync(FakeClient(), SQLiteStore(':memory:'),
+                           (tmp_path / "hwm.json").as_posix())
+    with pytest.raises(LfError):
+      sync.run({**fetch_params, "group_by": ['lfm.brand_view.id']})
@@ -0,0 +1,124 @@
+import gc
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.errors import LfError, RecordNotFound
+from lfapi.instrumentation import Hooks, endpoint_label
+
+JOB = {"id": 7, "state": 'pending', "created_at": '', "updated_at": '',
+       "client_context": None, "schedule_config_id": None}
+
+
+@pytest.fixture
+def transport(monkeypatch):
+  states = iter(['pending', 'running', 'completed'])
+  routes = {
+    "GET /analytics/fetch_job/7": lambda **kwargs: {
+      "record": {**JOB, "state": next(states)}
+    },
+    "POST /analytics/fetch": {"columns": [], "records": []}
+  }
+  return FakeTransport(routes).install(monkeypatch)
+
+@pytest.fixture
+def client(transport, monkeypatch):
+  monkeypatch.setattr('time.sleep', lambda seconds: None)
+  return Client('key', Auth('id', 'secret'))
+
+
+class TestInstrumentation:
+  def test_endpoint_label_replaces_ids(self):
+    label = endpoint_label('analytics/fetch_job/123')
+    assert label == 'analytics/fetch_job/{id}'
+    assert endpoint_label('brand_views/4/x') == 'brand_views/{id}/x'
+
+  def test_hooks_reject_unknown_events(self):
+    with pytest.raises(LfError):
+      Hooks().register('on_nothing', print)
+    assert not Hooks()
+
+  def test_shared_auth_forwards_to_live_clients_only(self, transport):
+    auth = Auth('id', 'secret')
+    clients = [Client('key', auth) for _ in range(10)]
+    del clients
+    gc.collect()
+    client = Client('key', auth)
+    events = []
+    client.on('on_token_refresh', lambda **info: events.append(info))
+    auth.access_token
+    assert len(auth.hooks._callbacks["on_token_refresh"]) == 1
+    assert len(events) == 1
+
+  def test_request_events(self, client):
+    events = []
+    client.on('before_request',
+              lambda **info: events.append(('before', info["endpoint"])))
+    client.on('after_response', lambda **info: events.append(
+      ('after', info["response"].status_code, info["error"] is None)
+    ))
+    client.fetch({"dataset_id": 'x'})
+    with pytest.raises(RecordNotFound):
+      client.secure_get('missing')
+
+    assert events == [('before', 'analytics/fetch'), ('after', 200, True),
+                      ('before', 'missing'), ('after', 404, False)]
+
+  def test_token_refresh_and_job_state_events(self, client):
+    events = []
+    client.on('on_token_refresh', lambda **info: events.append('refresh'))
+    client.on('on_retry', lambda **info: events.append('retry'))
+    client.on('on_job_state_change', lambda **info: events.append(
+      (info["previous_state"], info["state"])
+    ))
+    assert client.poll_fetch_job(7).state == 'completed'
+    assert events == ['refresh', 'retry', ('pending', 'running'), 'retry',
+                      ('running', 'completed')]
+
+  def test_metrics_collector(self, client):
+    metrics = client.enable_metrics()
+    client.fetch({"dataset_id": 'x'})
+    client.poll_fetch_job(7)
+
+    data = metrics.as_dict()
+    fetch = data["endpoints"]["analytics/fetch"]
+    assert fetch["requests"] == {'POST 200': 1}
+    assert fetch["latency_seconds"]["count"] == 1
+    assert fetch["bytes_out"] == len(b'{"dataset_id": "x"}')
+    assert fetch["bytes_in"] > 0
+    assert data["endpoints"]["analytics/fetch_job/{id}"]["requests"] == {
+      'GET 200': 3
+    }
+    assert data["retries"] == 2
+    assert data["token_refreshes"] == 1
+    assert set(data["decode_seconds"]) == {'AnalyticResponse', 'FetchJob'}
+    assert set(data["job_state_seconds"]) == {'pending', 'running'}
+
+    text = metrics.to_prometheus()
+    assert ('lfapi_requests_total{endpoint="analytics/fetch",method="POST",'
+            'status="200"} 1') in text
+    assert ('lfapi_request_duration_seconds_bucket{endpoint="analytics/fetch",'
+            'le="+Inf"} 1') in text
+    assert 'lfapi_retries_total 2' in text
+
+  def test_metrics_count_compressed_bodies(self, transport, client):
+    bodies = []
+    transport.routes["POST /analytics/fetch"] = lambda **kwargs: (
+      bodies.append(kwargs) or {"columns": [], "records": []}
+    )
+    client.gzip_min_bytes = 100
+    metrics = client.enable_metrics()
+    filters = [{"field": 'lfm.brand.name', "operator": 'IN',
+                "values": ['My Brand'] * 100}]
+    client.fetch({"dataset_id": 'x', "filters": filters})
+    client.fetch({"dataset_id": 'x'})
+
+    assert bodies[0]["headers"]["content-encoding"] == 'gzip'
+    assert "content-encoding" not in bodies[1]["headers"]
+
+    fetch = metrics.as_dict()["endpoints"]["analytics/fetch"]
+    assert fetch["wire_bytes_out"] < fetch["bytes_out"]
+    assert fetch["wire_bytes_in"] == fetch["bytes_in"]
+    assert 'lfapi_request_wire_bytes_total' in metrics.to_prometheus()
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.planner import QueryPlanner, query_days
+
+COLUMNS = [{"id": 'brand', "name": 'Brand'}]
+JOB = {"id": 7, "state": 'completed', "created_at": '', "updated_at": '',
+       "client_context": None, "schedule_config_id": None,
+       "page_urls": ['https://pages.test/1', 'https://pages.test/2']}
+QUERY = {"dataset_id": 'x', "start_date": '2022-01-01',
+         "end_date": '2022-01-10'}
+
+
+def fetch_route(total, fetches):
+  # Serve sync pages of a query with total rows
+  def fetch(json=None, **kwargs):
+    fetches.append(json)
+    per_page, page = json.get("per_page", 100), json["page"]
+    count = max(min(per_page, total - (page - 1) * per_page), 0)
+    return {"columns": COLUMNS, "records": [['a']] * count,
+            "total_records": total, "page": page,
+            "is_last_page": page * per_page >= total}
+  return fetch
+
+@pytest.fixture
+def fetches():
+  return []
+
+def install(monkeypatch, total, fetches):
+  page = {"columns": COLUMNS, "records": [['a']]}
+  return FakeTransport({
+    "POST /analytics/fetch": fetch_route(total, fetches),
+    "POST /analytics/fetch_job": {"record": JOB},
+    "GET /analytics/fetch_job/7": {"record": JOB},
+    "GET /1": page,
+    "GET /2": page
+  }).install(monkeypatch)
+
+
+class TestQueryPlanner:
+  def test_query_days(self):
+    assert query_days(QUERY) == 10
+    assert query_days({"dataset_id": 'x'}) is None
+
+  def test_small_query_runs_sync(self, monkeypatch, fetches):
+    install(monkeypatch, 25, fetches)
+    client = Client('key', Auth('id', 'secret'))
+    pages = list(client.query(QUERY))
+
+    assert [len(page) for page in pages] == [25]
+    assert [fetch["per_page"] for fetch in fetches] == [1, 25]
+    assert client.planner.estimate(QUERY) == 25
+
+  def test_large_query_runs_fetch_job(self, monkeypatch, fetches):
+    transport = install(monkeypatch, 10**6, fetches)
+    client = Client('key', Auth('id', 'secret'))
+    plan = client.planner.plan(client, QUERY)
+    assert plan.strategy == 'async' and plan.pages == 1000
+    assert plan.threads == 8
+
+    pages = list(client.query(QUERY))
+    assert len(pages) == 2
+    assert 'POST /analytics/fetch_job' in transport.calls
+    assert client.planner.estimate(QUERY) == 10**6  # the probe's total
+
+  def test_history_replaces_probe(self, monkeypatch, fetches):
+    install(monkeypatch, 20, fetches)
+    client = Client('key', Auth('id', 'secret'))
+    list(client.query(QUERY))
+    fetches.clear()
+
+    longer = {**QUERY, "end_date": '2022-01-20'}
+    plan = client.planner.plan(client, longer)
+    assert plan.source == 'history' and plan.total_records == 40
+    assert fetches == []
+
+  def test_costs_are_learned_and_kept(self, tmp_path, monkeypatch, fetches):
+    install(monkeypatch, 20, fetches)
+    path = (tmp_path / 'planner.json').as_posix()
+    planner = QueryPlanner(path=path, sync_page_seconds=10.0)
+    client = Client('key', Auth('id', 'secret'), planner=planner)
+    list(client.query(QUERY))
+    assert planner.costs["sync_page_seconds"] < 10.0
+
+    reloaded = QueryPlanner(path=path)
+    assert reloaded.costs == planner.costs
+    assert reloaded.estimate(QUERY) == 20
+
+  def test_time_between_pages_is_not_observed(self, monkeypatch, fetches):
+    install(monkeypatch, 20, fetches)
+    observed = []
+    planner = QueryPlanner()
+    monkeypatch.setattr(planner, "observe", lambda *args, **kwargs:
+                        observed.append(args[2]))
+    client = Client('key', Auth('id', 'secret'), planner=planner)
+    for _ in client.query(QUERY):
+      time.sleep(0.2)  # the caller's work on each page
+    assert len(observed) == 1 and observed[0] < 0.2
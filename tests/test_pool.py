@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.errors import LfError, RecordNotFound
+from lfapi.pool import ClientPool
+
+
+def account_echo(headers=None, **kwargs):
+  return {"account": headers.get("lfm-acting-account")}
+
+@pytest.fixture
+def transport(monkeypatch):
+  return FakeTransport({"GET /echo": account_echo}).install(monkeypatch)
+
+@pytest.fixture
+def pool(transport):
+  with ClientPool('key', Auth('id', 'secret'), ['a', 'b', 'c'],
+                  session=transport) as pool:
+    yield pool
+
+
+class TestClientPool:
+  def test_clients_act_for_their_account(self, pool, transport):
+    results = dict(pool.map(lambda client: client.secure_get('echo').json()))
+    assert results == {account: {"account": account} for account in 'abc'}
+    assert transport.calls.count('POST /oauth2/token') == 1
+
+  def test_from_client(self, transport):
+    client = Client('key', Auth('id', 'secret'), api_host='https://api.test')
+    pool = ClientPool.from_client(client, [None, 'a'], session=transport)
+    assert pool[None].auth is client.auth
+    assert pool['a'].api_host == 'https://api.test'
+    assert pool['a'].session is transport
+    assert list(pool) == [None, 'a'] and len(pool) == 2
+
+  def test_accounts_take_turns_within_limits(self, transport):
+    started = []
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+    lock = threading.Lock()
+
+    def task(client, name):
+      account = client.account_id
+      with lock:
+        started.append(name)
+        running[account] += 1
+        peak[account] = max(peak[account], running[account])
+      time.sleep(0.02)
+      with lock:
+        running[account] -= 1
+
+    pool = ClientPool('key', Auth('id', 'secret'), ['a', 'b'], max_workers=2,
+                      max_per_account=1, session=transport)
+    futures = [pool.submit('a', task, f'a{i}') for i in range(3)]
+    futures.append(pool.submit('b', task, 'b0'))
+    pool.close()
+
+    assert all(future.done() for future in futures)
+    assert started.index('b0') < started.index('a1')
+    assert peak == {"a": 1, "b": 1}
+
+  def test_errors_are_kept_per_account(self, pool):
+    def get(client):
+      if client.account_id == 'b':
+        return client.secure_get('missing')
+      return client.secure_get('echo').json()
+
+    futures = pool.fan_out(get)
+    assert futures['a'].result() == {"account": 'a'}
+    with pytest.raises(RecordNotFound):
+      futures['b'].result()
+
+  def test_closed_pool_rejects_work(self, pool):
+    pool.close()
+    with pytest.raises(LfError):
+      pool.submit('a', len)
+    with pytest.raises(LfError):
+      ClientPool('key', Auth('id', 'secret'), []).submit('a', len)
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+from utils import FakeTransport
+
+import lfapi.profiling as profiling
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.hedging import HedgePolicy
+from lfapi.models import AnalyticResponse, FetchJob
+from lfapi.profiling import Profiler, phase, profile
+
+PAGE = {"columns": [{"id": 'a', "name": 'A'}], "records": [[1], [2]]}
+
+
+@pytest.fixture
+def transport(monkeypatch):
+  return FakeTransport({"POST /analytics/fetch": PAGE, "GET /1": PAGE,
+                        "GET /2": PAGE}).install(monkeypatch)
+
+
+class TestProfiling:
+  def test_nested_phases_are_credited_exclusively(self, monkeypatch):
+    now = [0.0]
+    clock = SimpleNamespace(perf_counter=lambda: now[0],
+                            thread_time=lambda: now[0] / 2)
+    monkeypatch.setattr(profiling, "time", clock)
+
+    profiler = Profiler()
+    with profiler.phase('network'):
+      now[0] += 1
+      with profiler.phase('decode'):
+        now[0] += 2
+      now[0] += 4
+
+    assert profiler.calls == {"network": 1, "decode": 1}
+    assert profiler.wall == {"network": 5, "decode": 2}
+    assert profiler.cpu == {"network": 2.5, "decode": 1}
+
+  def test_client_profile_records_phases(self, transport):
+    client = Client('key', Auth('id', 'secret'), profile=True)
+    ar = client.fetch({"dataset_id": 'x'})
+    ar.as_list()
+    ar.to_csv()
+
+    phases = [row["phase"] for row in client.profiler.report()]
+    assert phases == ['auth', 'headers', 'network', 'decode', 'model',
+                      'as_list', 'export']
+    assert 'as_list' in client.profiler.table()
+
+  def test_profile_context_manager(self):
+    ar = AnalyticResponse(PAGE)
+    with profile() as profiler:
+      ar.to_json()
+    ar.to_json()  # not recorded once the block exits
+
+    assert profiler.calls == {"export": 1}
+
+  def test_profile_follows_work_into_threads(self, transport):
+    policy = HedgePolicy(min_samples=1)
+    policy.observe('page_url', 1.0)
+    client = Client('key', Auth('id', 'secret'), hedge_policy=policy)
+    job = FetchJob({"record": {
+      "id": 1, "state": 'completed', "created_at": '', "updated_at": '',
+      "client_context": None, "schedule_config_id": None,
+      "page_urls": ['https://pages.test/1', 'https://pages.test/2']
+    }}, client=client)
+    with profile() as profiler, client:
+      assert len(list(job.download_pages(threads=2))) == 2
+
+    assert profiler.calls["network"] == 2
+    assert profiler.calls["model"] == 2
+
+  def test_phase_is_noop_without_profiler(self):
+    with phase('export'):
+      pass
+    assert Profiler().report() == []
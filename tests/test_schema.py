@@ -0,0 +1,171 @@
+import pickle
+
+import pytest
+from utils import FakeTransport
+
+from lfapi.auth import Auth
+from lfapi.client import Client
+from lfapi.errors import LfError
+from lfapi.models import AnalyticResponse
+from lfapi.schema import Schema, SchemaRegistry
+
+FIELDS = [
+  {"id": 'lfm.brand.name', "name": 'Brand Name', "class": 'DIMENSION',
+   "data_type": 'STRING'},
+  {"id": 'lfm.fact.date_str', "name": 'Date', "class": 'DIMENSION',
+   "data_type": 'DATE'},
+  {"id": 'lfm.metric.fans', "name": 'Fans', "class": 'METRIC',
+   "data_type": 'INTEGER'}
+]
+DATASET = {"id": 'dataset_x', "name": 'X', "description": '',
+           "analysis_type": 'BRAND', "dataset_type": 'ANALYTIC',
+           "fields": FIELDS}
+QUERY = {"dataset_id": 'dataset_x', "start_date": '2022-01-01',
+         "end_date": '2022-01-02', "metrics": ['lfm.metric.fans'],
+         "group_by": ['lfm.brand.name'],
+         "filters": [{"field": 'lfm.fact.date_str', "operator": '>',
+                      "values": ['2022-01-01']}]}
+
+
+def page(records):
+  return AnalyticResponse({"columns": [dict(col) for col in FIELDS],
+                           "records": records})
+
+@pytest.fixture
+def transport(monkeypatch):
+  return FakeTransport({
+    "GET /dictionary/datasets/dataset_x": {"record": DATASET},
+    "GET /dictionary/datasets": {"records": [DATASET]},
+    "GET /dictionary/datasets/dataset_y": {"record": {**DATASET,
+                                                      "id": 'dataset_y',
+                                                      "fields": []}},
+    "POST /analytics/fetch": {"columns": FIELDS, "records": []}
+  }).install(monkeypatch)
+
+
+class TestSchema:
+  def test_schemas_are_interned(self):
+    schema = Schema.of([dict(col) for col in FIELDS])
+    assert Schema.of([dict(col) for col in FIELDS]) is schema
+    assert schema.labels["name"] == ('Brand Name', 'Date', 'Fans')
+    assert schema.types == ('string', 'string', 'float')
+    assert schema.string_columns == [0] and schema.date_columns == [1]
+    assert schema.position('Fans', 'name') == 2
+    assert schema.position('lfm.fact.date_str', 'name') == 1
+    with pytest.raises(LfError):
+      schema.position('Fans', 'id')
+
+  def test_schema_is_read_only(self):
+    schema = Schema.of(FIELDS)
+    with pytest.raises(TypeError):
+      schema.columns[0]["name"] = 'Renamed'
+    assert pickle.loads(pickle.dumps(schema)) is schema
+
+  def test_pages_share_schema(self):
+    first = page([['a', '2022-01-01', 1]])
+    second = page([['b', '2022-01-02', 2]])
+    assert first.schema is second.schema
+    assert first.columns is not second.columns
+    first.columns[0]["name"] = 'Renamed'
+    assert page([]).columns[0]["name"] == 'Brand Name'
+    assert second.as_list() == [{"lfm.brand.name": 'b',
+                                 "lfm.fact.date_str": '2022-01-02',
+                                 "lfm.metric.fans": 2}]
+
+  def test_projection_is_interned(self):
+    ar = AnalyticResponse({"columns": FIELDS, "records": [['a', 'd', 1]]},
+                          label_mode="name", columns=['Fans', 'Brand Name'])
+    assert ar.schema is Schema.of([FIELDS[2], FIELDS[0]])
+    assert ar._labels == ['Fans', 'Brand Name']
+    assert ar.columns == [FIELDS[2], FIELDS[0]]
+    assert ar.records == [[1, 'a']]
+
+  def test_arrow_types_come_from_schema(self):
+    pa = pytest.importorskip('pyarrow')
+    columns = FIELDS + [{"id": 'lfm.metric.rate', "class": 'METRIC',
+                         "data_type": 'FLOAT'}]
+    ar = AnalyticResponse({"columns": columns,
+                           "records": [['a', '2022-01-01', None, 1]]})
+    table = ar.to_pyarrow()
+    assert table.schema.field('lfm.metric.fans').type == pa.float64()
+    assert table.schema.field('lfm.metric.rate').type == pa.float64()
+    assert ar.to_pandas()['lfm.metric.rate'].dtype == 'float64'
+
+  def test_fractional_values_are_not_truncated(self):
+    pa = pytest.importorskip('pyarrow')
+    columns = [FIELDS[2], {"id": 'lfm.brand_view.id', "class": 'DIMENSION',
+                           "data_type": 'INTEGER'}]
+    ar = AnalyticResponse({"columns": columns,
+                           "records": [[1.5, 1], [None, 2]]})
+    table = ar.to_pyarrow()
+    assert table['lfm.metric.fans'].to_pylist() == [1.5, None]
+    assert table.schema.field('lfm.brand_view.id').type == pa.int64()
+    assert ar.to_polars()['lfm.metric.fans'].to_list() == [1.5, None]
+
+    ar.records[0][1] = 1.5
+    with pytest.raises(pa.ArrowInvalid):
+      ar.to_pyarrow()
+
+
+class TestSchemaRegistry:
+  def test_fields_are_looked_up_once(self, transport, tmp_path):
+    path = (tmp_path / 'schemas.json').as_posix()
+    registry = SchemaRegistry(Client('key', Auth('id', 'secret')), path=path)
+    assert registry.fields('dataset_x')['lfm.metric.fans'] == FIELDS[2]
+    registry.load()
+    assert transport.calls.count('GET /dictionary/datasets/dataset_x') == 1
+
+    reloaded = SchemaRegistry(None, path=path)
+    assert reloaded.fields('dataset_x') == registry.fields('dataset_x')
+
+  def test_schema_of_fields(self, transport):
+    registry = SchemaRegistry(Client('key', Auth('id', 'secret')))
+    schema = registry.schema('dataset_x', ['lfm.metric.fans'])
+    assert schema is Schema.of([FIELDS[2]])
+    with pytest.raises(LfError):
+      registry.schema('dataset_x', ['lfm.metric.unknown'])
+
+  def test_validate(self, transport):
+    registry = SchemaRegistry(Client('key', Auth('id', 'secret')))
+    registry.validate(QUERY)
+    with pytest.raises(LfError, match='lfm.brand.nam,'):
+      registry.validate({**QUERY, "group_by": ['lfm.brand.nam'],
+                         "metrics": ['lfm.metric.fanz']})
+    with pytest.raises(LfError):
+      registry.validate({"metrics": []})
+
+  def test_datasets_without_fields_are_cached(self, transport, tmp_path):
+    path = (tmp_path / 'schemas.json').as_posix()
+    registry = SchemaRegistry(Client('key', Auth('id', 'secret')), path=path)
+    registry.validate({**QUERY, "dataset_id": 'dataset_y'})
+    assert registry.fields('dataset_y') == {}
+    assert transport.calls.count('GET /dictionary/datasets/dataset_y') == 1
+    assert not (tmp_path / 'schemas.json').exists()
+
+    registry.missing_ttl = 0
+    assert registry.fields('dataset_y') == {}
+    assert transport.calls.count('GET /dictionary/datasets/dataset_y') == 2
+
+  def test_client_validates_queries_before_sending(self, transport):
+    client = Client('key', Auth('id', 'secret'))
+    client.schemas = SchemaRegistry(client)
+    client.fetch(QUERY)
+    with pytest.raises(LfError):
+      client.fetch({**QUERY, "metrics": ['lfm.metric.fanz']})
+    with pytest.raises(LfError):
+      client.create_fetch_job({"fetch_params": {**QUERY, "metrics": ['x']}})
+    assert transport.calls.count('POST /analytics/fetch') == 1
+
+  def test_sync_queries_are_validated_once(self, transport, monkeypatch):
+    client = Client('key', Auth('id', 'secret'))
+    client.schemas = SchemaRegistry(client)
+    validated = []
+    validate = client.schemas.validate
+    monkeypatch.setattr(client.schemas, "validate",
+                        lambda params: validated.append(params) or
+                        validate(params))
+    transport.routes["POST /analytics/fetch"] = lambda json, **kwargs: {
+      "columns": FIELDS, "records": [], "is_last_page": json["page"] == 3
+    }
+    assert len(list(client.sync_analytic_query(QUERY))) == 3
+    assert validated == [QUERY]
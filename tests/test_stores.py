@@ -0,0 +1,143 @@
+from datetime import date, timedelta
+
+import pytest
+
+from lfapi.models import AnalyticResponse
+from lfapi.stores import ParquetStore, SQLiteStore
+
+COLUMNS = [
+  {"id": 'lfm.fact.date_str', "name": 'Date', "class": 'DIMENSION',
+   "data_type": 'DATE'},
+  {"id": 'lfm.brand.name', "name": 'Brand Name', "class": 'DIMENSION',
+   "data_type": 'STRING'},
+  {"id": 'metric', "name": 'Metric', "class": 'METRIC', "data_type": 'INTEGER'}
+]
+
+def make_page(records):
+  return AnalyticResponse({"columns": COLUMNS, "records": records})
+
+
+class FakeClient:
+  def __init__(self):
+    self.queries = []
+
+  def sync_analytic_query(self, params, **kwargs):
+    brands = params["filters"][0]["values"]
+    self.queries.append((params["start_date"], params["end_date"], brands))
+    day = date.fromisoformat(params["start_date"])
+    records = []
+    while day <= date.fromisoformat(params["end_date"]):
+      records += [[day.isoformat(), brand, 1] for brand in brands]
+      day += timedelta(days=1)
+    yield make_page(records)
+
+def brand_query(start_date, end_date, brands):
+  return {
+    "dataset_id": 'dataset_brand_listenfirst',
+    "start_date": start_date,
+    "end_date": end_date,
+    "group_by": ['lfm.fact.date_str', 'lfm.brand.name'],
+    "metrics": ['metric'],
+    "filters": [
+      {"field": 'lfm.brand.name', "operator": 'IN', "values": brands}
+    ]
+  }
+
+
+class TestSQLiteStore:
+  def test_write_batches_rows(self):
+    store = SQLiteStore(':memory:', batch_size=2)
+    store.write('t', [make_page([['2022-07-01', 'a', 1]] * 3),
+                      make_page([['2022-07-02', 'b', 2]])])
+    assert store.conn.execute('SELECT COUNT(*) FROM t').fetchone() == (4,)
+
+  def test_replace_range_rolls_back_on_failure(self):
+    store = SQLiteStore(':memory:')
+    store.write('t', [make_page([['2022-07-01', 'a', 1]])])
+
+    def failing_pages():
+      yield make_page([['2022-07-01', 'a', 2]])
+      raise RuntimeError('download failed')
+
+    with pytest.raises(RuntimeError):
+      store.replace_range('t', failing_pages(), 'lfm.fact.date_str',
+                          '2022-07-01', '2022-07-01')
+    assert store.conn.execute('SELECT metric FROM t').fetchall() == [(1,)]
+
+  def test_write_indexes_dimensions(self):
+    store = SQLiteStore(':memory:')
+    store.write('t', [make_page([['2022-07-01', 'a', 1]])])
+    indexed = {row[2] for row in store.conn.execute(
+      "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 't'"
+    ) for row in store.conn.execute(f'PRAGMA index_info("{row[0]}")')}
+    assert indexed == {'lfm.fact.date_str', 'lfm.brand.name'}
+
+  def test_query_only_fetches_gaps(self):
+    client = FakeClient()
+    store = SQLiteStore(':memory:')
+
+    ar = store.query(client, brand_query('2022-07-01', '2022-07-03',
+                                         ['a', 'b']))
+    assert len(ar) == 6
+
+    # A narrower filter inside the covered range is answered locally
+    ar = store.query(client, brand_query('2022-07-02', '2022-07-03', ['a']))
+    assert sorted(rec[0] for rec in ar.records) == ['2022-07-02',
+                                                    '2022-07-03']
+    assert len(client.queries) == 1
+
+    # Only the uncovered dates are fetched
+    query = brand_query('2022-07-02', '2022-07-05', ['a', 'b'])
+    assert store.gaps(query) == [('2022-07-04', '2022-07-05')]
+    assert len(store.query(client, query)) == 8
+    assert client.queries[-1] == ('2022-07-04', '2022-07-05', ['a', 'b'])
+
+
+class TestParquetStore:
+  def test_replace_range_rewrites_partitions(self, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    store = ParquetStore(tmp_path.as_posix())
+    store.replace_range('t', [make_page([['2022-07-01', 'a', 1],
+                                         ['2022-07-02', 'a', 1]])],
+                        'lfm.fact.date_str', '2022-07-01', '2022-07-02')
+    store.replace_range('t', [make_page([['2022-07-02', 'a', 5]])],
+                        'lfm.fact.date_str', '2022-07-02', '2022-07-02')
+
+    table = pq.read_table((tmp_path / "t").as_posix())
+    rows = sorted(zip(table["lfm.fact.date_str"].to_pylist(),
+                      table["metric"].to_pylist()))
+    assert rows == [('2022-07-01', 1), ('2022-07-02', 5)]
+
+  def test_replace_range_keeps_partitions_on_failure(self, tmp_path,
+                                                     monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    store = ParquetStore(tmp_path.as_posix())
+    store.replace_range('t', [make_page([['2022-07-01', 'a', 1]])],
+                        'lfm.fact.date_str', '2022-07-01', '2022-07-01')
+
+    def fail(*args, **kwargs):
+      raise OSError('disk full')
+
+    monkeypatch.setattr(pq, 'write_table', fail)
+    with pytest.raises(OSError):
+      store.replace_range('t', [make_page([['2022-07-01', 'a', 5]])],
+                          'lfm.fact.date_str', '2022-07-01', '2022-07-01')
+    monkeypatch.undo()
+
+    assert sorted(path.name for path in (tmp_path / 't').iterdir()) == [
+      'lfm.fact.date_str=2022-07-01'
+    ]
+    table = pq.read_table((tmp_path / 't').as_posix())
+    assert table["metric"].to_pylist() == [1]
+
+  def test_partitions_share_one_schema(self, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    store = ParquetStore(tmp_path.as_posix())
+    store.replace_range('t', [make_page([['2022-07-01', None, None],
+                                         ['2022-07-02', 'a', 1]])],
+                        'lfm.fact.date_str', '2022-07-01', '2022-07-02')
+
+    part = tmp_path / 't' / 'lfm.fact.date_str=2022-07-01'
+    schema = pq.read_schema((part / 'part-0.parquet').as_posix())
+    assert str(schema.field('lfm.brand.name').type) == 'string'
+    assert str(schema.field('metric').type) == 'double'
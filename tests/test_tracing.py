@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from utils import FakeTransport
+
+import lfapi.tracing as tracing
+from lfapi.auth import Auth
+from lfapi.client import Client
+
+JOB = {"id": 7, "state": 'pending', "created_at": '', "updated_at": '',
+       "client_context": None, "schedule_config_id": None}
+PAGE = {"columns": [{"id": 'a', "name": 'A'}], "records": [[1], [2]]}
+PAGE_BYTES = len(json.dumps(PAGE).encode())
+
+
+@pytest.fixture
+def client(monkeypatch):
+  states = iter(['running', 'completed'])
+  page_urls = ['https://pages.test/1', 'https://pages.test/2']
+  FakeTransport({
+    "POST /analytics/fetch_job": {"record": JOB},
+    "GET /analytics/fetch_job/7": lambda **kwargs: {
+      "record": {**JOB, "state": next(states), "page_urls": page_urls}
+    },
+    "GET /1": PAGE,
+    "GET /2": PAGE
+  }).install(monkeypatch)
+  monkeypatch.setattr('time.sleep', lambda seconds: None)
+  return Client('key', Auth('id', 'secret'))
+
+@pytest.fixture
+def exporter(monkeypatch):
+  pytest.importorskip('opentelemetry.sdk')
+  from opentelemetry.sdk.trace import TracerProvider
+  from opentelemetry.sdk.trace.export import (SimpleSpanProcessor,
+                                              in_memory_span_exporter)
+
+  exporter = in_memory_span_exporter.InMemorySpanExporter()
+  provider = TracerProvider()
+  provider.add_span_processor(SimpleSpanProcessor(exporter))
+  monkeypatch.setattr(tracing, "_tracer", provider.get_tracer('lfapi'))
+  monkeypatch.setattr(tracing, "_resolved", True)
+  return exporter
+
+
+class TestTracing:
+  def test_span_is_noop_without_tracer(self, monkeypatch):
+    monkeypatch.setattr(tracing, "_tracer", None)
+    monkeypatch.setattr(tracing, "_resolved", True)
+    with tracing.span('lfapi.test', job_id=1) as current:
+      current.set_attribute('rows', 1)
+    assert isinstance(current, tracing.NoopSpan)
+    assert not current.is_recording()
+
+  def test_fetch_job_lifecycle_spans(self, client, exporter):
+    pages = list(client.async_analytic_query({"dataset_id": 'x'}))
+    assert len(pages) == 2
+
+    spans = [(span.name, dict(span.attributes))
+             for span in exporter.get_finished_spans()]
+    assert spans == [
+      ('lfapi.create_fetch_job', {"dataset_id": 'x', "job_id": 7}),
+      ('lfapi.poll_fetch_job', {"job_id": 7, "iteration": 1,
+                                "state": 'running'}),
+      ('lfapi.poll_fetch_job', {"job_id": 7, "iteration": 2,
+                                "state": 'completed'}),
+      ('lfapi.download_page', {"job_id": 7, "page_index": 0,
+                               "bytes": PAGE_BYTES}),
+      ('lfapi.parse_page', {"job_id": 7, "page_index": 0, "rows": 2}),
+      ('lfapi.download_page', {"job_id": 7, "page_index": 1,
+                               "bytes": PAGE_BYTES}),
+      ('lfapi.parse_page', {"job_id": 7, "page_index": 1, "rows": 2})
+    ]
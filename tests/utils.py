@@ -1,3 +1,10 @@
+import json as jsonlib
+from urllib.parse import urlparse
+
+import requests
+
+import lfapi.http_utils as http
+from lfapi.client import Client
 from lfapi.models import ListModel, Model
 
 
@@ -11,3 +18,55 @@ def assert_is_list_model(obj, item_class):
   obj = assert_is_model(obj, ListModel)
   assert obj._item_class is item_class
   return obj
+
+
+# Offline HTTP transport
+def make_response(method, url, body, status=200, json=None, data=None,
+                  params=None, headers=None):
+  req = requests.Request(method, url, json=json, data=data, params=params,
+                         headers=headers).prepare()
+  res = requests.Response()
+  res.status_code = status
+  res.reason = 'OK' if status < 400 else 'Error'
+  res._content = jsonlib.dumps(body).encode()
+  res.request = req
+  res.url = req.url
+  return res
+
+class FakeTransport:
+  """Stand-in for requests.get/requests.post that routes requests by URL path.
+
+  Parameters:
+  routes
+    a dict mapping (method, path) to a response body, or to a function taking
+    the request keyword arguments and returning a body or (body, status)
+  """
+
+  def __init__(self, routes):
+    self.routes = {"POST /oauth2/token": {"access_token": 'token',
+                                          "expires_in": 3600},
+                   **routes}
+    self.calls = []
+
+  def install(self, monkeypatch):
+    monkeypatch.setattr(http, "GET", self.get)
+    monkeypatch.setattr(http, "POST", self.post)
+    return self
+
+  def _handle(self, method, url, **kwargs):
+    path = urlparse(url).path.replace(f'/{Client.API_VERSION}', '/')
+    self.calls.append(f'{method} {path}')
+    route = self.routes.get(f'{method} {path}')
+    if route is None:
+      return make_response(method, url, {"error": 'not found'}, status=404,
+                           **kwargs)
+    body, status = route(**kwargs) if callable(route) else route, 200
+    if isinstance(body, tuple):
+      body, status = body
+    return make_response(method, url, body, status=status, **kwargs)
+
+  def get(self, url, **kwargs):
+    return self._handle('GET', url, **kwargs)
+
+  def post(self, url, **kwargs):
+    return self._handle('POST', url, **kwargs)